@@ -1,3 +1,4 @@
+import base64
 import hashlib
 import json
 import os
@@ -6,11 +7,10 @@ import subprocess
 import time
 from binascii import hexlify
 from random import sample
-from threading import Thread
 
-from algosdk import transaction
+from algosdk import encoding, transaction
 from algosdk.algod import AlgodClient
-from algosdk.error import AlgodHTTPError, KMDHTTPError
+from algosdk.error import KMDHTTPError
 from algosdk.kmd import KMDClient
 from algosdk.wallet import Wallet
 
@@ -19,6 +19,7 @@ import requests
 from gumby.experiment import experiment_callback
 from gumby.modules.blockchain_module import BlockchainModule
 from gumby.modules.experiment_module import ExperimentModule
+from gumby.rpc_client import get_rpc_client_pool
 
 
 class AlgorandModule(BlockchainModule):
@@ -36,6 +37,7 @@ class AlgorandModule(BlockchainModule):
         self.suggested_parameters = None
         self.wallet = None
         self.sender_key = None
+        self.sender_private_key = None
         self.receiver_key = None
         self.tx_counter = 0
 
@@ -169,11 +171,14 @@ class AlgorandModule(BlockchainModule):
         except KMDHTTPError:
             self._logger.warning("Failed to generate receiver key!")
 
+        # Sign transactions locally, instead of through kmd
+        self.sender_private_key = self.wallet.export_key(self.sender_key)
+
         self._logger.info("Sender key: %s", self.sender_key)
         self._logger.info("Receiver key: %s", self.receiver_key)
 
     @experiment_callback
-    def transfer(self):
+    async def transfer(self):
         if not self.is_client():
             return
 
@@ -182,31 +187,32 @@ class AlgorandModule(BlockchainModule):
         last_round = self.suggested_parameters["lastRound"]
         fee = self.suggested_parameters["fee"]
 
-        def create_and_submit_tx():
-            txn = transaction.PaymentTxn(self.sender_key, fee, last_round, last_round + 300, gh,
-                                         self.receiver_key, 100000 + self.tx_counter, gen=gen, flat_fee=True)
-            signed = self.wallet.sign_transaction(txn)
-            submit_time = int(round(time.time() * 1000))
-            try:
-                self.tx_counter += 1
-                self._logger.info("About to submit a transaction (fee: %d)", fee)
-                tx_id = self.algod_client.send_transaction(signed)
-                self.transactions[tx_id] = (submit_time, -1)
-                self._logger.info("Submitted transaction with ID %s (fee: %d)", tx_id, fee)
-            except AlgodHTTPError as e:
-                msg = str(e)
-                self._logger.error("Failed to submit transaction! %s", msg)
-
-                if "below threshold" in msg:
-                    parts = msg.split(" ")
-                    new_fee = int(int(parts[-7]) * 1.2)
-                    if new_fee <= 100000000:  # Surge pricing check
-                        self.suggested_parameters["fee"] = new_fee
-                        self._logger.info("Fixing fee to %d", self.suggested_parameters["fee"])
-
-        t = Thread(target=create_and_submit_tx)
-        t.daemon = True
-        t.start()
+        txn = transaction.PaymentTxn(self.sender_key, fee, last_round, last_round + 300, gh,
+                                     self.receiver_key, 100000 + self.tx_counter, gen=gen, flat_fee=True)
+        signed = txn.sign(self.sender_private_key)
+        submit_time = int(round(time.time() * 1000))
+        self.tx_counter += 1
+        self._logger.info("About to submit a transaction (fee: %d)", fee)
+        status, body = await get_rpc_client_pool().request(
+            "POST", self.algod_client.algod_address + "/v1/transactions",
+            data=base64.b64decode(encoding.msgpack_encode(signed)),
+            headers={"Content-Type": "application/x-binary", "X-Algo-API-Token": self.algod_client.algod_token})
+        if status == 200:
+            tx_id = json.loads(body)["txId"]
+            self.transactions[tx_id] = (submit_time, -1)
+            self._logger.info("Submitted transaction with ID %s (fee: %d)", tx_id, fee)
+            return tx_id
+
+        msg = json.loads(body).get("message", body) if body.startswith("{") else body
+        self._logger.error("Failed to submit transaction! %s", msg)
+
+        if "below threshold" in msg:
+            parts = msg.split(" ")
+            new_fee = int(int(parts[-7]) * 1.2)
+            if new_fee <= 100000000:  # Surge pricing check
+                self.suggested_parameters["fee"] = new_fee
+                self._logger.info("Fixing fee to %d", self.suggested_parameters["fee"])
+        return None
 
     @experiment_callback
     def print_status(self):
@@ -6,15 +6,15 @@ import shutil
 import signal
 import subprocess
 import time
-from asyncio import get_event_loop, sleep
+from asyncio import ensure_future, get_event_loop, sleep
 from binascii import hexlify
-from threading import Thread
 
 import requests
 
 from gumby.experiment import experiment_callback
 from gumby.modules.blockchain_module import BlockchainModule
 from gumby.modules.experiment_module import ExperimentModule
+from gumby.rpc_client import get_rpc_client_pool
 
 
 class AvalancheModule(BlockchainModule):
@@ -328,66 +328,53 @@ class AvalancheModule(BlockchainModule):
                 await sleep(0.1)
 
     @experiment_callback
-    def transfer(self):
+    async def transfer(self):
         if not self.is_client():
             return
 
         validator_peer_id = ((self.my_id - 1) % self.num_validators) + 1
         validator_host, _ = self.experiment.get_peer_ip_port_by_id(validator_peer_id)
-
-        def create_and_submit_tx():
-            self._logger.info("Creating transaction")
-            submit_time = int(round(time.time() * 1000))
-
-            payload = {
-                "method": "wallet.send",
-                "params": [{
-                    "assetID": "AVAX",
-                    "amount": 100,
-                    "to": self.avax_addresses[validator_peer_id],
-                    "username": "peer%d" % validator_peer_id,
-                    "password": hexlify(hashlib.md5(b'peer%d' % validator_peer_id).digest()).decode(),
-                }],
-                "jsonrpc": "2.0",
-                "id": 0,
-            }
-
-            response = requests.post("http://%s:%d/ext/bc/X/wallet" %
-                                     (validator_host, 12000 + validator_peer_id), json=payload).json()
-            self._logger.info("Transfer funds response: %s", response)
-            tx_id = response["result"]["txID"]
-            self.transactions[tx_id] = (submit_time, -1)
-
-            # Poll the status of this transaction
-            for _ in range(20):
-                payload = {
-                    "method": "avm.getTxStatus",
-                    "params": [{
-                        "txID": tx_id,
-                    }],
-                    "jsonrpc": "2.0",
-                    "id": 0,
-                }
-
-                response = requests.post("http://%s:%d/ext/bc/X" %
-                                         (validator_host, 12000 + validator_peer_id), json=payload).json()
-                self._logger.info("Poll response for tx %s: %s", tx_id, response)
-                if response["result"]["status"] == "Accepted":
-                    confirm_time = int(round(time.time() * 1000))
-                    self.transactions[tx_id] = (self.transactions[tx_id][0], confirm_time)
-                    break
-                elif response["result"]["status"] == "Dropped":
-                    self._logger.info("Transaction %s dropped! Response: %s", tx_id, response["result"])
-                    break
-                elif response["result"]["status"] == "Rejected":
-                    self._logger.info("Transaction %s rejected! Response: %s", tx_id, response["result"])
-                    break
-
-                time.sleep(0.5)
-
-        t = Thread(target=create_and_submit_tx)
-        t.daemon = True
-        t.start()
+        rpc_client_pool = get_rpc_client_pool()
+
+        self._logger.info("Creating transaction")
+        submit_time = int(round(time.time() * 1000))
+        params = [{
+            "assetID": "AVAX",
+            "amount": 100,
+            "to": self.avax_addresses[validator_peer_id],
+            "username": "peer%d" % validator_peer_id,
+            "password": hexlify(hashlib.md5(b'peer%d' % validator_peer_id).digest()).decode(),
+        }]
+        wallet_url = "http://%s:%d/ext/bc/X/wallet" % (validator_host, 12000 + validator_peer_id)
+        result = await rpc_client_pool.call(wallet_url, "wallet.send", params)
+        self._logger.info("Transfer funds response: %s", result)
+        tx_id = result["txID"]
+        self.transactions[tx_id] = (submit_time, -1)
+        ensure_future(self.poll_tx_status(validator_host, validator_peer_id, tx_id))
+        return tx_id
+
+    async def poll_tx_status(self, validator_host, validator_peer_id, tx_id):
+        """
+        Poll the status of a transaction until it has been accepted, dropped or rejected.
+        """
+        rpc_client_pool = get_rpc_client_pool()
+        for _ in range(20):
+            result = await rpc_client_pool.call("http://%s:%d/ext/bc/X" % (validator_host, 12000 + validator_peer_id),
+                                                "avm.getTxStatus", [{"txID": tx_id}])
+            self._logger.info("Poll response for tx %s: %s", tx_id, result)
+            if result["status"] == "Accepted":
+                confirm_time = int(round(time.time() * 1000))
+                self.transactions[tx_id] = (self.transactions[tx_id][0], confirm_time)
+                self.transactions_manager.confirm_transaction(tx_id, confirm_time / 1000)
+                break
+            elif result["status"] == "Dropped":
+                self._logger.info("Transaction %s dropped! Response: %s", tx_id, result)
+                break
+            elif result["status"] == "Rejected":
+                self._logger.info("Transaction %s rejected! Response: %s", tx_id, result)
+                break
+
+            await sleep(0.5)
 
     @experiment_callback
     def write_stats(self):
@@ -4,17 +4,44 @@ import random
 import shutil
 import subprocess
 import time
-from asyncio import get_event_loop
+from asyncio import gather, get_event_loop
+from datetime import datetime, timezone
 from threading import Thread
 
 from grapheneapi.grapheneapi import GrapheneAPI
 
+from gumby.block_subscriber import BlockSubscriber
 from gumby.experiment import experiment_callback
 from gumby.modules.blockchain_module import BlockchainModule
 from gumby.modules.experiment_module import ExperimentModule
+from gumby.rpc_client import get_rpc_client_pool
 from gumby.util import run_task
 
 
+class BitsharesBlockSubscriber(BlockSubscriber):
+    """
+    Fetches new blocks through the JSON-RPC interface of a CLI wallet.
+    """
+
+    def __init__(self, wallet_url, batch_size=50, **kwargs):
+        super(BitsharesBlockSubscriber, self).__init__(**kwargs)
+        self.wallet_url = wallet_url
+        self.batch_size = batch_size
+        self.next_block_nr = 1
+
+    async def fetch_blocks(self):
+        rpc_client_pool = get_rpc_client_pool()
+        dynamic_settings = await rpc_client_pool.call(self.wallet_url, "get_dynamic_global_properties")
+        last_block_nr = min(dynamic_settings["head_block_number"], self.next_block_nr + self.batch_size - 1)
+        # The wallet does not accept batches, so we send the calls concurrently instead
+        blocks = await gather(*[rpc_client_pool.call(self.wallet_url, "get_block", [block_nr])
+                                for block_nr in range(self.next_block_nr, last_block_nr + 1)])
+        self.next_block_nr = last_block_nr + 1
+        return [(datetime.fromisoformat(block["timestamp"]).replace(tzinfo=timezone.utc).timestamp(),
+                 [signature for transaction in block["transactions"] for signature in transaction["signatures"]],
+                 block) for block in blocks]
+
+
 class BitsharesModule(BlockchainModule):
 
     def __init__(self, experiment):
@@ -36,8 +63,8 @@ class BitsharesModule(BlockchainModule):
 
         self.order_id_map = {}
         self.cancelled_orders = set()
-        self.dump_blockchain_lc = None
-        self.last_block_written = 0
+        self.block_subscriber = None
+        self.confirmations_subscriber = None
         self.data_dir = None
 
     def on_all_vars_received(self):
@@ -61,10 +88,21 @@ class BitsharesModule(BlockchainModule):
                         self.pub_key = parts[1]
                         self.wif_priv_key = parts[2]
 
+    def get_wallet_url(self):
+        if not self.is_client():
+            return "http://127.0.0.1:%d/rpc" % (13000 + self.my_id)
+        validator_peer_id = (self.my_id - 1) % self.num_validators + 1
+        validator_host, _ = self.experiment.get_peer_ip_port_by_id(validator_peer_id)
+        return "http://%s:%d/rpc" % (validator_host, 13000 + validator_peer_id)
+
     @experiment_callback
     def start_dumping_blockchain(self):
-        if not self.dump_blockchain_lc:
-            self.dump_blockchain_lc = run_task(self.dump_blockchain, interval=10)
+        """
+        Write the blocks to blockchain.txt while they are produced.
+        """
+        if not self.block_subscriber:
+            self.block_subscriber = BitsharesBlockSubscriber(self.get_wallet_url(), blocks_filename="blockchain.txt")
+            self.block_subscriber.start()
 
     @experiment_callback
     def start_bitshares(self):
@@ -227,10 +265,20 @@ class BitsharesModule(BlockchainModule):
 
     @experiment_callback
     def transfer(self):
+        if not self.confirmations_subscriber:
+            # Write the confirmation times of our transactions to tx_confirmed_times.txt while they are included
+            self.confirmations_subscriber = BitsharesBlockSubscriber(self.get_wallet_url(),
+                                                                     confirmations_filename="tx_confirmed_times.txt",
+                                                                     track_transactions=True)
+            self.confirmations_subscriber.start()
+        loop = get_event_loop()
+
         def send_transaction(target_user):
             tx_creation_time = int(round(time.time() * 1000))
             response = self.wallet_rpc.transfer(self.username, target_user, 1, "BTS", "transferral", True)
-            self.tx_info.append((tx_creation_time, response["signatures"][0]))
+            signature = response["signatures"][0]
+            self.tx_info.append((tx_creation_time, signature))
+            loop.call_soon_threadsafe(self.confirmations_subscriber.track, signature)
 
         t = Thread(target=send_transaction, args=("user%d" % (self.my_id + 1), ))
         t.daemon = True
@@ -240,28 +288,23 @@ class BitsharesModule(BlockchainModule):
             self._logger.warning("Unable to submit transaction - cannot start new thread!")
 
     @experiment_callback
-    def dump_blockchain(self):
+    async def dump_blockchain(self):
         """
-        Dump the blockchain up to the latest block we have written
+        Dump the blockchain up to the latest block, and stop writing new blocks.
         """
-        dynamic_settings = self.wallet_rpc.get_dynamic_global_properties()
-        head_block_nr = dynamic_settings["head_block_number"]
-        self._logger.info("Last block in blockchain: %d", head_block_nr)
-
-        def write_blocks_async(last_block):
-            with open("blockchain.txt", "a") as blockchain_file:
-                for ind in range(self.last_block_written + 1, last_block + 1):
-                    blockchain_file.write(json.dumps(self.wallet_rpc.get_block(ind)) + "\n")
-                    self._logger.info("Written block %d...", ind)
-                self.last_block_written = last_block
-
-        t = Thread(target=write_blocks_async, args=(head_block_nr,))
-        t.daemon = True
-        t.start()
+        if self.block_subscriber:
+            await self.block_subscriber.stop()
+            self._logger.info("Written %d blocks", self.block_subscriber.num_blocks)
+            self.block_subscriber = None
 
     @experiment_callback
-    def write_stats(self):
+    async def write_stats(self):
         self._logger.info("Writing BitShares statistics...")
+        await self.dump_blockchain()
+        if self.confirmations_subscriber:
+            await self.confirmations_subscriber.stop()
+            self._logger.info("Confirmed %d transactions", self.confirmations_subscriber.num_confirmed)
+            self.confirmations_subscriber = None
 
         if not self.is_client():
             # Write the disk usage of the data directory
@@ -317,8 +360,5 @@ class BitsharesModule(BlockchainModule):
         if self.wallet_process:
             self.wallet_process.terminate()
 
-        if self.dump_blockchain_lc:
-            self.dump_blockchain_lc.cancel()
-
         loop = get_event_loop()
         loop.stop()
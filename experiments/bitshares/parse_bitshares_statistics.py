@@ -134,23 +134,34 @@ class BitsharesStatisticsParser(BlockchainTransactionsParser):
         """
         signature_map = {}  # Map from signature -> block creation timestamp
 
-        for _, filename, _ in self.yield_files('blockchain.txt'):
-            with open(filename) as blockchain_file:
-                lines = blockchain_file.readlines()
-                cur_block_num = 1
-                for line in lines:
-                    if not line:
+        # The clients write the confirmation times of their transactions while the experiment runs
+        for _, filename, _ in self.yield_files('tx_confirmed_times.txt'):
+            with open(filename) as tx_confirmed_times_file:
+                for line in tx_confirmed_times_file:
+                    if not line.strip():
                         continue
-                    block = json.loads(line)
-                    timestamp = time.mktime(dateparser.parse(block["timestamp"]).timetuple()) * 1000 + 3600000
-
-                    for transaction in block["transactions"]:
-                        for signature in transaction["signatures"]:
-                            signature_map[signature] = timestamp
-
-                    cur_block_num += 1
-
-            break  # We only need one blockchain.txt file
+                    tx_signature, confirm_time = line.rstrip('\n').split(',')
+                    signature_map[tx_signature] = int(confirm_time)
+
+        # Reconstruct the confirmation times from the blockchain in older output directories
+        if not signature_map:
+            for _, filename, _ in self.yield_files('blockchain.txt'):
+                with open(filename) as blockchain_file:
+                    lines = blockchain_file.readlines()
+                    cur_block_num = 1
+                    for line in lines:
+                        if not line:
+                            continue
+                        block = json.loads(line)
+                        timestamp = time.mktime(dateparser.parse(block["timestamp"]).timetuple()) * 1000 + 3600000
+
+                        for transaction in block["transactions"]:
+                            for signature in transaction["signatures"]:
+                                signature_map[signature] = timestamp
+
+                        cur_block_num += 1
+
+                break  # We only need one blockchain.txt file
 
         # We go over all transactions created by client.
         # Check if the signature is included in the blockchain and compute the transaction latency.
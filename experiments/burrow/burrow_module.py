@@ -6,19 +6,18 @@ import signal
 import string
 import subprocess
 import time
-from asyncio import get_event_loop
+from asyncio import ensure_future, get_event_loop, sleep
 from binascii import hexlify, unhexlify
-from threading import Thread
 
 from solcx import compile_files, set_solc_version
 
 import toml
 
 from web3 import Web3
-from web3.exceptions import TimeExhausted
 
 from gumby.experiment import experiment_callback
 from gumby.modules.blockchain_module import BlockchainModule
+from gumby.rpc_client import get_rpc_client_pool
 
 
 class BurrowModule(BlockchainModule):
@@ -41,30 +40,37 @@ class BurrowModule(BlockchainModule):
         self.transactions_manager.transfer = self.transfer
 
     @experiment_callback
-    def transfer(self):
+    async def transfer(self):
         validator_peer_id = ((self.my_id - 1) % self.num_validators) + 1
         host, _ = self.experiment.get_peer_ip_port_by_id(validator_peer_id)
-
-        def create_and_submit_tx():
-            url = 'http://%s:%d' % (host, 12000 + validator_peer_id)
-            w3 = Web3(Web3.HTTPProvider(url))
-            random_id = ''.join(random.choice(string.ascii_uppercase) for _ in range(5))
-            submit_time = int(round(time.time() * 1000))
-            self.submitted_transactions[random_id] = submit_time
-
-            tx_hash = self.deployed_contract.functions.transfer(
-                w3.toChecksumAddress("EB77C5D07D50D9853EF90CB6B32E38755A9BDF2F"), 1, random_id).transact(
-                {"from": w3.toChecksumAddress(self.validator_addresses[validator_peer_id])})
-            try:
-                _ = w3.eth.waitForTransactionReceipt(tx_hash)
+        url = 'http://%s:%d' % (host, 12000 + validator_peer_id)
+        rpc_client_pool = get_rpc_client_pool()
+
+        random_id = ''.join(random.choice(string.ascii_uppercase) for _ in range(5))
+        tx = {
+            "from": Web3.toChecksumAddress(self.validator_addresses[validator_peer_id]),
+            "to": self.deployed_contract.address,
+            "data": self.deployed_contract.encodeABI(fn_name="transfer", args=[
+                Web3.toChecksumAddress("EB77C5D07D50D9853EF90CB6B32E38755A9BDF2F"), 1, random_id]),
+        }
+        submit_time = int(round(time.time() * 1000))
+        self.submitted_transactions[random_id] = submit_time
+
+        tx["gas"] = await rpc_client_pool.call(url, "eth_estimateGas", [tx])
+        tx_hash = await rpc_client_pool.call(url, "eth_sendTransaction", [tx])
+        ensure_future(self.wait_for_receipt(url, random_id, tx_hash))
+        return random_id
+
+    async def wait_for_receipt(self, url, tx_id, tx_hash, timeout=120):
+        rpc_client_pool = get_rpc_client_pool()
+        for _ in range(timeout * 10):
+            if await rpc_client_pool.call(url, "eth_getTransactionReceipt", [tx_hash]):
                 confirm_time = int(round(time.time() * 1000))
-                self.confirmed_transactions[random_id] = confirm_time
-            except TimeExhausted:
-                print("Time exhausted for tx with hash: %d" % tx_hash)
-
-        t = Thread(target=create_and_submit_tx)
-        t.daemon = True
-        t.start()
+                self.confirmed_transactions[tx_id] = confirm_time
+                self.transactions_manager.confirm_transaction(tx_id, confirm_time / 1000)
+                return
+            await sleep(0.1)
+        print("Time exhausted for tx with hash: %s" % tx_hash)
 
     def on_message(self, from_id, msg_type, msg):
         self._logger.info("Received message with type %s from peer %d", msg_type, from_id)
@@ -14,12 +14,43 @@ from solcx import compile_files, set_solc_version
 
 from web3 import Web3
 
+from gumby.block_subscriber import BlockSubscriber
 from gumby.experiment import experiment_callback
 from gumby.modules.blockchain_module import BlockchainModule
 from gumby.modules.experiment_module import ExperimentModule
+from gumby.rpc_client import get_rpc_client_pool
 from gumby.util import run_task
 
 
+class EthereumBlockSubscriber(BlockSubscriber):
+    """
+    Fetches new blocks from an Ethereum node, in batches of JSON-RPC calls.
+    """
+
+    def __init__(self, url, batch_size=100, **kwargs):
+        super(EthereumBlockSubscriber, self).__init__(**kwargs)
+        self.url = url
+        self.batch_size = batch_size
+        self.next_block_nr = 1
+
+    async def fetch_blocks(self):
+        rpc_client_pool = get_rpc_client_pool()
+        latest_block_nr = int(await rpc_client_pool.call(self.url, "eth_blockNumber"), 16)
+        last_block_nr = min(latest_block_nr, self.next_block_nr + self.batch_size - 1)
+        blocks = await rpc_client_pool.call_batch(self.url, "eth_getBlockByNumber",
+                                                  [[hex(block_nr), False]
+                                                   for block_nr in range(self.next_block_nr, last_block_nr + 1)])
+        new_blocks = []
+        for block in blocks:
+            if block is None:
+                break
+            block["number"] = int(block["number"], 16)
+            block["timestamp"] = int(block["timestamp"], 16)
+            new_blocks.append((block["timestamp"], block["transactions"], block))
+        self.next_block_nr += len(new_blocks)
+        return new_blocks
+
+
 class EthereumModule(BlockchainModule):
 
     def __init__(self, experiment):
@@ -35,7 +66,9 @@ class EthereumModule(BlockchainModule):
         self.poll_start_time = None
         self.tx_pool_lc = None
         self.submitted_transactions = {}
-        self.confirmed_transactions = {}
+        self.confirmed_txs_file = None
+        self.log_loop_task = None
+        self.block_subscriber = None
         self.data_dir = None
         self.geth_bin_path = os.path.join(os.environ["HOME"], "geth_bin", "geth")
 
@@ -197,6 +230,11 @@ class EthereumModule(BlockchainModule):
         self.ethereum_process = subprocess.Popen(cmd.split(" "), stdout=out_file)
         self._logger.info("Ethereum started...")
 
+        # Write the blocks while they are mined, instead of fetching all of them at the end of the experiment
+        self.block_subscriber = EthereumBlockSubscriber('http://localhost:%d' % rpc_port,
+                                                        blocks_filename="blockchain.txt")
+        self.block_subscriber.start()
+
     @experiment_callback
     def connect_eth_peers(self):
         """
@@ -345,20 +383,24 @@ class EthereumModule(BlockchainModule):
         contract = w3.eth.contract(address=address, abi=contract_interface['abi'])
         event_filter = contract.events.Transfer.createFilter(fromBlock='latest')
 
-        # Listen for transfer events
+        # Listen for transfer events. The clients identify their transactions by the identifier in the event, so we
+        # match the confirmations here and write them to confirmed_txs.txt while they arrive.
+        self.confirmed_txs_file = open("confirmed_txs.txt", "w")
+
         async def log_loop():
             while True:
                 for event in event_filter.get_new_entries():
                     print("EVENT: %s" % event)
                     complete_time = int(round(time.time() * 1000))
                     tx_id = event["args"]["identifier"]
-                    self.confirmed_transactions[tx_id] = complete_time
+                    self.confirmed_txs_file.write("%s,%d\n" % (tx_id, complete_time))
+                self.confirmed_txs_file.flush()
                 await sleep(0.5)
 
-        ensure_future(log_loop())
+        self.log_loop_task = ensure_future(log_loop())
 
     @experiment_callback
-    def write_stats(self):
+    async def write_stats(self):
         """
         Write away statistics.
         """
@@ -375,10 +417,13 @@ class EthereumModule(BlockchainModule):
             dir_size = ExperimentModule.get_dir_size("data")
             disk_out_file.write("%d" % dir_size)
 
-        # Write confirmed transactions
-        with open("confirmed_txs.txt", "w") as tx_file:
-            for tx_id, confirm_time in self.confirmed_transactions.items():
-                tx_file.write("%s,%d\n" % (tx_id, confirm_time))
+        # The confirmed transactions have been written while they arrived
+        if self.log_loop_task:
+            self.log_loop_task.cancel()
+            self.log_loop_task = None
+        if not self.confirmed_txs_file:
+            self.confirmed_txs_file = open("confirmed_txs.txt", "w")
+        self.confirmed_txs_file.close()
 
         url = 'http://localhost:%d/debug/metrics' % (16000 + self.experiment.my_id)
         response = requests.get(url).text
@@ -413,12 +458,10 @@ class EthereumModule(BlockchainModule):
         with open("hashrate.txt", "w") as hash_rate_file:
             hash_rate_file.write("%s" % w3.eth.hashrate)
 
-        # Dump blockchain
-        latest_block = w3.eth.getBlock('latest')
-        with open("blockchain.txt", "w") as out_file:
-            for block_nr in range(1, latest_block.number + 1):
-                block = w3.eth.getBlock(block_nr)
-                out_file.write(w3.toJSON(block) + "\n")
+        # Write the blocks that we have not received yet
+        if self.block_subscriber:
+            await self.block_subscriber.stop()
+            self.block_subscriber = None
 
     @experiment_callback
     def stop_ethereum(self):
@@ -2,8 +2,49 @@
 import json
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
-from gumby.statsparser import StatisticsParser
+import numpy as np
+
+from gumby.ipv8_statistics import MESSAGE_COUNTERS, read_ipv8_statistics
+from gumby.statsparser import StatisticsParser, aggregation_step
+
+
+def read_message_statistics(filename):
+    """
+    Read the statistics of a peer and sum the counters of each message over all overlays. The statistics are either
+    recorded as deltas (ipv8_statistics.csv) or as JSON lines (ipv8_statistics.txt), which are read line by line.
+    Returns the sorted sample times, the message ids, and an array with the counters of every message in every sample.
+    """
+    if filename.endswith(".csv"):
+        return read_ipv8_statistics(filename)
+
+    times = []
+    msg_indices = {}
+    entries = []
+    with open(filename) as stats_file:
+        for line in stats_file:
+            if not line.strip():
+                continue
+            stat_dict = json.loads(line)
+            sample_index = len(times)
+            times.append(stat_dict["time"])
+            for msg_stats_dict in stat_dict["stats"].values():
+                for msg_id, specific_msg_stats_dict in msg_stats_dict.items():
+                    msg_index = msg_indices.setdefault(msg_id, len(msg_indices))
+                    entries.append((sample_index, msg_index, specific_msg_stats_dict['num_up'],
+                                    specific_msg_stats_dict['num_down'], specific_msg_stats_dict['bytes_up'],
+                                    specific_msg_stats_dict['bytes_down']))
+
+    counters = np.zeros((len(times), len(msg_indices), len(MESSAGE_COUNTERS)), dtype=np.int64)
+    if entries:
+        entries = np.array(entries, dtype=np.int64)
+        np.add.at(counters, (entries[:, 0], entries[:, 1]), entries[:, 2:])
+
+    # Sort the samples on time
+    times = np.array(times, dtype=np.float64)
+    order = np.argsort(times, kind='stable')
+    return times[order], list(msg_indices), counters[order]
 
 
 class IPv8StatisticsParser(StatisticsParser):
@@ -11,95 +52,51 @@ class IPv8StatisticsParser(StatisticsParser):
     This class is responsible for parsing generic IPv8 statistics.
     """
 
+    @aggregation_step(inputs=("ipv8_statistics.txt", "ipv8_statistics.csv"), outputs=("ipv8_msg_stats.csv",))
     def aggregate_messages(self):
         """
-        Aggregate all messages sent during the experiment. For each client, we read all the written data and
-        reduce the statistics to intervals of 5 second.
+        Aggregate all messages sent during the experiment. For each bucket of IPV8_STATS_BUCKET_WIDTH seconds (5 by
+        default), we sum the last statistics that every peer reported before the end of the bucket. The files of the
+        peers are read by the worker processes that run_parsers assigned to this step.
         """
-        stats_per_peer = {}
-        for peer_nr, filename, dir in self.yield_files('ipv8_statistics.txt'):
-            stat_dicts = []
-            with open(filename) as stats_file:
-                content = stats_file.read()
-                for line in content.split('\n'):
-                    if not line:
-                        continue
-                    stat_dict = json.loads(line)
-                    stat_dicts.append((stat_dict["time"], stat_dict["stats"]))
-
-            if not stat_dicts:
-                continue
-
-            # Sort the stat_dicts on time
-            stat_dicts.sort(key=lambda tup: tup[0])
-
-            collapsed_stat_dicts = []
-
-            # Aggregate statistics for all available overlays
-            for stat_time, stat_dict in stat_dicts:
-                collapsed_stat_dict = {}
-                for _, msg_stats_dict in stat_dict.items():
-                    for msg_id, specific_msg_stats_dict in msg_stats_dict.items():
-                        if msg_id not in collapsed_stat_dict:
-                            collapsed_stat_dict[msg_id] = {'num_up': 0, 'num_down': 0, 'bytes_up': 0, 'bytes_down': 0}
-                        collapsed_stat_dict[msg_id]['num_up'] += specific_msg_stats_dict['num_up']
-                        collapsed_stat_dict[msg_id]['num_down'] += specific_msg_stats_dict['num_down']
-                        collapsed_stat_dict[msg_id]['bytes_up'] += specific_msg_stats_dict['bytes_up']
-                        collapsed_stat_dict[msg_id]['bytes_down'] += specific_msg_stats_dict['bytes_down']
-                collapsed_stat_dicts.append((stat_time, collapsed_stat_dict))
-
-            stats_per_peer[peer_nr] = collapsed_stat_dicts
+        bucket_width = float(os.environ.get("IPV8_STATS_BUCKET_WIDTH", "5"))
+        filenames = [filename for _, filename, _ in self.yield_files('ipv8_statistics.txt')]
+        filenames += [filename for _, filename, _ in self.yield_files('ipv8_statistics.csv')]
+        if len(filenames) > 1 and self.step_workers > 1:
+            with ProcessPoolExecutor(max_workers=self.step_workers) as executor:
+                peer_stats = list(executor.map(read_message_statistics, filenames, chunksize=16))
+        else:
+            peer_stats = [read_message_statistics(filename) for filename in filenames]
+        peer_stats = [stats for stats in peer_stats if len(stats[0])]
 
         # Find the largest time across all the files + different messages we have
-        msg_ids = set()
-        largest_time = 0
-        for stat_lists in stats_per_peer.values():
-            for stat_time, stat_dict in stat_lists:
-                if stat_time > largest_time:
-                    largest_time = stat_time
-                for msg_id in stat_dict.keys():
-                    msg_ids.add(msg_id)
-
+        msg_ids = sorted({msg_id for _, peer_msg_ids, _ in peer_stats for msg_id in peer_msg_ids})
         if not msg_ids:
             return
+        msg_indices = {msg_id: index for index, msg_id in enumerate(msg_ids)}
+        largest_time = max(times[-1] for times, _, _ in peer_stats)
+
+        # Round to multiples of the bucket width
+        num_buckets = int(round(largest_time / bucket_width)) + 1
+        bucket_ends = np.arange(num_buckets) * bucket_width
 
-        # Round to multiples of five
-        largest_time = int(round(largest_time / 5.0) * 5)
-
-        # We now construct the final list
-        results = []
-        for ind in range(0, largest_time // 5 + 1):
-            placeholder_dict = {}
-            for msg_id in msg_ids:
-                placeholder_dict[msg_id] = {'num_up': 0, 'num_down': 0, 'bytes_up': 0, 'bytes_down': 0}
-            results.append(placeholder_dict)
-
-        # We now actually fill in the results
-        for ind in range(1, largest_time // 5 + 1):
-            cur_time = ind * 5
-            for stats_list in stats_per_peer.values():
-                filtered_dicts = [stat_dict for stat_time, stat_dict in stats_list if stat_time <= cur_time]
-                if not filtered_dicts:
-                    continue
-                required_dict = filtered_dicts[-1]
-
-                # We have to merge the information now
-                for msg_id, msg_stats in required_dict.items():
-                    results[ind][msg_id]['num_up'] += msg_stats['num_up']
-                    results[ind][msg_id]['num_down'] += msg_stats['num_down']
-                    results[ind][msg_id]['bytes_up'] += msg_stats['bytes_up']
-                    results[ind][msg_id]['bytes_down'] += msg_stats['bytes_down']
+        # The first bucket is empty, the others contain the last statistics of each peer before their end
+        results = np.zeros((num_buckets, len(msg_ids), len(MESSAGE_COUNTERS)), dtype=np.int64)
+        for times, peer_msg_ids, counters in peer_stats:
+            sample_indices = np.searchsorted(times, bucket_ends[1:], side='right') - 1
+            buckets = np.nonzero(sample_indices >= 0)[0] + 1
+            columns = [msg_indices[msg_id] for msg_id in peer_msg_ids]
+            results[np.ix_(buckets, columns)] += counters[sample_indices[buckets - 1]]
 
         # Write the information to a file
         with open(os.path.join(self.node_directory, 'ipv8_msg_stats.csv'), 'w') as output_file:
             output_file.write("time,msg_id,num_up,num_down,bytes_up,bytes_down\n")
-            for ind, stats in enumerate(results):
-                cur_time = ind * 5
-                for msg_id, msg_stats in stats.items():
-                    output_file.write("%d,%s,%d,%d,%d,%d\n" % (cur_time, msg_id, msg_stats['num_up'],
-                                                               msg_stats['num_down'], msg_stats['bytes_up'],
-                                                               msg_stats['bytes_down']))
+            for bucket_end, bucket_results in zip(bucket_ends.tolist(), results.tolist()):
+                bucket_time = ("%f" % bucket_end).rstrip("0").rstrip(".")
+                output_file.writelines("%s,%s,%d,%d,%d,%d\n" % (bucket_time, msg_id, *msg_results)
+                                       for msg_id, msg_results in zip(msg_ids, bucket_results))
 
+    @aggregation_step(inputs=("verified_peers.txt",), outputs=("peer_connections.log",))
     def aggregate_peer_connections(self):
         peers_connections = set()
 
@@ -113,6 +110,7 @@ class IPv8StatisticsParser(StatisticsParser):
             for peer_a, peer_b in peers_connections:
                 connections_file.write("%d,%d\n" % (peer_a, peer_b))
 
+    @aggregation_step(inputs=("bandwidth.txt",), outputs=("total_bandwidth.log",))
     def aggregate_bandwidth(self):
         total_up, total_down = 0, 0
         for peer_nr, filename, dir in self.yield_files('bandwidth.txt'):
@@ -124,6 +122,7 @@ class IPv8StatisticsParser(StatisticsParser):
         with open('total_bandwidth.log', 'w') as output_file:
             output_file.write("%s,%s,%s\n" % (total_up, total_down, (total_up + total_down) / 2))
 
+    @aggregation_step(inputs=("autoplot.txt",), outputs=("autoplot",))
     def aggregate_autoplot(self):
         autoplot_dict = {}
         for peer_nr, filename, dir in self.yield_files('autoplot.txt'):
@@ -145,6 +144,7 @@ class IPv8StatisticsParser(StatisticsParser):
             with open(os.path.join('autoplot', filename), 'w') as output_file:
                 output_file.write(autoplot_dict[filename])
 
+    @aggregation_step(inputs=("annotations.csv",), outputs=("annotations.csv",))
     def aggregate_annotations(self):
         annotation_dict = {}
         for _, filename, _ in self.yield_files('annotations.csv'):
@@ -170,17 +170,9 @@ class IPv8StatisticsParser(StatisticsParser):
                 annotation_avg_time = sum(annotation_times) / len(annotation_times)
                 annotations_file.write("%f,%s\n" % (annotation_avg_time, annotation_name))
 
-    def run(self):
-        self.aggregate_annotations()
-        self.aggregate_messages()
-        self.aggregate_peer_connections()
-        self.aggregate_bandwidth()
-        self.aggregate_autoplot()
-
-
 if __name__ == "__main__":
     # cd to the output directory
     os.chdir(os.environ['OUTPUT_DIR'])
 
     parser = IPv8StatisticsParser(sys.argv[1])
-    parser.run()
+    parser.run_parallel()
@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""
+Aggregate the loop lag, scenario dispatch and slow callback measurements of the LoopMonitorModule of all peers.
+"""
+import os
+import sys
+
+from gumby.statsparser import LoopMonitorStatisticsParser
+
+if __name__ == "__main__":
+    # cd to the output directory
+    os.chdir(os.environ['OUTPUT_DIR'])
+
+    parser = LoopMonitorStatisticsParser(sys.argv[1])
+    parser.run_parallel()
@@ -0,0 +1,3 @@
+"""
+This module contains code to benchmark the transaction submission of gumby against a mock blockchain.
+"""
@@ -0,0 +1,141 @@
+import json
+import os
+from asyncio import ensure_future, sleep
+from urllib.parse import quote_plus
+
+from gumby.block_subscriber import BlockSubscriber
+from gumby.experiment import experiment_callback
+from gumby.mock_chain import MockChain, MockChainNode
+from gumby.modules.blockchain_module import BlockchainModule
+from gumby.rpc_client import get_rpc_client_pool
+
+
+class MockChainBlockSubscriber(BlockSubscriber):
+    """
+    Follows the blocks of a mock chain, through its Ethereum API.
+    """
+
+    def __init__(self, url, batch_size=100, **kwargs):
+        super(MockChainBlockSubscriber, self).__init__(**kwargs)
+        self.url = url
+        self.batch_size = batch_size
+        self.next_block_nr = 1
+
+    async def fetch_blocks(self):
+        rpc_client_pool = get_rpc_client_pool()
+        last_block_nr = min(int(await rpc_client_pool.call(self.url, "eth_blockNumber"), 16),
+                            self.next_block_nr + self.batch_size - 1)
+        blocks = await rpc_client_pool.call_batch(self.url, "eth_getBlockByNumber",
+                                                  [[hex(block_nr), False]
+                                                   for block_nr in range(self.next_block_nr, last_block_nr + 1)])
+        self.next_block_nr = last_block_nr + 1
+        return [(int(block["timestamp"], 16), block["transactions"], None) for block in blocks]
+
+
+class MockChainModule(BlockchainModule):
+    """
+    Validators run a mock chain node, and clients submit transactions to it through the same path as the other
+    blockchain modules: the transactions module, the load generator and the shared RPC client pool.
+    """
+
+    def __init__(self, experiment):
+        super(MockChainModule, self).__init__(experiment)
+        # The API of the chain that the clients mimic: ethereum, avalanche or stellar
+        self.api = os.environ.get("MOCK_CHAIN_API", "ethereum")
+        self.latency = float(os.environ.get("MOCK_CHAIN_LATENCY", "1"))
+        self.capacity = int(os.environ.get("MOCK_CHAIN_CAPACITY", "100000"))
+        self.block_interval = float(os.environ.get("MOCK_CHAIN_BLOCK_INTERVAL", "1"))
+        self.mempool_size = int(os.environ.get("MOCK_CHAIN_MEMPOOL_SIZE", "1000000"))
+        # How clients learn about the confirmation of their transactions: by following the blocks of the chain
+        # (only with the ethereum API), by polling the status of every transaction, like some of the real modules do,
+        # or not at all
+        self.confirmations = os.environ.get("MOCK_CHAIN_CONFIRMATIONS", "blocks" if self.api == "ethereum" else "poll")
+        self.node = None
+        self.validator_url = None
+        self.block_subscriber = None
+
+    def on_all_vars_received(self):
+        super(MockChainModule, self).on_all_vars_received()
+        self.transactions_manager.transfer = self.transfer
+
+        validator_peer_id = ((self.my_id - 1) % self.num_validators) + 1
+        host, _ = self.experiment.get_peer_ip_port_by_id(validator_peer_id)
+        self.validator_url = "http://%s:%d" % (host, 12000 + validator_peer_id)
+
+        if self.is_client() and self.confirmations == "blocks":
+            self.block_subscriber = MockChainBlockSubscriber(self.validator_url, poll_interval=self.block_interval / 2)
+            # We measure the time at which we learn about the confirmation
+            self.block_subscriber.confirmed_callback = lambda tx_id, _: \
+                self.transactions_manager.confirm_transaction(tx_id)
+            self.block_subscriber.start()
+
+    @experiment_callback
+    async def start_mock_chain(self):
+        if self.is_client():
+            return
+
+        chain = MockChain(latency=self.latency, capacity=self.capacity, block_interval=self.block_interval,
+                          mempool_size=self.mempool_size)
+        self.node = MockChainNode(chain)
+        await self.node.start("0.0.0.0", 12000 + self.my_id)
+        self._logger.info("Started mock chain node on port %d", 12000 + self.my_id)
+
+    @experiment_callback
+    async def stop_mock_chain(self):
+        if self.block_subscriber:
+            await self.block_subscriber.stop(catch_up=False)
+        if self.node:
+            await self.node.stop()
+
+    async def transfer(self):
+        rpc_client_pool = get_rpc_client_pool()
+        if self.api == "avalanche":
+            result = await rpc_client_pool.call(self.validator_url + "/ext/bc/X/wallet", "wallet.send",
+                                                [{"assetID": "AVAX", "amount": 100}])
+            tx_id = result["txID"]
+        elif self.api == "stellar":
+            _, body = await rpc_client_pool.get(self.validator_url + "/tx?blob=%s" % quote_plus("mock"))
+            response = json.loads(body)
+            if response["status"] != "PENDING":
+                raise RuntimeError("Transaction not accepted, status %s" % response["status"])
+            # Stellar has no endpoint to poll for the status of a transaction
+            return response["hash"]
+        else:
+            tx_id = await rpc_client_pool.call(self.validator_url, "eth_sendTransaction", [{"value": hex(100)}])
+
+        if self.confirmations == "blocks":
+            self.block_subscriber.track(tx_id)
+        elif self.confirmations == "poll":
+            ensure_future(self.poll_confirmation(tx_id))
+        return tx_id
+
+    async def poll_confirmation(self, tx_id):
+        rpc_client_pool = get_rpc_client_pool()
+        while True:
+            await sleep(0.5)
+            if self.api == "avalanche":
+                result = await rpc_client_pool.call(self.validator_url + "/ext/bc/X", "avm.getTxStatus",
+                                                    [{"txID": tx_id}])
+                confirmed = result["status"] == "Accepted"
+            else:
+                confirmed = await rpc_client_pool.call(self.validator_url, "eth_getTransactionReceipt", [tx_id])
+            if confirmed:
+                self.transactions_manager.confirm_transaction(tx_id)
+                return
+
+    @experiment_callback
+    def write_stats(self):
+        if self.is_client():
+            # The sustained rate is aggregated per node, so we write down where this instance ran
+            host, _ = self.experiment.get_peer_ip_port_by_id(self.my_id)
+            with open("host.txt", "w") as host_file:
+                host_file.write(host)
+            return
+
+        start_time = self.experiment.scenario_runner.exp_start_time
+        with open("mock_chain_blocks.csv", "w") as blocks_file:
+            blocks_file.write("time,transactions\n")
+            for block_time, tx_ids, _ in self.node.chain.blocks:
+                blocks_file.write("%f,%d\n" % (block_time - start_time, len(tx_ids)))
+        with open("mock_chain_rejected.txt", "w") as rejected_file:
+            rejected_file.write("%d" % self.node.chain.rejected)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+import os
+import sys
+from collections import defaultdict
+
+import numpy
+
+from gumby.post_process_blockchain import BlockchainTransactionsParser
+
+
+class MockChainStatisticsParser(BlockchainTransactionsParser):
+    """
+    Parse the transactions submitted to a mock chain, and determine the highest rate at which gumby could submit them.
+    """
+
+    def __init__(self, node_directory):
+        super(MockChainStatisticsParser, self).__init__(node_directory)
+        # The rate of the load generator increases every step
+        self.step_duration = float(os.environ.get("TX_RAMP_STEP_DURATION", "10")) * 1000
+        # A step is sustained if (almost) all its transactions were acked within this many milliseconds
+        self.max_lag = float(os.environ.get("MOCK_CHAIN_MAX_LAG", "1")) * 1000
+        self.requests = {}
+
+    def parse_transactions(self):
+        for peer_nr, filename, _ in self.yield_files('tx_requests.csv'):
+            with open(filename) as requests_file:
+                lines = [line.rstrip("\n").split(",") for line in requests_file.readlines()[1:] if line.strip()]
+            if not lines:
+                continue
+
+            self.requests[peer_nr] = numpy.array([[int(value) for value in parts[1:]] for parts in lines])
+            for parts in lines:
+                submit_time, confirm_time = int(parts[2]), int(parts[4])
+                if submit_time == -1:
+                    continue
+                submit_time -= self.avg_start_time
+                tx_latency = -1
+                if confirm_time != -1:
+                    confirm_time -= self.avg_start_time
+                    tx_latency = confirm_time - submit_time
+                self.transactions.append((peer_nr, parts[0], submit_time, confirm_time, tx_latency))
+
+    def get_sustained_rate(self, requests):
+        """
+        Return the highest rate of the load generator, in transactions per second, before the first step in which
+        more than 1% of the transactions were dropped or acked too late.
+        """
+        intended_times, ack_times = requests[:, 0], requests[:, 2]
+        steps = ((intended_times - intended_times.min()) // self.step_duration).astype(numpy.int64)
+        num_steps = steps.max()  # The last step is incomplete
+        requested = numpy.bincount(steps, minlength=num_steps)[:num_steps]
+        acked = numpy.bincount(steps[(ack_times != -1) & (ack_times - intended_times <= self.max_lag)],
+                               minlength=num_steps)[:num_steps]
+
+        sustained_rate = 0
+        for num_requested, num_acked in zip(requested, acked):
+            if num_acked < 0.99 * num_requested:
+                break
+            sustained_rate = max(sustained_rate, num_requested * 1000 / self.step_duration)
+        return sustained_rate
+
+    def compute_sustained_rates(self):
+        hosts = {}
+        for peer_nr, filename, _ in self.yield_files('host.txt'):
+            with open(filename) as host_file:
+                hosts[peer_nr] = host_file.read().strip()
+
+        node_rates = defaultdict(list)
+        with open("sustained_rate.csv", "w") as out_file:
+            out_file.write("peer_id,host,sustained_rate\n")
+            for peer_nr, requests in sorted(self.requests.items()):
+                sustained_rate = self.get_sustained_rate(requests)
+                host = hosts.get(peer_nr, "unknown")
+                node_rates[host].append(sustained_rate)
+                out_file.write("%d,%s,%f\n" % (peer_nr, host, sustained_rate))
+
+        with open("sustained_rate_per_node.csv", "w") as out_file:
+            out_file.write("host,instances,sustained_rate\n")
+            for host, rates in sorted(node_rates.items()):
+                out_file.write("%s,%d,%f\n" % (host, len(rates), sum(rates)))
+                print("Node %s sustained %.1f tx/s over %d instances (at most %.1f tx/s per instance)" %
+                      (host, sum(rates), len(rates), max(rates)))
+
+    def run(self):
+        self.parse()
+        self.compute_sustained_rates()
+
+
+# cd to the output directory
+os.chdir(os.environ['OUTPUT_DIR'])
+
+parser = MockChainStatisticsParser(sys.argv[1])
+parser.run()
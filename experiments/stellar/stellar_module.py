@@ -1,3 +1,4 @@
+import json
 import os
 import random
 import shlex
@@ -6,7 +7,6 @@ import subprocess
 import time
 from asyncio import get_event_loop, sleep
 from datetime import datetime
-from threading import Thread
 from urllib.parse import quote_plus
 
 import requests
@@ -14,8 +14,45 @@ import requests
 from stellar_sdk import Account, AiohttpClient, Keypair, Server, TransactionBuilder, TransactionEnvelope
 from stellar_sdk.exceptions import NotFoundError
 
+from gumby.block_subscriber import BlockSubscriber
 from gumby.experiment import experiment_callback
 from gumby.modules.blockchain_module import BlockchainModule
+from gumby.rpc_client import get_rpc_client_pool
+
+NETWORK_PASSPHRASE = "Standalone Pramati Network ; Oct 2018"
+
+
+class StellarLedgerSubscriber(BlockSubscriber):
+    """
+    Fetches the transactions in closed ledgers from Horizon, a page at a time.
+    """
+
+    def __init__(self, horizon_url, page_size=200, **kwargs):
+        super(StellarLedgerSubscriber, self).__init__(**kwargs)
+        self.horizon_url = horizon_url
+        self.page_size = page_size
+        self.cursor = None
+
+    async def fetch_blocks(self):
+        url = "%s/transactions?order=asc&limit=%d&include_failed=true" % (self.horizon_url, self.page_size)
+        if self.cursor:
+            url += "&cursor=%s" % self.cursor
+        _, body = await get_rpc_client_pool().get(url)
+        records = json.loads(body)["_embedded"]["records"]
+        if not records:
+            return []
+        self.cursor = records[-1]["paging_token"]
+
+        ledgers = {}
+        for transaction in records:
+            te = TransactionEnvelope.from_xdr(transaction["envelope_xdr"], NETWORK_PASSPHRASE)
+            tx_id = te.transaction.source.public_key + "." + "%d" % (te.transaction.sequence - 1)
+            if transaction["ledger"] not in ledgers:
+                # The creation time of a transaction is the close time of its ledger
+                close_time = datetime.fromisoformat(transaction["created_at"].replace("Z", "+00:00")).timestamp()
+                ledgers[transaction["ledger"]] = (close_time, [])
+            ledgers[transaction["ledger"]][1].append(tx_id)
+        return [(close_time, tx_ids, None) for close_time, tx_ids in ledgers.values()]
 
 
 class StellarModule(BlockchainModule):
@@ -37,6 +74,7 @@ class StellarModule(BlockchainModule):
         self.tx_submit_times = {}
         self.current_account_nr = 0
         self.root_seq_num = 0
+        self.ledger_subscriber = None
 
     def on_all_vars_received(self):
         super(StellarModule, self).on_all_vars_received()
@@ -274,7 +312,7 @@ ADDRESS="%s:%d"
 
         builder = TransactionBuilder(
             source_account=root_account,
-            network_passphrase="Standalone Pramati Network ; Oct 2018"
+            network_passphrase=NETWORK_PASSPHRASE
         )
 
         async def append_create_account_op(builder, root_keypair, receiver_pub_key, amount):
@@ -294,7 +332,7 @@ ADDRESS="%s:%d"
                 partial_root_acc = Account(root_keypair.public_key, self.root_seq_num)
                 builder = TransactionBuilder(
                     source_account=partial_root_acc,
-                    network_passphrase="Standalone Pramati Network ; Oct 2018"
+                    network_passphrase=NETWORK_PASSPHRASE
                 )
 
             return builder
@@ -343,7 +381,7 @@ ADDRESS="%s:%d"
                     self._logger.warning("Unable to fetch sequence number for account %d!", account_ind)
 
     @experiment_callback
-    def transfer(self):
+    async def transfer(self):
         if not self.is_client():
             return
 
@@ -357,7 +395,7 @@ ADDRESS="%s:%d"
                                  self.sequence_numbers[self.current_account_nr])
         builder = TransactionBuilder(
             source_account=sender_account,
-            network_passphrase="Standalone Pramati Network ; Oct 2018"
+            network_passphrase=NETWORK_PASSPHRASE
         )
 
         builder.append_payment_op(self.receiver_keypair.public_key, '100', 'XLM')
@@ -366,30 +404,28 @@ ADDRESS="%s:%d"
 
         self._logger.info("Submitting transaction with id %d", self.sequence_numbers[self.current_account_nr])
 
-        def send_transaction(tx, seq_num, account_nr):
-            tx_id = self.sender_keypairs[self.current_account_nr].public_key + "." + "%d" % seq_num
-            submit_time = int(round(time.time() * 1000))
-            response = requests.get("http://%s:%d/tx?blob=%s"
-                                    % (host, 11000 + validator_peer_id, quote_plus(tx)))
-            self._logger.info("Received response for transaction with account %d and id %d: %s",
-                              account_nr, seq_num, response.text)
-            if response.status_code != 200 or response.json()["status"] != "PENDING":
-                # Restore seq num
-                new_seq_num = builder.get_sequence()
-                self.sequence_numbers[account_nr] = new_seq_num
-                self._logger.info("Reset sequence number of account %d from %d to %d", account_nr, seq_num, new_seq_num)
-            elif response.json()["status"] == "PENDING":
-                self.tx_submit_times[tx_id] = submit_time
-
-        t = Thread(target=send_transaction,
-                   args=(tx.to_xdr(), self.sequence_numbers[self.current_account_nr], self.current_account_nr))
-        t.daemon = True
-        t.start()
-
+        seq_num = self.sequence_numbers[self.current_account_nr]
+        account_nr = self.current_account_nr
+        tx_id = self.sender_keypairs[account_nr].public_key + "." + "%d" % seq_num
         self.sequence_numbers[self.current_account_nr] += 1
         self.current_tx_num += 1
         self.current_account_nr = (self.current_account_nr + 1) % self.num_accounts_per_client
 
+        submit_time = int(round(time.time() * 1000))
+        status, body = await get_rpc_client_pool().get("http://%s:%d/tx?blob=%s" % (host, 11000 + validator_peer_id,
+                                                                                    quote_plus(tx.to_xdr())))
+        self._logger.info("Received response for transaction with account %d and id %d: %s",
+                          account_nr, seq_num, body)
+        if status != 200 or json.loads(body)["status"] != "PENDING":
+            # Restore seq num
+            new_seq_num = builder.get_sequence()
+            self.sequence_numbers[account_nr] = new_seq_num
+            self._logger.info("Reset sequence number of account %d from %d to %d", account_nr, seq_num, new_seq_num)
+            return None
+
+        self.tx_submit_times[tx_id] = submit_time
+        return tx_id
+
     @experiment_callback
     def write_stats(self):
         if not self.is_client():
@@ -410,38 +446,25 @@ ADDRESS="%s:%d"
                 tx_submit_times_file.write("%s,%d\n" % (tx_id, submit_time))
 
     @experiment_callback
-    def parse_ledgers(self):
+    def start_tracking_ledgers(self):
+        """
+        Write the close time of every transaction while the ledgers close.
+        """
+        self._logger.info("Start tracking ledgers...")
+        self.ledger_subscriber = StellarLedgerSubscriber("http://127.0.0.1:%d" % (19000 + self.my_id),
+                                                         confirmations_filename="tx_finalized_times.txt")
+        self.ledger_subscriber.start()
+
+    @experiment_callback
+    async def parse_ledgers(self):
+        """
+        Write the close times of the transactions that we have not written yet.
+        """
         self._logger.info("Parsing ledgers...")
-        horizon_url = "http://127.0.0.1:%d" % (19000 + self.my_id)
-
-        response = requests.get(horizon_url + "/ledgers?limit=100")
-        ledgers = response.json()
-        tx_times = {}
-        for ledger_info in ledgers["_embedded"]["records"]:
-            ledger_sq = ledger_info["sequence"]
-            self._logger.info("Parsing ledger %d...", ledger_sq)
-            close_time = datetime.fromisoformat(ledger_info["closed_at"].replace("Z", "+00:00")).timestamp() * 1000
-
-            # Get the transactions in this ledger
-            transactions_url = "%s/ledgers/%d/transactions?limit=200&include_failed=True" % (horizon_url, ledger_sq)
-            response = requests.get(transactions_url)
-            transactions = response.json()
-            while True:
-                if not transactions["_embedded"]["records"]:
-                    break
-
-                for transaction in transactions["_embedded"]["records"]:
-                    te = TransactionEnvelope.from_xdr(transaction["envelope_xdr"],
-                                                      "Standalone Pramati Network ; Oct 2018")
-                    tx_id = te.transaction.source.public_key + "." + "%d" % (te.transaction.sequence - 1)
-                    tx_times[tx_id] = close_time
-
-                response = requests.get(transactions["_links"]["next"]["href"])
-                transactions = response.json()
-
-        with open("tx_finalized_times.txt", "w") as tx_finalized_times_file:
-            for tx_id, close_time in tx_times.items():
-                tx_finalized_times_file.write("%s,%d\n" % (tx_id, close_time))
+        if not self.ledger_subscriber:
+            self.start_tracking_ledgers()
+        await self.ledger_subscriber.stop()
+        self.ledger_subscriber = None
 
     @experiment_callback
     def stop(self):
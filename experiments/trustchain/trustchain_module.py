@@ -8,6 +8,7 @@ from anydex.trustchain.community import TrustChainCommunity
 from anydex.trustchain.listener import BlockListener
 
 from gumby.experiment import experiment_callback
+from gumby.metrics import get_metrics_sink
 from gumby.modules.community_experiment_module import IPv8OverlayExperimentModule
 from gumby.util import run_task
 
@@ -33,6 +34,7 @@ class GeneratedBlockListener(BlockListener):
     def __init__(self, mes_file):
         # File to safe measurements
         self.file_name = mes_file
+        self.writer = csv.DictWriter(get_metrics_sink().open(mes_file), ['time', 'transaction'])
         self.start_time = None
 
     def should_sign(self, _):
@@ -43,9 +45,7 @@ class GeneratedBlockListener(BlockListener):
         if not self.start_time:
             # First block received
             self.start_time = time()
-        with open(self.file_name, "a") as t_file:
-            writer = csv.DictWriter(t_file, ['time', 'transaction'])
-            writer.writerow({"time": time() - self.start_time, 'transaction': str(block.transaction)})
+        self.writer.writerow({"time": time() - self.start_time, 'transaction': str(block.transaction)})
 
 
 class TrustchainModule(IPv8OverlayExperimentModule):
@@ -68,9 +68,8 @@ class TrustchainModule(IPv8OverlayExperimentModule):
     def init_leader_trustchain(self):
         # Open projects output directory and save blocks arrival time
         self.block_stat_file = os.path.join(os.environ['PROJECT_DIR'], 'output', 'leader_blocks_time.csv')
-        with open(self.block_stat_file, "w") as t_file:
-            writer = csv.DictWriter(t_file, ['time', 'transaction'])
-            writer.writeheader()
+        writer = csv.DictWriter(get_metrics_sink().open(self.block_stat_file, "w"), ['time', 'transaction'])
+        writer.writeheader()
         self.overlay.add_listener(GeneratedBlockListener(self.block_stat_file), [b'test'])
 
     @experiment_callback
@@ -0,0 +1,114 @@
+"""
+Follow the blocks of a chain while an experiment runs.
+
+Instead of dumping the chain and reconstructing confirmation times when the experiment ends, a block subscriber polls
+a node for new blocks during the experiment, and writes every block and the confirmation time of every transaction
+in it as soon as the block arrives. If the subscriber tracks a set of transactions, only the confirmations of these
+transactions are recorded.
+"""
+import json
+import logging
+from abc import abstractmethod
+from asyncio import CancelledError, ensure_future, sleep
+
+
+class BlockSubscriber(object):
+    """
+    Subclasses implement fetch_blocks, which returns the blocks after the ones that have been fetched already.
+    """
+
+    def __init__(self, blocks_filename=None, confirmations_filename=None, poll_interval=1.0, track_transactions=False):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.blocks_filename = blocks_filename
+        self.confirmations_filename = confirmations_filename
+        self.poll_interval = poll_interval
+        # With track_transactions, we record the tracked transactions only, also before the first one is tracked
+        self.tracked_transactions = set() if track_transactions else None
+        self.confirmed_callback = None
+        self.num_blocks = 0
+        self.num_confirmed = 0
+        self.blocks_file = None
+        self.confirmations_file = None
+        self.task = None
+
+    @abstractmethod
+    async def fetch_blocks(self):
+        """
+        Return the new blocks as (block_time, tx_ids, block) tuples, with the block time in seconds since the epoch.
+        The block is written to the blocks file, if it is not None.
+        """
+        raise NotImplementedError
+
+    def track(self, tx_id):
+        """
+        Only record the confirmation of the given transaction, and of other tracked transactions.
+        """
+        if self.tracked_transactions is None:
+            self.tracked_transactions = set()
+        self.tracked_transactions.add(tx_id)
+
+    def start(self):
+        if self.blocks_filename:
+            self.blocks_file = open(self.blocks_filename, "w")
+        if self.confirmations_filename:
+            self.confirmations_file = open(self.confirmations_filename, "w")
+        self.task = ensure_future(self.run())
+
+    async def stop(self, catch_up=True):
+        """
+        Stop following the chain. Unless catch_up is False, we first fetch the blocks we have not seen yet.
+        """
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        try:
+            while catch_up and await self.poll():
+                pass
+        except Exception as e:
+            self._logger.warning("Failed to fetch the last blocks: %s", e)
+        finally:
+            for out_file in (self.blocks_file, self.confirmations_file):
+                if out_file:
+                    out_file.close()
+            self.blocks_file = self.confirmations_file = None
+
+    async def run(self):
+        while True:
+            try:
+                if await self.poll():
+                    # There might be more blocks waiting
+                    continue
+            except CancelledError:
+                raise
+            except Exception as e:
+                self._logger.warning("Failed to fetch blocks: %s", e)
+            await sleep(self.poll_interval)
+
+    async def poll(self):
+        """
+        Fetch and process the new blocks, and return whether there were any.
+        """
+        blocks = await self.fetch_blocks()
+        for block_time, tx_ids, block in blocks:
+            self.process_block(block_time, tx_ids, block)
+        for out_file in (self.blocks_file, self.confirmations_file):
+            if out_file:
+                out_file.flush()
+        return bool(blocks)
+
+    def process_block(self, block_time, tx_ids, block):
+        self.num_blocks += 1
+        if self.blocks_file and block is not None:
+            self.blocks_file.write(json.dumps(block) + "\n")
+
+        for tx_id in tx_ids:
+            if self.tracked_transactions is not None:
+                if tx_id not in self.tracked_transactions:
+                    continue
+                self.tracked_transactions.discard(tx_id)
+
+            self.num_confirmed += 1
+            if self.confirmations_file:
+                self.confirmations_file.write("%s,%d\n" % (tx_id, round(block_time * 1000)))
+            if self.confirmed_callback:
+                self.confirmed_callback(tx_id, block_time)
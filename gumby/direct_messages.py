@@ -0,0 +1,136 @@
+"""
+Direct messages between experiment clients.
+
+By default, the messages that clients send to each other are forwarded by the sync server. When direct messages are
+enabled, every client listens on a port of its own and shares it with the other clients through the sync server, as
+the msg_port variable. Once the experiment is running, a client opens a connection to every peer it sends messages to
+and keeps it open for the next messages. Messages to peers that do not listen for direct messages, or that cannot be
+reached, are sent through the sync server instead. The same holds for messages to a peer whose connection has been
+lost or is closing: these are sent through the sync server, and we connect again for the next message.
+
+Direct messages are delivered at most once. A message that has been written to a connection that breaks before the
+peer reads it is lost, just like a message to a peer that stopped.
+"""
+import logging
+import socket
+from asyncio import TimeoutError, ensure_future, get_event_loop, wait_for
+
+from gumby.line_receiver import LineReceiver
+
+# The number of seconds we wait for a connection with a peer before sending the messages through the sync server
+CONNECT_TIMEOUT = 5
+
+
+class DirectMessageProto(LineReceiver):
+    # Allow for 4MB long messages, like the sync server
+    MAX_LENGTH = 2 ** 22
+
+    def __init__(self, endpoint, peer_id=None):
+        super(DirectMessageProto, self).__init__()
+        self.endpoint = endpoint
+        self.peer_id = peer_id
+
+    def connection_made(self, transport):
+        super(DirectMessageProto, self).connection_made(transport)
+        self.endpoint.protocols.add(self)
+
+    def line_received(self, line):
+        # Direct messages have the same format as the messages forwarded by the sync server
+        self.endpoint.client.proto_running(line)
+
+    def connection_lost(self, exc):
+        self.endpoint.connection_lost(self)
+
+
+class DirectMessageEndpoint:
+
+    def __init__(self, client):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.client = client
+        self.connections = {}
+        self.pending_messages = {}
+        self.unreachable_peers = set()
+        self.protocols = set()
+        self.server_task = None
+
+    def listen(self):
+        """
+        Start listening for direct messages from other clients, and return the port we listen on.
+        """
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.bind(('0.0.0.0', 0))
+        sock.listen(socket.SOMAXCONN)
+        self.server_task = ensure_future(get_event_loop().create_server(lambda: DirectMessageProto(self), sock=sock))
+        return sock.getsockname()[1]
+
+    def close(self):
+        """
+        Stop listening for direct messages, and close all connections with other clients.
+        """
+        if self.server_task:
+            if self.server_task.done() and not self.server_task.cancelled() and not self.server_task.exception():
+                self.server_task.result().close()
+            else:
+                self.server_task.cancel()
+            self.server_task = None
+        for proto in list(self.protocols):
+            if proto.transport:
+                proto.transport.close()
+
+    def get_peer_address(self, peer_id):
+        peer_vars = self.client.all_vars.get(str(peer_id), {})
+        if "msg_port" not in peer_vars:
+            return None
+        return peer_vars["host"], int(peer_vars["msg_port"])
+
+    def send_message(self, peer_id, msg_type, msg):
+        if peer_id in self.unreachable_peers or not self.get_peer_address(peer_id):
+            self.client.send_message_via_server(peer_id, msg_type, msg)
+        elif peer_id in self.connections:
+            if not self.send_direct_message(self.connections[peer_id], msg_type, msg):
+                self.client.send_message_via_server(peer_id, msg_type, msg)
+        elif peer_id in self.pending_messages:
+            self.pending_messages[peer_id].append((msg_type, msg))
+        else:
+            self.pending_messages[peer_id] = [(msg_type, msg)]
+            ensure_future(self.connect(peer_id))
+
+    async def connect(self, peer_id):
+        host, port = self.get_peer_address(peer_id)
+        try:
+            _, proto = await wait_for(get_event_loop().create_connection(lambda: DirectMessageProto(self, peer_id),
+                                                                        host, port), CONNECT_TIMEOUT)
+        except (OSError, TimeoutError) as e:
+            self._logger.warning("Could not connect to peer %d at %s:%d (%s), using the sync server instead",
+                                 peer_id, host, port, e)
+            self.unreachable_peers.add(peer_id)
+            for msg_type, msg in self.pending_messages.pop(peer_id):
+                self.client.send_message_via_server(peer_id, msg_type, msg)
+            return
+
+        self.connections[peer_id] = proto
+        for msg_type, msg in self.pending_messages.pop(peer_id):
+            if not self.send_direct_message(proto, msg_type, msg):
+                self.client.send_message_via_server(peer_id, msg_type, msg)
+
+    def send_direct_message(self, proto, msg_type, msg):
+        """
+        Write a message to the connection with a peer, and return whether we could. If the connection is closing or
+        the write fails, we forget about the connection.
+        """
+        if proto.transport and not proto.transport.is_closing():
+            try:
+                proto.send_line(b"msg:%d:%s:%s" % (self.client.my_id, msg_type, msg))
+                return True
+            except (OSError, RuntimeError) as e:
+                self._logger.warning("Could not send a message to peer %d (%s)", proto.peer_id, e)
+                proto.transport.abort()
+        if self.connections.get(proto.peer_id) is proto:
+            self.connections.pop(proto.peer_id)
+        return False
+
+    def connection_lost(self, proto):
+        self.protocols.discard(proto)
+        if proto.peer_id is not None and self.connections.get(proto.peer_id) is proto:
+            # We connect again when we send the next message to this peer
+            self.connections.pop(proto.peer_id)
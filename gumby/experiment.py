@@ -10,8 +10,11 @@ from os import chdir, environ, makedirs, path
 from time import time
 from typing import List, Optional
 
-from gumby.line_receiver import LineReceiver
+from gumby.direct_messages import DirectMessageEndpoint
+from gumby.line_receiver import FRAME_CODECS, LineReceiver
+from gumby.metrics import get_metrics_sink
 from gumby.modules.experiment_module import ExperimentModule
+from gumby.rpc_client import close_rpc_client_pool
 from gumby.scenario import ScenarioRunner
 
 
@@ -57,11 +60,18 @@ class ExperimentClient(LineReceiver):
         self.all_vars = {}
         self.server_vars = {}
         self.time_offset = None
+        self.frame_codec = None
         self.scenario_runner = ScenarioRunner()
         self.scenario_runner.preprocessor_callbacks["module"] = self._preproc_module
         self.loaded_experiment_module_classes = []
         self.scenario_file = environ.get("SCENARIO_FILE", None)
         self.message_callback = None
+        self.direct_messages = None
+        # @CONF_OPTION SYNC_DIRECT_MESSAGES: Send the messages between clients directly instead of through the sync
+        # server, once the experiment is running. Direct messages are delivered at most once, see direct_messages.py.
+        # (default is False)
+        if environ.get("SYNC_DIRECT_MESSAGES", "").lower() == "true":
+            self.direct_messages = DirectMessageEndpoint(self)
 
         # Beware! The ordering of modules is important, specifically on calling the event handlers.
         self.experiment_modules = []
@@ -98,6 +108,12 @@ class ExperimentClient(LineReceiver):
             self.state = state_handler(line)
 
     def send_message(self, peer_id, msg_type, msg):
+        if self.direct_messages and self.state == "running":
+            self.direct_messages.send_message(peer_id, msg_type, msg)
+        else:
+            self.send_message_via_server(peer_id, msg_type, msg)
+
+    def send_message_via_server(self, peer_id, msg_type, msg):
         self.send_line(b"msg:%d:%s:%s" % (peer_id, msg_type, msg))
 
     def on_id_received(self):
@@ -114,6 +130,8 @@ class ExperimentClient(LineReceiver):
             if module is not self:
                 module.on_id_received()
 
+        # Tell the server we can receive the experiment variables as a compressed frame
+        self.send_line(b"framing:%s" % b",".join(FRAME_CODECS.keys()))
         for key, val in self.vars.items():
             self.send_line(b"set:%s:%s" % (key.encode('utf-8'), val.encode('utf-8')))
 
@@ -154,13 +172,26 @@ class ExperimentClient(LineReceiver):
             self.my_id = int(id)
 
             self._logger.debug('Got assigned id: %s', self.my_id)
+            if self.direct_messages:
+                self.vars["msg_port"] = str(self.direct_messages.listen())
             get_event_loop().run_in_executor(None, self.on_id_received)
             return "all_vars"
         else:
             self._logger.error("Received an unexpected string from the server, closing connection")
             return "done"
 
+    def raw_data_received(self, data):
+        if self.state == "all_vars_frame":
+            self._logger.debug("Got a %d bytes long experiment variables frame", len(data))
+            self.state = self.proto_all_vars(FRAME_CODECS[self.frame_codec][1](data))
+
     def proto_all_vars(self, line):
+        if line.startswith(b"frame:"):
+            # The experiment variables follow as a compressed frame, instead of a line
+            _, self.frame_codec, length = line.strip().split(b':')
+            self.expect_raw_data(int(length))
+            return "all_vars_frame"
+
         self._logger.debug("Got experiment variables")
 
         with open("all_vars.txt", "wb") as output_file:
@@ -222,11 +253,23 @@ class ExperimentClient(LineReceiver):
 
     @experiment_callback
     def annotate(self, message):
-        with open("annotations.csv", "a") as annotations_file:
-            annotations_file.write('%f,%s\n' % (time() - self.scenario_runner.exp_start_time, message))
+        get_metrics_sink().write("annotations.csv", '%f,%s\n' % (time() - self.scenario_runner.exp_start_time, message))
+
+    @experiment_callback
+    def write_scenario_dispatch_log(self):
+        """
+        Write the scheduled and actual fire times of all scenario events dispatched so far, and a summary of the calls
+        of the repeated lines.
+        """
+        self.scenario_runner.write_dispatch_log("scenario_dispatch.csv")
+        self.scenario_runner.write_pacing_log("scenario_pacing.csv")
 
     @experiment_callback
-    def stop(self):
+    async def stop(self):
+        get_metrics_sink().close()
+        if self.direct_messages:
+            self.direct_messages.close()
+        await close_rpc_client_pool()
         self._logger.info("Stopping event loop")
         get_event_loop().stop()
 
@@ -281,8 +324,8 @@ class ExperimentClient(LineReceiver):
 
         new_values, changed_values = get_changed_values(prev_dict, cur_dict)
         if changed_values:
-            with open("annotations.csv", "a") as annotations_file:
-                annotations_file.write('%.1f %s %s %s\n' % (time(), self.my_id, name, json.dumps(changed_values)))
+            get_metrics_sink().write("annotations.csv", '%.1f %s %s %s\n' % (time(), self.my_id, name,
+                                                                              json.dumps(changed_values)))
             return new_values
         return prev_dict
 
@@ -0,0 +1,97 @@
+"""
+Record the message statistics of an IPv8 endpoint as deltas.
+
+Every tick, the recorder compares the counters of every message of every overlay with the previous tick, and only
+writes the messages whose counters changed. Each row of the deltas file holds the time, the key of the message and the
+increase of its counters. The overlay and message id of a key are written to a separate keys file, when the message
+is seen for the first time. If no counter changed, a row with key -1 marks the tick. Both files stay open and are
+flushed every flush_interval seconds.
+"""
+import csv
+import os
+from binascii import hexlify
+from time import time
+
+import numpy as np
+
+# The counters of each message, in the order of the columns of the deltas file
+MESSAGE_COUNTERS = ('num_up', 'num_down', 'bytes_up', 'bytes_down')
+
+
+class IPv8StatisticsRecorder(object):
+
+    def __init__(self, deltas_filename="ipv8_statistics.csv", keys_filename="ipv8_statistics_keys.csv",
+                 flush_interval=10.0, buffer_size=2 ** 16):
+        self.flush_interval = flush_interval
+        self.last_flush_time = time()
+        self.previous_counters = {}
+        self.deltas_file = open(deltas_filename, "w", buffering=buffer_size)
+        self.deltas_file.write("time,key,%s\n" % ",".join(MESSAGE_COUNTERS))
+        self.keys_file = open(keys_filename, "w", buffering=buffer_size)
+        self.keys_file.write("key,overlay,msg_id\n")
+
+    def record(self, elapsed_time, statistics):
+        """
+        Record the statistics of an endpoint, a dictionary with the message statistics of every overlay prefix.
+        """
+        rows = []
+        for overlay_prefix, messages_dict in statistics.items():
+            for msg_id, msg_stats in messages_dict.items():
+                counters = (msg_stats.num_up, msg_stats.num_down, msg_stats.bytes_up, msg_stats.bytes_down)
+                previous = self.previous_counters.get((overlay_prefix, msg_id))
+                if previous is None:
+                    key = len(self.previous_counters)
+                    previous = (key, (0, 0, 0, 0))
+                    self.keys_file.write("%d,%s,%s\n" % (key, hexlify(overlay_prefix).decode('utf-8'), msg_id))
+                key, previous_counters = previous
+                if counters != previous_counters:
+                    rows.append("%.3f,%d,%d,%d,%d,%d\n" % (elapsed_time, key, counters[0] - previous_counters[0],
+                                                           counters[1] - previous_counters[1],
+                                                           counters[2] - previous_counters[2],
+                                                           counters[3] - previous_counters[3]))
+                    self.previous_counters[(overlay_prefix, msg_id)] = (key, counters)
+
+        if not rows:
+            rows.append("%.3f,-1,0,0,0,0\n" % elapsed_time)
+        self.deltas_file.writelines(rows)
+
+        if time() - self.last_flush_time >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.keys_file.flush()
+        self.deltas_file.flush()
+        self.last_flush_time = time()
+
+    def close(self):
+        self.keys_file.close()
+        self.deltas_file.close()
+
+
+def read_ipv8_statistics(deltas_filename, keys_filename=None):
+    """
+    Rebuild the time series of the counters of a peer from its deltas, summed over all overlays.
+    Returns the sample times, the message ids, and an array with the counters of every message in every sample.
+    """
+    keys_filename = keys_filename or os.path.join(os.path.dirname(deltas_filename), "ipv8_statistics_keys.csv")
+    with open(keys_filename) as keys_file:
+        key_msg_ids = {int(row["key"]): row["msg_id"] for row in csv.DictReader(keys_file)}
+    msg_ids = sorted(set(key_msg_ids.values()))
+    msg_indices = {msg_id: index for index, msg_id in enumerate(msg_ids)}
+    key_msg_indices = np.zeros(max(key_msg_ids, default=-1) + 1, dtype=np.int64)
+    for key, msg_id in key_msg_ids.items():
+        key_msg_indices[key] = msg_indices[msg_id]
+
+    deltas = np.loadtxt(deltas_filename, delimiter=',', skiprows=1, ndmin=2)
+    if not len(deltas):
+        return np.empty(0), [], np.zeros((0, 0, len(MESSAGE_COUNTERS)), dtype=np.int64)
+
+    # Rows are written in order of time, and all rows of a tick have the same time
+    times, sample_indices = np.unique(deltas[:, 0], return_inverse=True)
+    keys = deltas[:, 1].astype(np.int64)
+    changed = keys >= 0
+
+    counters = np.zeros((len(times), len(msg_ids), len(MESSAGE_COUNTERS)), dtype=np.int64)
+    np.add.at(counters, (sample_indices[changed], key_msg_indices[keys[changed]]),
+              deltas[changed, 2:].astype(np.int64))
+    return times, msg_ids, np.cumsum(counters, axis=0)
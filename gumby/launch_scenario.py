@@ -73,9 +73,14 @@ def main():
     loop = get_event_loop()
     loop.exit_code = 0
 
-    debug("Connecting to: %s:%s", environ['SYNC_HOST'], int(environ['SYNC_PORT']))
-    run_task(loop.create_connection, ExperimentClientFactory(), environ['SYNC_HOST'],
-             int(environ['SYNC_PORT']), delay=random.randint(1, 5))
+    if environ.get("SYNC_RELAY_PORT"):
+        # Connect to the sync relay on this node instead of connecting to the experiment server directly
+        sync_host, sync_port = "127.0.0.1", int(environ['SYNC_RELAY_PORT'])
+    else:
+        sync_host, sync_port = environ['SYNC_HOST'], int(environ['SYNC_PORT'])
+
+    debug("Connecting to: %s:%s", sync_host, sync_port)
+    run_task(loop.create_connection, ExperimentClientFactory(), sync_host, sync_port, delay=random.randint(1, 5))
     loop.run_forever()
     loop.close()
     exit(loop.exit_code)
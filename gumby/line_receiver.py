@@ -1,10 +1,24 @@
 import logging
+import zlib
 from asyncio import DatagramProtocol
 
+# The codecs that can be used to compress a frame, mapped to their (compress, decompress) functions
+FRAME_CODECS = {
+    b"zlib": (zlib.compress, zlib.decompress),
+}
+
 
 class LineReceiver(DatagramProtocol):
-    _buffer = b''
+    """
+    Splits the incoming data into lines. The data is appended to a single buffer, which we read from at a moving
+    offset, and we only search for the delimiter in the data we did not search before. This keeps splitting the data
+    linear in its size, regardless of how long the lines are and how the data is fragmented.
+    """
+    _buffer = None
+    _offset = 0
+    _scan_offset = 0
     _busy = False
+    _raw_length = None
     delimiter = b'\r\n'
     MAX_LENGTH = 16384
 
@@ -15,40 +29,85 @@ class LineReceiver(DatagramProtocol):
     def connection_made(self, transport):
         self.transport = transport
 
+    def _take(self, start, end):
+        return bytes(self._buffer[start:end])
+
+    def _clear_buffer(self):
+        del self._buffer[:]
+        self._offset = self._scan_offset = 0
+
     def data_received(self, data):
+        if self._buffer is None:
+            self._buffer = bytearray()
+        self._buffer += data
         if self._busy:
-            self._buffer += data
             return
 
         try:
             self._busy = True
-            self._buffer += data
-            while self._buffer:
-                try:
-                    line, self._buffer = self._buffer.split(self.delimiter, 1)
-                except ValueError:
-                    if len(self._buffer) >= (self.MAX_LENGTH + len(self.delimiter)):
-                        line, self._buffer = self._buffer, b''
-                        return self.line_length_exceeded(line)
-                    return
-                else:
-                    lineLength = len(line)
-                    if lineLength > self.MAX_LENGTH:
-                        exceeded = line + self.delimiter + self._buffer
-                        self._buffer = b''
-                        return self.line_length_exceeded(exceeded)
-                    why = self.line_received(line)
+            while self._offset < len(self._buffer):
+                if self._raw_length is not None:
+                    end = self._offset + self._raw_length
+                    if len(self._buffer) < end:
+                        return
+                    data = self._take(self._offset, end)
+                    self._offset = self._scan_offset = end
+                    self._raw_length = None
+                    why = self.raw_data_received(data)
                     if (why or self.transport and self.transport.is_closing()):
                         return why
+                    continue
+
+                index = self._buffer.find(self.delimiter, self._scan_offset)
+                if index == -1:
+                    if len(self._buffer) - self._offset >= (self.MAX_LENGTH + len(self.delimiter)):
+                        line = self._take(self._offset, len(self._buffer))
+                        self._clear_buffer()
+                        return self.line_length_exceeded(line)
+                    # The next search only has to cover the new data, and a delimiter that might be split over it
+                    self._scan_offset = max(self._offset, len(self._buffer) - len(self.delimiter) + 1)
+                    return
+
+                if index - self._offset > self.MAX_LENGTH:
+                    exceeded = self._take(self._offset, len(self._buffer))
+                    self._clear_buffer()
+                    return self.line_length_exceeded(exceeded)
+                line = self._take(self._offset, index)
+                self._offset = self._scan_offset = index + len(self.delimiter)
+                why = self.line_received(line)
+                if (why or self.transport and self.transport.is_closing()):
+                    return why
         finally:
+            # Drop the data we have read, the remainder is at most a partial line or frame
+            if self._offset:
+                del self._buffer[:self._offset]
+                self._scan_offset -= self._offset
+                self._offset = 0
             self._busy = False
 
     def line_received(self, line):
         raise NotImplementedError
 
+    def expect_raw_data(self, length):
+        """
+        Pass the next length bytes to raw_data_received as a whole, instead of splitting them into lines.
+        Afterwards, the receiver continues splitting the incoming data into lines.
+        """
+        self._raw_length = length
+
+    def raw_data_received(self, data):
+        raise NotImplementedError
+
     def send_line(self, line):
         return self.transport.write(line + self.delimiter)
 
+    def send_frame(self, payload, codec):
+        """
+        Send a payload, that is already compressed with the given codec, as a length-prefixed frame.
+        The receiver should call expect_raw_data when it reads the frame header line.
+        """
+        return self.transport.write(b"frame:%s:%d" % (codec, len(payload)) + self.delimiter + payload)
+
     def line_length_exceeded(self, _):
         return self.transport.lose_connection()
 
@@ -0,0 +1,246 @@
+"""
+Open-loop load generation.
+
+A load generator submits requests at the times given by an arrival process, regardless of how long earlier requests
+take to complete. This keeps the offered load fixed when the system under test saturates, instead of slowing down
+with it. The number of requests in flight is bounded by a window: requests that arrive while the window is full are
+not submitted, but counted as dropped.
+
+For every request, the generator records when it should have been submitted, when it was submitted, when the submit
+function returned (the ack) and, if the caller reports it, when the request was confirmed.
+"""
+import logging
+import random
+from asyncio import ensure_future, get_event_loop, sleep
+from inspect import isawaitable
+from time import time
+
+import numpy
+
+# The columns of the timestamps array
+INTENDED, SUBMITTED, ACKED, CONFIRMED = range(4)
+
+
+class ArrivalProcess(object):
+    """
+    An arrival process yields the offsets, in seconds since the start of the load, at which requests arrive.
+    """
+
+    def offsets(self):
+        raise NotImplementedError()
+
+
+class ConstantArrivals(ArrivalProcess):
+
+    def __init__(self, rate, phase=0):
+        self.rate = rate
+        self.phase = phase
+
+    def offsets(self):
+        index = 0
+        while True:
+            yield self.phase + index / self.rate
+            index += 1
+
+
+class PoissonArrivals(ArrivalProcess):
+    """
+    Arrivals with exponentially distributed inter-arrival times, like requests from many independent users.
+    """
+
+    def __init__(self, rate, seed=None):
+        self.rate = rate
+        self.seed = seed
+
+    def offsets(self):
+        rand = random.Random(self.seed)
+        offset = 0
+        while True:
+            offset += rand.expovariate(self.rate)
+            yield offset
+
+
+class StepRampArrivals(ArrivalProcess):
+    """
+    Constant arrivals with a rate that increases by step_rate every step_duration seconds, up to max_rate.
+    """
+
+    def __init__(self, start_rate, step_rate, step_duration, max_rate=None):
+        self.start_rate = start_rate
+        self.step_rate = step_rate
+        self.step_duration = step_duration
+        self.max_rate = max_rate
+
+    def get_rate(self, step):
+        rate = self.start_rate + step * self.step_rate
+        return min(rate, self.max_rate) if self.max_rate is not None else rate
+
+    def offsets(self):
+        step = 0
+        offset = 0
+        while True:
+            step_end = (step + 1) * self.step_duration
+            rate = self.get_rate(step)
+            if rate <= 0 and (self.step_rate <= 0 or (self.max_rate is not None and self.max_rate <= 0)):
+                # The rate will never become positive, so there are no more arrivals
+                return
+            if rate > 0:
+                while offset < step_end:
+                    yield offset
+                    offset += 1 / rate
+            step += 1
+            offset = max(offset, step_end)
+
+
+class TraceArrivals(ArrivalProcess):
+    """
+    Replays the arrivals in a trace.
+    """
+
+    def __init__(self, offsets):
+        self.trace_offsets = offsets
+
+    @staticmethod
+    def from_file(filename, index=0, stride=1):
+        """
+        Read a trace with a timestamp, in seconds, on every line. Only every stride-th arrival is replayed, starting at
+        the given index, so multiple instances can replay the same trace together.
+        """
+        with open(filename) as trace_file:
+            timestamps = sorted(float(line.split(',')[0]) for line in trace_file if line.strip())
+        if not timestamps:
+            return TraceArrivals([])
+        return TraceArrivals([timestamp - timestamps[0] for timestamp in timestamps[index::stride]])
+
+    def offsets(self):
+        return iter(self.trace_offsets)
+
+
+class LoadGenerator(object):
+
+    def __init__(self, submit, arrivals, max_in_flight=1000, capacity=1024):
+        """
+        :param submit: the (coroutine) function that submits a request. The value it returns is used as the ID of
+        the request, to confirm it later on.
+        :param arrivals: the arrival process.
+        :param max_in_flight: the maximum number of submitted requests that have not been acked yet.
+        :param capacity: the number of requests to allocate space for up front.
+        """
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.submit = submit
+        self.arrivals = arrivals
+        self.max_in_flight = max_in_flight
+        self.timestamps = numpy.full((capacity, 4), numpy.nan)
+        self.num_requests = 0
+        self.request_indices = {}
+        self.in_flight = 0
+        self.dropped = 0
+        self.failed = 0
+        self.start_time = None
+        self.stop_time = None
+        self.task = None
+
+    def start(self):
+        self.task = ensure_future(self.run())
+        return self.task
+
+    def stop(self):
+        if self.task:
+            self.task.cancel()
+            self.task = None
+        if self.start_time is not None and self.stop_time is None:
+            self.stop_time = time()
+
+    async def run(self):
+        loop = get_event_loop()
+        loop_start_time = loop.time()
+        self.start_time = time()
+        try:
+            for offset in self.arrivals.offsets():
+                # Always yield to the event loop, also when we are behind, so acks can be processed
+                await sleep(max(loop_start_time + offset - loop.time(), 0))
+                index = self._allocate()
+                self.timestamps[index, INTENDED] = self.start_time + offset
+                if self.in_flight >= self.max_in_flight:
+                    self.dropped += 1
+                    continue
+                self._submit(index)
+        finally:
+            self.stop_time = time()
+
+    def _allocate(self):
+        if self.num_requests == len(self.timestamps):
+            timestamps = numpy.full((2 * len(self.timestamps), 4), numpy.nan)
+            timestamps[:self.num_requests] = self.timestamps
+            self.timestamps = timestamps
+        self.num_requests += 1
+        return self.num_requests - 1
+
+    def _submit(self, index):
+        self.in_flight += 1
+        self.timestamps[index, SUBMITTED] = time()
+        try:
+            result = self.submit()
+        except Exception:
+            self._logger.exception("Error while submitting request")
+            self._acked(index, failed=True)
+            return
+
+        if isawaitable(result):
+            ensure_future(result).add_done_callback(lambda future, index=index: self._on_submit_done(index, future))
+        else:
+            self._acked(index, result)
+
+    def _on_submit_done(self, index, future):
+        if future.cancelled():
+            self._acked(index, failed=True)
+        elif future.exception():
+            self._logger.error("Error while submitting request: %s", future.exception())
+            self._acked(index, failed=True)
+        else:
+            self._acked(index, future.result())
+
+    def _acked(self, index, request_id=None, failed=False):
+        self.in_flight -= 1
+        if failed:
+            self.failed += 1
+            return
+        self.timestamps[index, ACKED] = time()
+        if request_id is not None:
+            self.request_indices[request_id] = index
+
+    def confirm(self, request_id, confirm_time=None):
+        """
+        Record that the request with the given ID has been confirmed, at confirm_time or now.
+        Returns whether the request is known.
+        """
+        index = self.request_indices.get(request_id)
+        if index is None:
+            return False
+        self.timestamps[index, CONFIRMED] = confirm_time if confirm_time is not None else time()
+        return True
+
+    def get_stats(self):
+        timestamps = self.timestamps[:self.num_requests]
+        duration = ((self.stop_time or time()) - self.start_time) if self.start_time is not None else 0
+        submitted = self.num_requests - self.dropped
+        return {
+            "requests": self.num_requests,
+            "submitted": submitted,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "acked": int(numpy.count_nonzero(~numpy.isnan(timestamps[:, ACKED]))),
+            "confirmed": int(numpy.count_nonzero(~numpy.isnan(timestamps[:, CONFIRMED]))),
+            "offered_rate": self.num_requests / duration if duration > 0 else 0,
+            "achieved_rate": submitted / duration if duration > 0 else 0,
+        }
+
+    def write_requests(self, out_file):
+        """
+        Write the timestamps of all requests, in milliseconds, to an opened file. Missing timestamps are written as -1.
+        """
+        request_ids = {index: request_id for request_id, index in self.request_indices.items()}
+        timestamps = self.timestamps[:self.num_requests]
+        timestamps = numpy.where(numpy.isnan(timestamps), -1, numpy.round(timestamps * 1000)).astype(numpy.int64)
+        for index, (intended, submitted, acked, confirmed) in enumerate(timestamps):
+            out_file.write("%s,%d,%d,%d,%d\n" % (request_ids.get(index, ""), intended, submitted, acked, confirmed))
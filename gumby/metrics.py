@@ -0,0 +1,129 @@
+"""
+A buffered sink for the metrics that modules write while an experiment runs, like autoplot points and annotations.
+
+Writes to a metrics file are kept in memory, and every file stays open once it has been written to. The buffers are
+written out every METRICS_FLUSH_INTERVAL seconds (5 by default), when a buffer holds max_buffered writes, and when the
+experiment stops or the process exits.
+"""
+import atexit
+import logging
+import os
+from asyncio import get_running_loop
+from threading import RLock
+
+from gumby.util import run_task
+
+
+class MetricsFile(object):
+    """
+    A buffered metrics file. It can be used like a file that is opened for writing, for instance by a csv.writer.
+    """
+
+    def __init__(self, sink, filename, mode="a"):
+        self.sink = sink
+        self.filename = filename
+        self.mode = mode
+        self.handle = None
+        self.buffer = []
+
+    def write(self, data):
+        with self.sink.lock:
+            self.buffer.append(data)
+            full = len(self.buffer) >= self.sink.max_buffered
+        if full:
+            self.flush()
+        self.sink.start_flushing()
+
+    def flush(self):
+        with self.sink.lock:
+            if not self.buffer:
+                return
+            if not self.handle:
+                self.handle = open(self.filename, self.mode)
+                # Once the file has been created, later writes are appended to it
+                self.mode = "a"
+            self.handle.writelines(self.buffer)
+            self.buffer = []
+            self.handle.flush()
+
+    def close(self):
+        self.flush()
+        with self.sink.lock:
+            if self.handle:
+                self.handle.close()
+                self.handle = None
+
+
+class MetricsSink(object):
+
+    def __init__(self, flush_interval=5.0, max_buffered=1024):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.files = {}
+        self.lock = RLock()
+        self.flush_task = None
+
+    def open(self, filename, mode="a"):
+        """
+        Return the metrics file with the given name. With mode "w", the file is truncated and writes that have not
+        been flushed yet are discarded.
+        """
+        filename = os.path.abspath(filename)
+        with self.lock:
+            metrics_file = self.files.get(filename)
+            if not metrics_file:
+                metrics_file = self.files[filename] = MetricsFile(self, filename, mode)
+            elif mode == "w":
+                if metrics_file.handle:
+                    metrics_file.handle.close()
+                    metrics_file.handle = None
+                metrics_file.buffer = []
+                metrics_file.mode = "w"
+            return metrics_file
+
+    def write(self, filename, data):
+        self.open(filename).write(data)
+
+    def start_flushing(self):
+        """
+        Periodically flush the buffers, once there is an event loop to do so.
+        """
+        if self.flush_task or not self.flush_interval:
+            return
+        try:
+            get_running_loop()
+        except RuntimeError:
+            return
+        self.flush_task = run_task(self.flush, interval=self.flush_interval, delay=self.flush_interval)
+
+    def flush(self):
+        for metrics_file in list(self.files.values()):
+            try:
+                metrics_file.flush()
+            except OSError as e:
+                self._logger.error("Could not write metrics to %s: %s", metrics_file.filename, e)
+
+    def close(self):
+        if self.flush_task:
+            self.flush_task.cancel()
+            self.flush_task = None
+        for metrics_file in list(self.files.values()):
+            try:
+                metrics_file.close()
+            except OSError as e:
+                self._logger.error("Could not write metrics to %s: %s", metrics_file.filename, e)
+
+
+_metrics_sink = None
+
+
+def get_metrics_sink():
+    """
+    Return the metrics sink that is shared by all modules of this instance.
+    """
+    global _metrics_sink
+    if _metrics_sink is None:
+        _metrics_sink = MetricsSink(flush_interval=float(os.environ.get("METRICS_FLUSH_INTERVAL", "5")))
+        atexit.register(_metrics_sink.close)
+    return _metrics_sink
@@ -0,0 +1,179 @@
+"""
+A lightweight stand-in for a blockchain node, to benchmark how many transactions gumby itself can submit.
+
+The mock chain accepts transactions into a mempool of bounded size, and includes up to its capacity of transactions
+per second in a block every block interval. A transaction is confirmed a fixed latency after it is included in a
+block. The node serves the submit and confirm endpoints that the blockchain modules use:
+
+- Ethereum: JSON-RPC calls on /, including batches (eth_sendTransaction, personal_sendTransaction,
+  eth_getTransactionReceipt, eth_estimateGas, eth_blockNumber and eth_getBlockByNumber). Blocks become visible when
+  their transactions are confirmed.
+- Avalanche: wallet.send on /ext/bc/X/wallet and avm.getTxStatus on /ext/bc/X.
+- Stellar: GET /tx?blob=<transaction>.
+"""
+from asyncio import ensure_future, get_event_loop, sleep
+from collections import deque
+from itertools import count
+from time import time
+
+from aiohttp import web
+
+
+class MockChain(object):
+
+    def __init__(self, latency=1.0, capacity=1000, block_interval=1.0, mempool_size=100000):
+        """
+        :param latency: the number of seconds between the inclusion of a transaction in a block and its confirmation.
+        :param capacity: the maximum number of transactions per second that are included in blocks.
+        :param block_interval: the number of seconds between blocks.
+        :param mempool_size: the maximum number of pending transactions, new transactions are rejected beyond that.
+        """
+        self.latency = latency
+        self.capacity = capacity
+        self.block_interval = block_interval
+        self.mempool_size = mempool_size
+        self.mempool = deque()
+        self.pending = set()
+        self.confirm_times = {}
+        self.blocks = []
+        self.rejected = 0
+        self.tx_numbers = count(1)
+        self.block_producer = None
+
+    def start(self):
+        self.block_producer = ensure_future(self.produce_blocks())
+
+    def stop(self):
+        if self.block_producer:
+            self.block_producer.cancel()
+            self.block_producer = None
+
+    def submit(self):
+        """
+        Add a new transaction to the mempool, and return its ID, or None if the mempool is full.
+        """
+        if len(self.mempool) >= self.mempool_size:
+            self.rejected += 1
+            return None
+        tx_id = "%064x" % next(self.tx_numbers)
+        self.mempool.append(tx_id)
+        self.pending.add(tx_id)
+        return tx_id
+
+    def get_status(self, tx_id):
+        """
+        Return the status of a transaction: Unknown, Processing or Accepted.
+        """
+        if tx_id in self.confirm_times:
+            return "Accepted" if self.confirm_times[tx_id] <= get_event_loop().time() else "Processing"
+        return "Processing" if tx_id in self.pending else "Unknown"
+
+    def create_block(self):
+        block_size = min(len(self.mempool), int(self.capacity * self.block_interval))
+        confirm_time = get_event_loop().time() + self.latency
+        tx_ids = [self.mempool.popleft() for _ in range(block_size)]
+        for tx_id in tx_ids:
+            self.pending.discard(tx_id)
+            self.confirm_times[tx_id] = confirm_time
+        self.blocks.append((time(), tx_ids, confirm_time))
+
+    def get_num_confirmed_blocks(self):
+        now = get_event_loop().time()
+        num_blocks = len(self.blocks)
+        while num_blocks and self.blocks[num_blocks - 1][2] > now:
+            num_blocks -= 1
+        return num_blocks
+
+    async def produce_blocks(self):
+        next_block_time = get_event_loop().time() + self.block_interval
+        while True:
+            await sleep(next_block_time - get_event_loop().time())
+            self.create_block()
+            next_block_time += self.block_interval
+
+
+class MockChainNode(object):
+    """
+    Serves the API of the blockchain modules on top of a mock chain.
+    """
+
+    def __init__(self, chain):
+        self.chain = chain
+        self.runner = None
+
+        app = web.Application()
+        app.router.add_post('/', self.handle_ethereum)
+        app.router.add_post('/ext/bc/X/wallet', self.handle_avalanche)
+        app.router.add_post('/ext/bc/X', self.handle_avalanche)
+        app.router.add_get('/tx', self.handle_stellar)
+        self.app = app
+
+    async def start(self, host, port):
+        self.runner = web.AppRunner(self.app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, host, port)
+        await site.start()
+        self.chain.start()
+        return site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.chain.stop()
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
+
+    async def handle_ethereum(self, request):
+        payload = await request.json()
+        if isinstance(payload, list):
+            return web.json_response([self.call_ethereum(call) for call in payload])
+        return web.json_response(self.call_ethereum(payload))
+
+    def call_ethereum(self, call):
+        response = {"jsonrpc": "2.0", "id": call.get("id")}
+        method = call.get("method")
+        if method in ("eth_sendTransaction", "personal_sendTransaction"):
+            tx_id = self.chain.submit()
+            if tx_id is None:
+                response["error"] = {"code": -32000, "message": "txpool is full"}
+            else:
+                response["result"] = "0x" + tx_id
+        elif method == "eth_getTransactionReceipt":
+            tx_hash = call["params"][0]
+            status = self.chain.get_status(tx_hash[2:])
+            response["result"] = {"transactionHash": tx_hash, "status": "0x1"} if status == "Accepted" else None
+        elif method == "eth_estimateGas":
+            response["result"] = "0x5208"
+        elif method == "eth_blockNumber":
+            response["result"] = hex(self.chain.get_num_confirmed_blocks())
+        elif method == "eth_getBlockByNumber":
+            block_nr = int(call["params"][0], 16)
+            if 1 <= block_nr <= self.chain.get_num_confirmed_blocks():
+                block_time, tx_ids, _ = self.chain.blocks[block_nr - 1]
+                response["result"] = {"number": hex(block_nr), "timestamp": hex(int(block_time)),
+                                      "transactions": ["0x" + tx_id for tx_id in tx_ids]}
+            else:
+                response["result"] = None
+        else:
+            response["error"] = {"code": -32601, "message": "the method %s does not exist" % method}
+        return response
+
+    async def handle_avalanche(self, request):
+        call = await request.json()
+        response = {"jsonrpc": "2.0", "id": call.get("id")}
+        if call.get("method") == "wallet.send":
+            tx_id = self.chain.submit()
+            if tx_id is None:
+                response["error"] = {"code": -32000, "message": "mempool is full"}
+            else:
+                response["result"] = {"txID": tx_id, "changeAddr": ""}
+        elif call.get("method") == "avm.getTxStatus":
+            response["result"] = {"status": self.chain.get_status(call["params"][0]["txID"])}
+        else:
+            response["error"] = {"code": -32601, "message": "the method %s does not exist" % call.get("method")}
+        return web.json_response(response)
+
+    async def handle_stellar(self, request):
+        tx_id = self.chain.submit()
+        if tx_id is None:
+            return web.json_response({"status": "TRY_AGAIN_LATER"})
+        return web.json_response({"status": "PENDING", "hash": tx_id})
@@ -1,4 +1,3 @@
-import json
 import os
 import time
 from abc import abstractmethod
@@ -13,6 +12,7 @@ from ipv8_service import IPv8
 
 from gumby.experiment import ExperimentClient, experiment_callback
 from gumby.gumby_client_config import GumbyConfig
+from gumby.ipv8_statistics import IPv8StatisticsRecorder
 from gumby.modules.experiment_module import ExperimentModule
 from gumby.modules.ipv8_community_launchers import DHTCommunityLauncher, IPv8DiscoveryCommunityLauncher
 from gumby.modules.isolated_community_loader import IsolatedIPv8CommunityLoader
@@ -43,6 +43,8 @@ class IPv8Provider(ExperimentModule):
         self.ipv8_available = Future()
         self.session_id = os.environ['SYNC_HOST'] + os.environ['SYNC_PORT']
         self.bootstrappers = []
+        self.statistics_recorder = None
+        self.statistics_monitor = None
 
     @experiment_callback
     def write_overlay_statistics(self):
@@ -74,22 +76,11 @@ class IPv8Provider(ExperimentModule):
         self.bootstrappers.append(DispersyBootstrapper([bootstrap_ip], []))
 
     def write_ipv8_statistics(self):
-        if not self.ipv8:
+        if not self.ipv8 or not self.statistics_recorder:
             return
 
-        statistics = self.ipv8.endpoint.statistics
-
-        # Cleanup this dictionary
         time_elapsed = time.time() - self.experiment.scenario_runner.exp_start_time
-        new_dict = {"time": time_elapsed, "stats": {}}
-        for overlay_prefix, messages_dict in statistics.items():
-            hex_prefix = hexlify(overlay_prefix).decode('utf-8')
-            new_dict["stats"][hex_prefix] = {}
-            for msg_id, msg_stats in messages_dict.items():
-                new_dict["stats"][hex_prefix][msg_id] = msg_stats.to_dict()
-
-        with open('ipv8_statistics.txt', 'a') as statistics_file:
-            statistics_file.write(json.dumps(new_dict) + '\n')
+        self.statistics_recorder.record(time_elapsed, self.ipv8.endpoint.statistics)
 
     @abstractmethod
     def setup_config(self):
@@ -97,7 +88,19 @@ class IPv8Provider(ExperimentModule):
 
     @experiment_callback
     def start_ipv8_statistics_monitor(self):
-        run_task(self.write_ipv8_statistics, interval=1)
+        # Starting the monitor again restarts it, instead of leaving the previous recorder open
+        self.stop_ipv8_statistics_monitor()
+        self.statistics_recorder = IPv8StatisticsRecorder()
+        self.statistics_monitor = run_task(self.write_ipv8_statistics, interval=1)
+
+    @experiment_callback
+    def stop_ipv8_statistics_monitor(self):
+        if self.statistics_monitor:
+            self.statistics_monitor.cancel()
+            self.statistics_monitor = None
+        if self.statistics_recorder:
+            self.statistics_recorder.close()
+            self.statistics_recorder = None
 
 
 class BaseIPv8Module(IPv8Provider):
@@ -2,6 +2,8 @@ import logging
 import os
 import time
 
+from gumby.metrics import get_metrics_sink
+
 
 class ExperimentModule(object):
     """
@@ -45,8 +47,8 @@ class ExperimentModule(object):
             output_file.write('%s.csv\n' % statistic_name)
         if not os.path.isdir('autoplot'):
             os.mkdir('autoplot')
-        with open('autoplot/%s.csv' % statistic_name, 'w') as output_file:
-            output_file.write('time,pid,%s\n' % (column_name or statistic_name))
+        header = 'time,pid,%s\n' % (column_name or statistic_name)
+        get_metrics_sink().open('autoplot/%s.csv' % statistic_name, 'w').write(header)
 
     def autoplot_add_point(self, statistic_name, value):
         """
@@ -59,8 +61,7 @@ class ExperimentModule(object):
         :type value: int or long or float
         :returns: None
         """
-        with open('autoplot/%s.csv' % statistic_name, 'a') as output_file:
-            output_file.write("%f,%d,%d\n" % (time.time(), self.my_id, value))
+        get_metrics_sink().write('autoplot/%s.csv' % statistic_name, "%f,%d,%d\n" % (time.time(), self.my_id, value))
 
     def on_id_received(self):
         """
@@ -0,0 +1,124 @@
+"""
+This module measures how responsive the event loop of an instance is during an experiment.
+
+It samples the loop lag, the time between when a periodic timer should fire and when it actually fires, and records
+every callback that blocks the event loop for longer than a threshold, by the name of its function or coroutine.
+Together with the dispatch log of the scenario runner, which holds the scheduled and actual start and the duration of
+every scenario line, this shows how late scenario callbacks fire when an instance is saturated.
+"""
+from asyncio import Task, ensure_future, events, sleep
+from time import time
+
+from gumby.experiment import experiment_callback
+from gumby.modules.experiment_module import ExperimentModule
+
+
+def describe_callback(callback):
+    """
+    Returns a readable name for a callback scheduled on the event loop. The steps of a task are named after the
+    coroutine of the task.
+    """
+    owner = getattr(callback, '__self__', None)
+    if isinstance(owner, Task):
+        return getattr(owner.get_coro(), '__qualname__', repr(owner.get_coro()))
+    return getattr(callback, '__qualname__', repr(callback))
+
+
+# The monitors that time the callbacks of the event loop, and the method of asyncio that we wrapped to do so
+_callback_timers = []
+_original_handle_run = None
+
+
+def _timed_handle_run(handle):
+    start_time = time()
+    try:
+        return _original_handle_run(handle)
+    finally:
+        duration = time() - start_time
+        for monitor in _callback_timers:
+            if duration > monitor.slow_callback_threshold:
+                monitor.slow_callbacks.append((start_time, duration, describe_callback(handle._callback)))
+
+
+class LoopMonitorModule(ExperimentModule):
+
+    def __init__(self, experiment):
+        super(LoopMonitorModule, self).__init__(experiment)
+        self.lag_samples = []
+        self.slow_callbacks = []
+        self.slow_callback_threshold = None
+        self.sampler = None
+
+    @experiment_callback
+    def start_loop_monitor(self, interval="0.1", slow_callback_threshold="0.05"):
+        """
+        Start sampling the loop lag every interval seconds, and recording callbacks that take longer than
+        slow_callback_threshold seconds.
+        """
+        self.slow_callback_threshold = float(slow_callback_threshold)
+        self.sampler = ensure_future(self.sample_lag(float(interval)))
+        self.install_callback_timer()
+
+    @experiment_callback
+    def stop_loop_monitor(self):
+        """
+        Stop the monitor and write its measurements, and the scenario dispatch log, to the output directory.
+        """
+        if self.sampler:
+            self.sampler.cancel()
+            self.sampler = None
+        self.uninstall_callback_timer()
+
+        start_time = self.experiment.scenario_runner.exp_start_time
+        with open("loop_lag.csv", "w") as lag_file:
+            lag_file.write("time,lag\n")
+            for sample_time, lag in self.lag_samples:
+                lag_file.write("%f,%f\n" % (sample_time - start_time, lag))
+
+        with open("slow_callbacks.csv", "w") as slow_callbacks_file:
+            slow_callbacks_file.write("time,duration,callback\n")
+            for callback_time, duration, name in self.slow_callbacks:
+                slow_callbacks_file.write("%f,%f,%s\n" % (callback_time - start_time, duration,
+                                                          name.replace(',', ' ')))
+
+        self.experiment.scenario_runner.write_dispatch_log("scenario_dispatch.csv")
+
+    async def sample_lag(self, interval):
+        """
+        Wake up every interval seconds, and record how late we woke up. The wake up times are computed from the start,
+        so the lag of one sample does not shift the next ones.
+        """
+        next_time = time() + interval
+        while True:
+            await sleep(next_time - time())
+            now = time()
+            self.lag_samples.append((next_time, now - next_time))
+            next_time += interval
+            if next_time < now:
+                # Skip the samples we missed while the loop was blocked, the lag we just recorded already covers them
+                next_time += ((now - next_time) // interval + 1) * interval
+
+    def install_callback_timer(self):
+        """
+        Time every callback the event loop runs, by wrapping the method that asyncio uses to run them. The method is
+        wrapped once, however many monitors are installed, and restored when the last one is uninstalled.
+
+        We do not use the debug mode of the event loop, which also reports slow callbacks, since it records a stack
+        trace for every callback that is scheduled and would slow down the instance we are measuring.
+        """
+        global _original_handle_run
+        if self in _callback_timers:
+            return
+        if not _callback_timers:
+            _original_handle_run = events.Handle._run
+            events.Handle._run = _timed_handle_run
+        _callback_timers.append(self)
+
+    def uninstall_callback_timer(self):
+        global _original_handle_run
+        if self not in _callback_timers:
+            return
+        _callback_timers.remove(self)
+        if not _callback_timers:
+            events.Handle._run = _original_handle_run
+            _original_handle_run = None
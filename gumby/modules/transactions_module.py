@@ -2,8 +2,8 @@ import os
 import time
 
 from gumby.experiment import experiment_callback
+from gumby.load_generator import ConstantArrivals, LoadGenerator, PoissonArrivals, StepRampArrivals, TraceArrivals
 from gumby.modules.experiment_module import ExperimentModule
-from gumby.util import run_task
 
 
 class TransactionsModule(ExperimentModule):
@@ -14,7 +14,17 @@ class TransactionsModule(ExperimentModule):
         self.num_validators = int(os.environ["NUM_VALIDATORS"])
         self.num_clients = int(os.environ["NUM_CLIENTS"])
         self.tx_rate = int(os.environ["TX_RATE"])
-        self.tx_lc = None
+        # The arrival process of transfers: constant, poisson, step or trace
+        self.tx_arrivals = os.environ.get("TX_ARRIVALS", "constant")
+        # For the step arrivals: the rate is increased by TX_RAMP_STEP every TX_RAMP_STEP_DURATION seconds
+        self.tx_ramp_step = int(os.environ.get("TX_RAMP_STEP", "0"))
+        self.tx_ramp_step_duration = float(os.environ.get("TX_RAMP_STEP_DURATION", "10"))
+        self.tx_ramp_max_rate = int(os.environ["TX_RAMP_MAX_RATE"]) if "TX_RAMP_MAX_RATE" in os.environ else None
+        # For the trace arrivals: a file with the submit time of a transfer on every line
+        self.tx_trace_file = os.environ.get("TX_TRACE_FILE")
+        # The number of transfers that may be in progress at the same time, transfers beyond that are dropped
+        self.tx_max_in_flight = int(os.environ.get("TX_MAX_IN_FLIGHT", "1000"))
+        self.load_generators = []
         self.did_write_start_time = False
         self.transfer = None
 
@@ -42,9 +52,7 @@ class TransactionsModule(ExperimentModule):
         if not self.is_client():
             return
 
-        if self.tx_lc:
-            self.tx_lc.stop()
-            self.tx_lc = None
+        self.stop_load()
 
         if not self.did_write_start_time:
             # Write the start time to a file
@@ -55,16 +63,39 @@ class TransactionsModule(ExperimentModule):
 
         self._logger.info("Starting transactions...")
 
-        # Depending on the tx rate and number of clients, wait a bit
+        # The transfers are spread evenly over the clients
+        my_client_id = self.experiment.my_id - self.num_validators
         individual_tx_rate = int(tx_rate) / self.num_clients
         self._logger.info("Individual tx rate: %f", individual_tx_rate)
 
-        def start_lc():
-            self._logger.info("Starting tx lc...")
-            self.tx_lc = run_task(self.transfer, interval=(1.0 / individual_tx_rate))
-
-        my_client_id = self.experiment.my_id - self.num_validators
-        run_task(start_lc, delay=(1.0 / self.num_clients) * (my_client_id - 1))
+        load_generator = LoadGenerator(self.transfer, self.create_arrivals(individual_tx_rate, my_client_id),
+                                       max_in_flight=self.tx_max_in_flight)
+        load_generator.start()
+        self.load_generators.append(load_generator)
+
+    def create_arrivals(self, individual_tx_rate, my_client_id):
+        if self.tx_arrivals == "poisson":
+            return PoissonArrivals(individual_tx_rate, seed=self.experiment.my_id)
+        if self.tx_arrivals == "step":
+            max_rate = self.tx_ramp_max_rate / self.num_clients if self.tx_ramp_max_rate is not None else None
+            return StepRampArrivals(individual_tx_rate, self.tx_ramp_step / self.num_clients,
+                                    self.tx_ramp_step_duration, max_rate=max_rate)
+        if self.tx_arrivals == "trace":
+            return TraceArrivals.from_file(self.tx_trace_file, index=my_client_id - 1, stride=self.num_clients)
+        if self.tx_arrivals != "constant":
+            self._logger.error("Unknown arrival process %s, using constant arrivals", self.tx_arrivals)
+
+        # Depending on the number of clients, wait a bit
+        return ConstantArrivals(individual_tx_rate, phase=(1.0 / self.num_clients) * (my_client_id - 1))
+
+    def confirm_transaction(self, tx_id, confirm_time=None):
+        """
+        Record the confirmation of a transaction, with the ID returned by the transfer function.
+        """
+        for load_generator in reversed(self.load_generators):
+            if load_generator.confirm(tx_id, confirm_time):
+                return True
+        return False
 
     @experiment_callback
     def stop_creating_transactions(self):
@@ -75,5 +106,20 @@ class TransactionsModule(ExperimentModule):
             return
 
         self._logger.info("Stopping transactions...")
-        self.tx_lc.cancel()
-        self.tx_lc = None
+        self.stop_load()
+
+        with open("tx_rate.csv", "w") as out_file:
+            out_file.write("offered_rate,achieved_rate,submitted,dropped,failed\n")
+            for load_generator in self.load_generators:
+                stats = load_generator.get_stats()
+                out_file.write("%f,%f,%d,%d,%d\n" % (stats["offered_rate"], stats["achieved_rate"], stats["submitted"],
+                                                      stats["dropped"], stats["failed"]))
+
+        with open("tx_requests.csv", "w") as out_file:
+            out_file.write("tx_id,intended_time,submit_time,ack_time,confirm_time\n")
+            for load_generator in self.load_generators:
+                load_generator.write_requests(out_file)
+
+    def stop_load(self):
+        if self.load_generators:
+            self.load_generators[-1].stop()
@@ -1,4 +1,8 @@
-from gumby.statsparser import StatisticsParser
+import os
+
+import numpy as np
+
+from gumby.statsparser import PERCENTILES, StatisticsParser
 
 
 class BlockchainTransactionsParser(StatisticsParser):
@@ -9,9 +13,18 @@ class BlockchainTransactionsParser(StatisticsParser):
     def __init__(self, node_directory):
         super(BlockchainTransactionsParser, self).__init__(node_directory)
         self.transactions = []
-        self.cumulative_stats = []
+        self.cumulative_stats = np.zeros((1, 3), dtype=np.int64)
         self.avg_latency = -1
         self.avg_start_time = 0
+        self.latency_percentiles = []
+        self.latency_histogram = np.zeros((0, 2), dtype=np.int64)
+        # The size of the windows in which we count submitted and confirmed transactions, in milliseconds
+        self.cumulative_window = int(os.environ.get("TX_CUMULATIVE_WINDOW", "100"))
+        # The width of the bins of the latency histogram, in milliseconds
+        self.latency_bin_width = int(os.environ.get("TX_LATENCY_BIN_WIDTH", "100"))
+        self.submit_times = None
+        self.confirm_times = None
+        self.latencies = None
 
     def parse(self):
         """
@@ -19,7 +32,9 @@ class BlockchainTransactionsParser(StatisticsParser):
         """
         self.compute_avg_start_time()
         self.parse_transactions()
+        self.create_transaction_arrays()
         self.compute_avg_latency()
+        self.compute_latency_distribution()
         self.compute_tx_cumulative_stats()
         self.aggregate_disk_usage()
         self.write_all()
@@ -42,59 +57,59 @@ class BlockchainTransactionsParser(StatisticsParser):
         """
         pass
 
+    def create_transaction_arrays(self):
+        """
+        Create arrays with the submit times, confirm times and latencies of all transactions. Transactions that have not
+        been confirmed have a confirm time and latency of -1.
+        """
+        num_transactions = len(self.transactions)
+        self.submit_times = np.fromiter((transaction[2] for transaction in self.transactions), dtype=np.int64,
+                                        count=num_transactions)
+        self.confirm_times = np.fromiter((transaction[3] for transaction in self.transactions), dtype=np.int64,
+                                         count=num_transactions)
+        self.latencies = np.where(self.confirm_times != -1, self.confirm_times - self.submit_times, -1)
+
     def compute_avg_latency(self):
         """
         Compute the average transaction latency.
         """
-        avg_latency = 0
-        num_comfirmed = 0
-        for transaction in self.transactions:
-            if transaction[4] != -1:
-                avg_latency += transaction[4]
-                num_comfirmed += 1
-
-        self.avg_latency = (avg_latency / num_comfirmed) if num_comfirmed > 0 else -1
+        confirmed_latencies = self.latencies[self.confirm_times != -1]
+        self.avg_latency = confirmed_latencies.mean() if len(confirmed_latencies) > 0 else -1
 
-    def compute_tx_cumulative_stats(self):
+    def compute_latency_distribution(self):
         """
-        Compute cumulative transaction statistics.
+        Compute the percentiles and a histogram of the latencies of the confirmed transactions.
         """
-        submit_times = []
-        confirm_times = []
-        for transaction in self.transactions:
-            submit_times.append(transaction[2])
-            if transaction[3] != -1:
-                confirm_times.append(transaction[3])
-
-        submit_times = sorted(submit_times)
-        confirm_times = sorted(confirm_times)
+        confirmed_latencies = self.latencies[self.confirm_times != -1]
+        if len(confirmed_latencies) == 0:
+            return
 
-        cumulative_window = 100  # milliseconds
-        cur_time = 0
-        submitted_tx_index = 0
-        confirmed_tx_index = 0
+        self.latency_percentiles = list(zip(PERCENTILES, np.percentile(confirmed_latencies, PERCENTILES)))
+        bins = (confirmed_latencies // self.latency_bin_width).astype(np.int64)
+        first_bin = bins.min()
+        counts = np.bincount(bins - first_bin)
+        self.latency_histogram = np.column_stack(((np.arange(len(counts)) + first_bin) * self.latency_bin_width,
+                                                  counts))
 
-        submitted_count = 0
-        confirmed_count = 0
-        self.cumulative_stats = [(0, 0, 0)]
+    def compute_tx_cumulative_stats(self):
+        """
+        Compute cumulative transaction statistics: the number of transactions submitted and confirmed at the end of
+        every window.
+        """
+        submit_times = np.sort(self.submit_times)
+        confirm_times = np.sort(self.confirm_times[self.confirm_times != -1])
 
-        if not submit_times or not confirm_times:
+        self.cumulative_stats = np.zeros((1, 3), dtype=np.int64)
+        if len(submit_times) == 0 or len(confirm_times) == 0:
             return
 
-        while cur_time < max(submit_times[-1], confirm_times[-1]):
-            # Increase counters
-            while submitted_tx_index < len(submit_times) and \
-                    submit_times[submitted_tx_index] <= cur_time + cumulative_window:
-                submitted_tx_index += 1
-                submitted_count += 1
-
-            while confirmed_tx_index < len(confirm_times) and \
-                    confirm_times[confirmed_tx_index] <= cur_time + cumulative_window:
-                confirmed_tx_index += 1
-                confirmed_count += 1
-
-            cur_time += cumulative_window
-            self.cumulative_stats.append((cur_time, submitted_count, confirmed_count))
+        last_time = max(submit_times[-1], confirm_times[-1])
+        num_windows = -(-last_time // self.cumulative_window) if last_time > 0 else 0
+        window_ends = np.arange(0, num_windows + 1, dtype=np.int64) * self.cumulative_window
+        self.cumulative_stats = np.column_stack((window_ends,
+                                                 np.searchsorted(submit_times, window_ends, side='right'),
+                                                 np.searchsorted(confirm_times, window_ends, side='right')))
+        self.cumulative_stats[0, 1:] = 0
 
     def aggregate_disk_usage(self):
         """
@@ -113,13 +128,22 @@ class BlockchainTransactionsParser(StatisticsParser):
         """
         with open("transactions.txt", "w") as transactions_file:
             transactions_file.write("peer_id,tx_id,submit_time,confirm_time,latency\n")
-            for transaction in self.transactions:
-                transactions_file.write("%d,%s,%d,%d,%d\n" % transaction)
+            transactions_file.writelines("%d,%s,%d,%d,%d\n" % (transaction[0], transaction[1], submit_time,
+                                                               confirm_time, latency)
+                                         for transaction, submit_time, confirm_time, latency
+                                         in zip(self.transactions, self.submit_times.tolist(),
+                                                self.confirm_times.tolist(), self.latencies.tolist()))
 
-        with open("tx_cumulative.csv", "w") as out_file:
-            out_file.write("time,submitted,confirmed\n")
-            for result in self.cumulative_stats:
-                out_file.write("%d,%d,%d\n" % result)
+        np.savetxt("tx_cumulative.csv", self.cumulative_stats, fmt="%d", delimiter=",",
+                   header="time,submitted,confirmed", comments="")
 
         with open("latency.txt", "w") as latency_file:
             latency_file.write("%f" % self.avg_latency)
+
+        with open("latency_percentiles.csv", "w") as percentiles_file:
+            percentiles_file.write("percentile,latency\n")
+            for percentile, latency in self.latency_percentiles:
+                percentiles_file.write("%s,%f\n" % (percentile, latency))
+
+        np.savetxt("latency_histogram.csv", self.latency_histogram, fmt="%d", delimiter=",",
+                   header="latency,transactions", comments="")
@@ -5,11 +5,13 @@
 import errno
 import json
 import os
+import struct
 import sys
 from argparse import ArgumentParser
-from glob import iglob
+from bisect import bisect_left
 from math import ceil
-from os import (R_OK, access, getpgid, getpid, kill, killpg, makedirs, mkdir, path, setsid, sysconf, sysconf_names)
+from os import (R_OK, access, getpgid, getpid, kill, killpg, listdir, makedirs, mkdir, path, setsid, sysconf,
+                sysconf_names)
 from signal import SIGKILL, SIGTERM, signal
 from subprocess import Popen
 from time import sleep, time
@@ -20,6 +22,31 @@ OK_EXIT_CODE = 0
 TIMEOUT_EXIT_CODE = 3
 COMMANDS_FAILED_EXIT_CODE = 5
 
+# The fields of a record in the binary resource usage log, as (name, struct format) pairs. These are only the fields
+# used by process_guard_stats_parser.py.
+BINARY_RECORD_FIELDS = [
+    ("timestamp", "d"),
+    ("pid", "I"),
+    ("comm", "16s"),
+    ("utime", "q"),
+    ("stime", "q"),
+    ("num_threads", "q"),
+    ("vsize", "q"),
+    ("rss", "q"),
+    ("rchar", "q"),
+    ("wchar", "q"),
+    ("read_bytes", "q"),
+    ("write_bytes", "q"),
+]
+BINARY_RECORD_FORMAT = "<" + "".join(field_format for _, field_format in BINARY_RECORD_FIELDS)
+
+# Also scan the process groups every this many updates of the pid tree when following the children of the processes,
+# to find descendants that were reparented to init, like daemons.
+PGRP_SCAN_INTERVAL = 10
+
+# Upper bounds (in seconds) of the buckets of the sampling latency histogram
+LATENCY_BUCKETS = [0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0, 5.0]
+
 def extract_pgrp(stat_file_data):
     """
     Extracts PGRP value from the stats file content.
@@ -54,7 +81,7 @@ class ResourceMonitor(object):
         self.files = []
         self.output_dir = output_dir
 
-        self.pgid_list = []
+        self.pgids = set()
 
         self.nr_commands = len(commands)
         for command in commands:
@@ -62,8 +89,17 @@ class ResourceMonitor(object):
 
         self.pid_list = []
         self.pid_list.extend(self.pid_dict.keys())
-        self.ignore_pid_list = []
-        self.ignore_pid_list.append(getpid())
+        self.ignore_pids = set()
+        # Descendants whose statistics we cannot read, but whose children we keep following
+        self.unreadable_pids = set()
+        # Processes outside the process groups of the commands, found when scanning the process groups
+        self.pgrp_ignore_pids = {getpid()}
+        self.pid_tree_updates = 0
+        self.proc_dir = '/proc'
+
+        # Follow the descendants of the monitored processes if the kernel exposes them (CONFIG_PROC_CHILDREN),
+        # otherwise scan /proc for processes in the process groups of the commands.
+        self.track_children = path.exists('/proc/%d/task/%d/children' % (getpid(), getpid()))
 
         self.last_died = False
 
@@ -107,12 +143,12 @@ class ResourceMonitor(object):
         if not self.pid_list and pids_to_remove:  # If the pid list is empty and we have removed any PID, it means we can exit as no more processes will appear.
             self.last_died = True
 
-    def get_raw_stats(self):
+    def get_raw_stats(self, pids=None):
         """
-        Get raw statistics as reported by procfs.
+        Get raw statistics as reported by procfs, for the given pids or all monitored pids.
         First, get statistics from /proc/.../stat. Next, append the statistics from /proc/.../io.
         """
-        for pid in self.pid_list:
+        for pid in list(self.pid_list if pids is None else pids):
             if not os.path.exists('/proc'):
                 dummy_status = "%s (sh) S 0 0 0 0 -1 8192 0 0 0 0 0 0 0 0 0 0 1 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 " \
                                "0 0 0 0 0 0 0 0 0 0 0 0 0 0" % pid
@@ -140,6 +176,38 @@ class ResourceMonitor(object):
                     if not self.pid_list:
                         self.last_died = True
 
+    def get_stat_records(self, pids=None):
+        """
+        Get the statistics used by the stats parser for the given pids or all monitored pids, as a tuple of
+        (pid, comm, utime, stime, num_threads, vsize, rss, rchar, wchar, read_bytes, write_bytes).
+        Only /proc/.../stat and /proc/.../io are read, the remaining fields are never formatted.
+        """
+        pids = list(self.pid_list if pids is None else pids)
+        if not os.path.exists('/proc'):
+            for pid in pids:
+                yield (pid, b"sh", 0, 0, 1, 0, 0, 0, 0, 0, 0)
+            return
+
+        for pid in pids:
+            try:
+                with open('/proc/%d/stat' % pid, 'rb') as stat_file:
+                    status = stat_file.read()
+                with open('/proc/%d/io' % pid, 'rb') as io_file:
+                    io_values = io_file.read().split()[1::2]
+            except IOError:
+                print("IOError occurred - could not get procfs statistics")
+                self.pid_list.remove(pid)
+                if not self.pid_list:
+                    self.last_died = True
+                continue
+
+            # The process name can contain spaces, so we look for the last closing parenthesis (see extract_pgrp)
+            end_of_process_name = status.rfind(b')')
+            comm = status[status.find(b'(') + 1:end_of_process_name]
+            stats = status[end_of_process_name + 2:].split()
+            yield (pid, comm, int(stats[11]), int(stats[12]), int(stats[17]), int(stats[20]), int(stats[21]),
+                   int(io_values[0]), int(io_values[1]), int(io_values[4]), int(io_values[5]))
+
     def get_network_stats(self):
         if not os.path.exists('/proc/net/dev'):
             yield 'dummy 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0 0'
@@ -157,21 +225,77 @@ class ResourceMonitor(object):
         return self.last_died or not self.pid_list
 
     def update_pid_tree(self):
+        """Add new descendants of the monitored processes to the list of PIDs"""
+        self.pid_tree_updates += 1
+        complete = self.track_children and self.update_pid_tree_from_children()
+        if not complete or self.pid_tree_updates % PGRP_SCAN_INTERVAL == 0:
+            self.update_pid_tree_from_pgrp()
+
+    def add_pid(self, pid):
+        """Start monitoring a process, if we are able to read its statistics"""
+        if access('%s/%d/stat' % (self.proc_dir, pid), R_OK) and access('%s/%d/io' % (self.proc_dir, pid), R_OK):
+            self.pid_list.append(pid)
+            return True
+        self.ignore_pids.add(pid)
+        return False
+
+    def update_pid_tree_from_children(self):
+        """
+        Walk down the process tree using /proc/<pid>/task/<tid>/children, starting from the monitored processes.
+        Only the children of known processes are read, so the cost does not depend on the total number of processes
+        on the machine. Returns False if the children of a running process could not be read, in which case some
+        descendants may be missing.
+        """
+        complete = True
+        known_pids = self.ignore_pids.union(self.pid_list)
+        parents = list(self.pid_list) + list(self.unreadable_pids)
+        seen_pids = set()
+        while parents:
+            children = set()
+            for pid in parents:
+                try:
+                    for tid in listdir('%s/%d/task' % (self.proc_dir, pid)):
+                        with open('%s/%d/task/%s/children' % (self.proc_dir, pid, tid), 'r') as children_file:
+                            children.update(int(child) for child in children_file.read().split())
+                except (IOError, OSError):
+                    if path.exists('%s/%d' % (self.proc_dir, pid)):
+                        complete = False
+                    # Otherwise, the process or thread exited while we were reading
+                    continue
+
+            seen_pids |= children
+            children -= known_pids
+            known_pids |= children
+            for child in children:
+                if not self.add_pid(child):
+                    self.unreadable_pids.add(child)
+            # Also follow the children of processes we cannot monitor, their descendants might be readable
+            parents = list(children)
+
+        # Forget about the descendants we did not see again, they exited and their pid could be reused
+        self.ignore_pids &= seen_pids
+        self.unreadable_pids &= seen_pids
+        return complete
+
+    def update_pid_tree_from_pgrp(self):
         """Update the list of PIDs contained in the process group"""
-        for pid_dir in iglob('/proc/[1-9]*'):
-            pid = int(pid_dir.split('/')[-1])
-            if pid in self.pid_list or pid in self.ignore_pid_list:
-                continue
+        live_pids = {int(entry) for entry in listdir(self.proc_dir) if entry.isdigit()}
+        # Forget about processes that exited, their pid could be reused
+        self.ignore_pids &= live_pids
+        self.unreadable_pids &= live_pids
+        self.pgrp_ignore_pids &= live_pids
 
-            stat_file = path.join(pid_dir, 'stat')
-            io_file = path.join(pid_dir, 'io')
-            if access(stat_file, R_OK) and access(io_file, R_OK):
-                pgrp = extract_pgrp(open(stat_file, 'r').read())
+        for pid in live_pids - self.ignore_pids.union(self.pgrp_ignore_pids, self.pid_list):
+            try:
+                with open('%s/%d/stat' % (self.proc_dir, pid), 'r') as stat_file:
+                    pgrp = extract_pgrp(stat_file.read())
+            except (IOError, OSError):
+                continue
 
-                if pgrp in self.pgid_list:
-                    self.pid_list.append(pid)
-                else:
-                    self.ignore_pid_list.append(pid)
+            if pgrp in self.pgids:
+                self.add_pid(pid)
+            else:
+                self.pgrp_ignore_pids.add(pid)
 
     def run(self, cmd):
         if self.output_dir and "DEBUG" not in os.environ:
@@ -191,7 +315,7 @@ class ResourceMonitor(object):
             stdout.flush()
         p = PGPopen(cmd, shell=True, stdout=stdout, stderr=stderr, close_fds=True, env=None, preexec_fn=setsid)
         self.pid_dict[p.pid] = p
-        self.pgid_list.append(getpgid(p.pid))
+        self.pgids.add(getpgid(p.pid))
 
         self.cmd_counter = self.cmd_counter + 1
 
@@ -232,20 +356,33 @@ class ResourceMonitor(object):
 
 class ProcessMonitor(object):
 
-    def __init__(self, commands, timeout, interval, output_dir=None, monitor_dir=None, network=False):
+    def __init__(self, commands, timeout, interval, output_dir=None, monitor_dir=None, network=False, binary=False,
+                 max_stretch=8, sub_intervals=1):
         self.start_time = time()
         self.timed_out = False
         self.end_time = self.start_time + timeout if timeout else 0  # Do not time out if time_limit is 0.
         self._interval = interval
+        # Under pressure, the sampling interval is stretched up to max_stretch times the requested interval
+        self._current_interval = interval
+        self._max_interval = interval * max_stretch
+        # The pids of one sample are read in this many batches, spread over the sampling interval
+        self._sub_intervals = max(1, sub_intervals)
+        self.latency_histogram = [0] * (len(LATENCY_BUCKETS) + 1)
 
         self._rm = ResourceMonitor(output_dir, commands)
+        self.monitor_dir = monitor_dir
         self.monitor_file = None
+        self.skipped_samples_file = None
         self.network_monitor_file = None
         self.psutil_process = Process()
+        self.record_struct = struct.Struct(BINARY_RECORD_FORMAT) if binary else None
 
         if monitor_dir:
             # Set the file's buffering to 10MB
-            self.monitor_file = open(os.path.join(monitor_dir, "resource_usage.log"), "w", (1024 ** 2) * 10)
+            if binary:
+                self.monitor_file = open(os.path.join(monitor_dir, "resource_usage.bin"), "wb", (1024 ** 2) * 10)
+            else:
+                self.monitor_file = open(os.path.join(monitor_dir, "resource_usage.log"), "w", (1024 ** 2) * 10)
             # We read the jiffie -> second conversion rate from the os, by dividing the utime
             # and stime values by this conversion rate we will get the actual cpu seconds spend during this second.
             try:
@@ -259,7 +396,18 @@ class ProcessMonitor(object):
             except:
                 pagesize = 4 * 1024
 
-            self.monitor_file.write(json.dumps({"sc_clk_tck": sc_clk_tck, 'pagesize': pagesize}) + "\n")
+            metainfo = {"sc_clk_tck": sc_clk_tck, 'pagesize': pagesize}
+            if binary:
+                # The header describes the layout of the fixed-width records that follow it
+                metainfo["format"] = "binary"
+                metainfo["fields"] = BINARY_RECORD_FIELDS
+                metainfo["byteorder"] = "<"
+                self.monitor_file.write(json.dumps(metainfo).encode() + b"\n")
+            else:
+                self.monitor_file.write(json.dumps(metainfo) + "\n")
+
+            # Samples that were skipped because we could not keep up, so the parser can interpolate them
+            self.skipped_samples_file = open(os.path.join(monitor_dir, "resource_usage_skipped.log"), "w")
 
             # If monitoring network, open a separate file.
             if network:
@@ -272,6 +420,9 @@ class ProcessMonitor(object):
         self.stopping = True
         if self.monitor_file:
             self.monitor_file.close()
+        if self.skipped_samples_file:
+            self.skipped_samples_file.close()
+        self.report_latency_histogram()
 
         # Check if any process exited with an error code before killing the remaining ones
         failed = self._rm.get_failed_commands()
@@ -290,19 +441,62 @@ class ProcessMonitor(object):
         if not self.stopping:
             self.stop()
 
-    def monitoring_loop(self):
-        check_for_new_processes = 60
+    def record_latency(self, latency):
+        self.latency_histogram[bisect_left(LATENCY_BUCKETS, latency)] += 1
+
+    def report_latency_histogram(self):
+        """
+        Print the histogram of the time it took to take each sample, and write it to the monitor dir.
+        """
+        num_samples = sum(self.latency_histogram)
+        if not num_samples:
+            return
+
+        print("Sampling latency histogram (%d samples):" % num_samples)
+        lower_bound = 0
+        for upper_bound, count in zip(LATENCY_BUCKETS + [float('inf')], self.latency_histogram):
+            print("  %.3f - %.3f s: %d" % (lower_bound, upper_bound, count))
+            lower_bound = upper_bound
+
+        if self.monitor_dir:
+            with open(os.path.join(self.monitor_dir, "sampling_latency.csv"), "w") as latency_file:
+                latency_file.write("upper_bound,samples\n")
+                for upper_bound, count in zip(LATENCY_BUCKETS + [float('inf')], self.latency_histogram):
+                    latency_file.write("%f,%d\n" % (upper_bound, count))
+
+    def adapt_interval(self, latency):
+        """
+        Stretch the sampling interval if taking a sample takes more than half of it, and shrink it back towards the
+        requested interval when the pressure is gone.
+        """
+        if latency > self._current_interval / 2 and self._current_interval < self._max_interval:
+            self._current_interval = min(self._current_interval * 2, self._max_interval)
+            print("Sampling took %.3f s, increasing the interval to %.1f s" % (latency, self._current_interval))
+        elif latency < self._current_interval / 8 and self._current_interval > self._interval:
+            self._current_interval = max(self._current_interval / 2, self._interval)
+            print("Sampling took %.3f s, decreasing the interval to %.1f s" % (latency, self._current_interval))
+
+    def write_sample(self, r_timestamp, pids):
+        if self.record_struct:
+            for record in self._rm.get_stat_records(pids):
+                self.monitor_file.write(self.record_struct.pack(r_timestamp, *record))
+        else:
+            for line in self._rm.get_raw_stats(pids):
+                self.monitor_file.write("%.1f %s\n" % (r_timestamp, line))
 
+    def monitoring_loop(self):
         time_start = time()
-        sleep_time = self._interval
         last_subprocess_update = time_start
+        next_sample = time_start
+        last_r_timestamp = None
         while not self.stopping:
             timestamp = time()
             r_timestamp = ceil(timestamp / self._interval) * self._interval  # rounding timestamp to nearest interval to try to overlap multiple nodes
+            slept = 0
 
             self._rm.prune_pid_list()
-            # Look for new subprocesses only once a second and only during the first "check_for_new_processes" seconds
-            if (timestamp < time_start + check_for_new_processes) and (timestamp - last_subprocess_update >= 1):
+            # Look for new subprocesses once a second, during the whole run
+            if timestamp - last_subprocess_update >= 1:
                 self._rm.update_pid_tree()
                 last_subprocess_update = timestamp
 
@@ -311,25 +505,41 @@ class ProcessMonitor(object):
                 return self.stop()
 
             elif self.monitor_file:
-                next_wake = timestamp + self._interval
-
-                for line in self._rm.get_raw_stats():
-                    self.monitor_file.write("%.1f %s\n" % (r_timestamp, line))
-
-                sleep_time = next_wake - timestamp
-                if sleep_time < 0:
-                    print("Can't keep up with this interval, try a higher value!", sleep_time)
-                    return self.stop()
+                if last_r_timestamp is not None:
+                    skipped = int(round((r_timestamp - last_r_timestamp) / self._interval)) - 1
+                    if skipped > 0:
+                        self.skipped_samples_file.write("%.1f %d %f\n" % (r_timestamp, skipped, self._interval))
+                last_r_timestamp = r_timestamp
+
+                pids = list(self._rm.pid_list)
+                batch_size = int(ceil(len(pids) / float(self._sub_intervals)))
+                for batch in range(self._sub_intervals):
+                    if batch:
+                        sleep_time = timestamp + batch * self._current_interval / self._sub_intervals - time()
+                        if sleep_time > 0:
+                            sleep(sleep_time)
+                            slept += sleep_time
+                    self.write_sample(r_timestamp, pids[batch * batch_size:(batch + 1) * batch_size])
 
             if self.network_monitor_file:
                 for line in self._rm.get_network_stats():
                     self.network_monitor_file.write("%.1f %s\n" % (r_timestamp, line))
 
+            latency = time() - timestamp - slept
+            self.record_latency(latency)
+            self.adapt_interval(latency)
+
             if self.end_time and timestamp > self.end_time:  # if self.end_time == 0 the time out is disabled.
                 print("Time out, killing monitored processes.")
                 self.timed_out = True
                 return self.stop()
-            sleep(sleep_time)
+
+            next_sample += self._current_interval
+            now = time()
+            if now > next_sample:
+                # We could not keep up, coalesce the missed samples into the next one
+                next_sample += ceil((now - next_sample) / self._interval) * self._interval
+            sleep(max(0, next_sample - now))
 
 
 if __name__ == "__main__":
@@ -369,6 +579,24 @@ if __name__ == "__main__":
                         default=False,
                         help="Monitor network devices."
                         )
+    parser.add_argument("--binary",
+                        action="store_true",
+                        default=False,
+                        help="Write the resource usage as fixed-width binary records (resource_usage.bin) instead of "
+                             "text lines."
+                        )
+    parser.add_argument("--max-stretch",
+                        metavar='FACTOR',
+                        default=8,
+                        type=int,
+                        help="When sampling can't keep up, stretch the interval up to FACTOR times its value"
+                        )
+    parser.add_argument("--sub-intervals",
+                        metavar='N',
+                        default=1,
+                        type=int,
+                        help="Spread the reads of the monitored processes over N parts of the sampling interval"
+                        )
     parser.add_argument("--instances",
                         "-n",
                         default=1,
@@ -397,7 +625,8 @@ if __name__ == "__main__":
         print("making output directory: %s" % args.output_dir)
         makedirs(args.output_dir)
 
-    pm = ProcessMonitor(commands, args.timeout, args.interval, args.output_dir, args.monitor_dir, args.network)
+    pm = ProcessMonitor(commands, args.timeout, args.interval, args.output_dir, args.monitor_dir, args.network,
+                        args.binary, args.max_stretch, args.sub_intervals)
     try:
         exit(pm.monitoring_loop())
 
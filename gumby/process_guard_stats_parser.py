@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
-import sys
+import json
 import os
-from collections import defaultdict
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
 
-import json
+import numpy as np
+
+from gumby.statsparser import StatisticsParser, aggregation_step
 
 
 # Indices in proc(5)
@@ -18,250 +22,346 @@ PROCFS_WCHARS = -6       # 51 (index of last /stat item) + 2
 PROCFS_READ_BYTES = -3   # 51 (index of last /stat item) + 6
 PROCFS_WRITE_BYTES = -2  # 51 (index of last /stat item) + 7
 
+# The columns we extract from each line of a resource_usage.log file, in this order
+RESOURCE_FIELDS = [PROCFS_UTIME, PROCFS_STIME, PROCFS_NUM_THREADS, PROCFS_VSIZE, PROCFS_RSS, PROCFS_RCHARS,
+                   PROCFS_WCHARS, PROCFS_READ_BYTES, PROCFS_WRITE_BYTES]
+UTIME, STIME, NUM_THREADS, VSIZE, RSS, RCHARS, WCHARS, READ_BYTES, WRITE_BYTES = range(len(RESOURCE_FIELDS))
+# The names of the same columns in the binary format written by process_guard.py --binary
+BINARY_RESOURCE_FIELDS = ["utime", "stime", "num_threads", "vsize", "rss", "rchar", "wchar", "read_bytes",
+                          "write_bytes"]
+
+# All the statistics we compute, these are also the names of the output files
+RESOURCE_METRICS = ["utimes", "stimes", "wchars", "rchars", "wchars_sum", "rchars_sum", "writebytes", "readbytes",
+                    "writebytes_sum", "readbytes_sum", "vsizes", "rsizes", "threads"]
+
+COLUMNAR_DIR = "resource_usage"
+SKIPPED_SAMPLES_FN = "resource_usage_skipped.log"
+
+
+def compute_rates(times, pid_indices, values):
+    """
+    Compute the change per second of a counter, for each pid. The first sample of a pid has a rate of 0.
+    """
+    order = np.argsort(pid_indices, kind='stable')
+    sorted_times = times[order]
+    sorted_values = values[order]
+
+    same_pid = pid_indices[order][1:] == pid_indices[order][:-1]
+    time_diffs = np.diff(sorted_times)
+    value_diffs = np.diff(sorted_values).astype(np.float64)
+    valid = same_pid & (time_diffs != 0)
 
-def write_records(all_nodes, sum_records, output_file):
-    if sum_records:
-        with open(output_file, 'w') as out_file:
-            print('time', ' '.join(all_nodes), file=out_file)
+    sorted_rates = np.zeros(len(times))
+    sorted_rates[1:][valid] = value_diffs[valid] / time_diffs[valid]
 
-            prev_records = {}
-            for time in sorted(sum_records.keys()):
-                print(time, end=' ', file=out_file)
+    rates = np.empty_like(sorted_rates)
+    rates[order] = sorted_rates
+    return rates
 
-                nodes = sum_records[time]
-                for node in all_nodes:
-                    value = nodes.get(node, prev_records.get(node, 0))
-                    print(value, end=' ', file=out_file)
 
-                    prev_records[node] = value
-                print('', file=out_file)
+def read_text_resource_file(resource_file, nodename):
+    """
+    Read the samples in a resource_usage.log file, after the header line.
+    """
+    pids = {}
+    timestamps = []
+    pid_indices = []
+    samples = []
+    for line in resource_file:
+        parts = line.split()
+        if not parts:
+            continue
+
+        pid = nodename + "_" + parts[2][1:-1] + "_" + parts[1]
+        timestamps.append(float(parts[0]))
+        pid_indices.append(pids.setdefault(pid, len(pids)))
+        samples.append([int(parts[field]) for field in RESOURCE_FIELDS])
+
+    pid_names = sorted(pids, key=pids.get)
+    return np.array(timestamps), pid_names, np.array(pid_indices, dtype=np.int64), \
+        np.array(samples, dtype=np.int64).reshape(-1, len(RESOURCE_FIELDS))
+
+
+def read_binary_resource_file(resource_file_path, metainfo, offset, nodename):
+    """
+    Read the fixed-width records in a resource_usage.bin file, which start at offset. The file is memory mapped and
+    the record layout is taken from the header.
+    """
+    struct_to_dtype = {"d": "f8", "I": "u4", "q": "i8"}
+    dtype = np.dtype([(name, metainfo["byteorder"] + struct_to_dtype[field_format])
+                      if field_format in struct_to_dtype else (name, "S" + field_format[:-1])
+                      for name, field_format in metainfo["fields"]])
+
+    num_records = (os.stat(resource_file_path).st_size - offset) // dtype.itemsize
+    if num_records == 0:
+        return np.empty(0), [], np.empty(0, dtype=np.int64), np.empty((0, len(RESOURCE_FIELDS)), dtype=np.int64)
+    records = np.memmap(resource_file_path, dtype=dtype, mode="r", offset=offset, shape=(num_records,))
+
+    # A process is identified by its pid and name, ordered by their first appearance
+    keys = records["pid"].astype(np.uint64).astype("S10") + b"_" + records["comm"]
+    _, first_indices, pid_indices = np.unique(keys, return_index=True, return_inverse=True)
+    appearance_order = np.argsort(first_indices)
+    ranks = np.empty_like(appearance_order)
+    ranks[appearance_order] = np.arange(len(appearance_order))
+    pid_names = ["%s_%s_%d" % (nodename, records["comm"][index].decode(errors="replace"), records["pid"][index])
+                 for index in first_indices[appearance_order]]
+
+    samples = np.column_stack([records[name].astype(np.int64) for name in BINARY_RESOURCE_FIELDS])
+    return np.array(records["timestamp"]), pid_names, ranks[pid_indices.ravel()], samples
+
+
+def read_skipped_samples(skipped_samples_path):
+    """
+    Read the timestamps of the samples process_guard.py skipped because it could not keep up. Each line holds the
+    timestamp of the sample after the gap, the number of skipped samples and the sampling interval.
+    """
+    skipped_timestamps = []
+    if os.path.exists(skipped_samples_path):
+        with open(skipped_samples_path, "r") as skipped_samples_file:
+            for line in skipped_samples_file:
+                parts = line.split()
+                if len(parts) == 3:
+                    timestamp, skipped, interval = float(parts[0]), int(parts[1]), float(parts[2])
+                    # Round like the timestamps in the resource usage file, so equal timestamps compare equal
+                    skipped_timestamps.extend(np.round(timestamp - interval * np.arange(1, skipped + 1), 1))
+    return np.array(skipped_timestamps)
+
+
+def interpolate_rows(times, matrix, rows):
+    """
+    Linearly interpolate the given rows of a (time x pid) matrix, for every pid that has samples before and after
+    that row.
+    """
+    for column in range(matrix.shape[1]):
+        present = ~np.isnan(matrix[:, column])
+        if np.count_nonzero(present) < 2:
+            continue
+        present_times = times[present]
+        fill_rows = rows[(times[rows] > present_times[0]) & (times[rows] < present_times[-1])]
+        matrix[fill_rows, column] = np.interp(times[fill_rows], present_times, matrix[present, column])
+
+
+def parse_node_resource_file(resource_file_path, nodename, output_dir):
+    """
+    Parse the resource usage file (text or binary) of a single node and write a (time x pid) matrix for each
+    statistic, plus the per-node sum, to output_dir as .npy files. This function runs in a worker process, so only a
+    small summary is returned.
+    """
+    with open(resource_file_path, "rb") as resource_file:
+        # The first line of the resource file gives the sc_clk_tck and pagesize of the node
+        header = resource_file.readline()
+        metainfo = json.loads(header)
+        sc_clk_tck = float(metainfo['sc_clk_tck'])
+        pagesize = float(metainfo['pagesize'])
+
+        if metainfo.get("format") == "binary":
+            timestamps, pid_names, pid_indices, samples = read_binary_resource_file(resource_file_path, metainfo,
+                                                                                   len(header), nodename)
+        else:
+            lines = (line.decode(errors="replace") for line in resource_file)
+            timestamps, pid_names, pid_indices, samples = read_text_resource_file(lines, nodename)
+
+    if not len(timestamps):
+        return None
+
+    start_timestamp = timestamps[0]
+    times = timestamps - start_timestamp
+
+    def rate(column):
+        return compute_rates(times, pid_indices, samples[:, column])
+
+    metrics = {
+        "utimes": rate(UTIME) / sc_clk_tck,
+        "stimes": rate(STIME) / sc_clk_tck,
+        "wchars": rate(WCHARS) / 1024.0,
+        "rchars": rate(RCHARS) / 1024.0,
+        "wchars_sum": samples[:, WCHARS] / 1024.0,
+        "rchars_sum": samples[:, RCHARS] / 1024.0,
+        "writebytes": rate(WRITE_BYTES) / 1024.0,
+        "readbytes": rate(READ_BYTES) / 1024.0,
+        "writebytes_sum": samples[:, WRITE_BYTES] / 1024.0,
+        "readbytes_sum": samples[:, READ_BYTES] / 1024.0,
+        "vsizes": samples[:, VSIZE] / 1048576.0,
+        "rsizes": (samples[:, RSS] * pagesize) / 1048576.0,
+        "threads": samples[:, NUM_THREADS].astype(np.float64),
+    }
+
+    # Add a row for every sample process_guard.py skipped, these rows are interpolated
+    skipped_times = read_skipped_samples(os.path.join(os.path.dirname(resource_file_path), SKIPPED_SAMPLES_FN))
+    sampled_times = np.unique(times)
+    node_times, time_indices = np.unique(np.concatenate((times, skipped_times - start_timestamp)),
+                                         return_inverse=True)
+    time_indices = time_indices.ravel()[:len(times)]
+    skipped_rows = np.flatnonzero(~np.isin(node_times, sampled_times))
+
+    node_dir = os.path.join(output_dir, nodename)
+    os.makedirs(node_dir, exist_ok=True)
+    np.save(os.path.join(node_dir, "times.npy"), node_times)
+    for metric, values in metrics.items():
+        matrix = np.full((len(node_times), len(pid_names)), np.nan)
+        matrix[time_indices, pid_indices] = values
+        if len(skipped_rows):
+            interpolate_rows(node_times, matrix, skipped_rows)
+        np.save(os.path.join(node_dir, "%s.npy" % metric), matrix)
+        np.save(os.path.join(node_dir, "%s_node.npy" % metric), np.nansum(matrix, axis=1))
+
+    # Processes that were measured to have a utime larger than 0.9 too often
+    high_utimes = np.bincount(pid_indices[metrics["utimes"] > 0.9], minlength=len(pid_names))
+    utime_warnings = {pid_names[index]: int(count) for index, count in enumerate(high_utimes) if count > 5}
+
+    return {
+        "node": nodename,
+        "pids": pid_names,
+        "start_timestamp": float(start_timestamp),
+        "max_timestamp": float(timestamps.max()),
+        "skipped_samples": len(skipped_rows),
+        "utime_warnings": utime_warnings,
+    }
+
+
+def write_records(names, times, matrix, output_file):
+    """
+    Write a (time x name) matrix to a space-separated text file. Missing values (NaN) are replaced by the previous
+    value of the same column, or 0 if there is none.
+    """
+    present = ~np.isnan(matrix)
+    last_present = np.where(present, np.arange(len(times))[:, None], 0)
+    np.maximum.accumulate(last_present, axis=0, out=last_present)
+    filled = matrix[last_present, np.arange(matrix.shape[1])]
+    filled[np.isnan(filled)] = 0
+
+    with open(output_file, 'w') as out_file:
+        np.savetxt(out_file, np.column_stack((times, filled)), fmt='%.10g', delimiter=' ',
+                   header=' '.join(['time'] + names), comments='')
 
 
 class ResourceUsageParser(object):
     """
     This class implements a resource parser.
-    It scans for resource usage files and writes it in CSV format.
+    It scans for resource usage files (text or binary), parses them in parallel and writes the statistics of each node
+    as columnar .npy files to the resource_usage directory in the output directory. The statistics can optionally be
+    exported to the space-separated text files used by the R scripts.
     """
 
-    def __init__(self, input_dir, output_dir):
+    def __init__(self, input_dir, output_dir, workers=None):
         self.input_dir = input_dir
         self.output_dir = output_dir
+        self.columnar_dir = os.path.join(output_dir, COLUMNAR_DIR)
+        self.workers = workers
         self.all_pids = set()
         self.all_nodes = set()
+        self.node_summaries = []
+        self.start_timestamp = None
+        self.max_timestamp = 0
 
-        # The stime
-        self.stimes = {}
-        self.utimes = {}
-        self.vsizes = {}
-        self.rsizes = {}
-        self.rchars = {}
-        self.rchars_sum = {}
-        self.wchars = {}
-        self.wchars_sum = {}
-        self.readbytes = {}
-        self.readbytes_sum = {}
-        self.writebytes = {}
-        self.writebytes_sum = {}
-        self.threads = {}
-
-        self.prev_stimes = {}
-        self.prev_utimes = {}
-        self.prev_wchar = {}
-        self.prev_rchar = {}
-        self.prev_writebytes = {}
-        self.prev_readbytes = {}
-        self.prev_times = {}
-        self.prev_threads = {}
-
-    def check_utime_sanity(self):
+    def find_resource_files(self):
+        for root, _, files in os.walk(self.input_dir):
+            for resource_usage_fn in ('resource_usage.log', 'resource_usage.bin'):
+                if resource_usage_fn in files:
+                    nodename = root.split('/')[-1]
+                    resource_file_path = os.path.join(root, resource_usage_fn)
+                    if os.stat(resource_file_path).st_size == 0:
+                        print("Empty file %s, skipping" % resource_file_path, file=sys.stderr)
+                        continue
+                    yield nodename, resource_file_path
+
+    def parse_resource_files(self):
+        resource_files = list(self.find_resource_files())
+        print("Parsing %d resource_usage files" % len(resource_files), file=sys.stderr)
+
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(parse_node_resource_file, resource_file_path, nodename, self.columnar_dir)
+                       for nodename, resource_file_path in resource_files]
+            summaries = [future.result() for future in futures]
+
+        self.node_summaries = sorted((summary for summary in summaries if summary), key=lambda s: s["node"])
+        for summary in self.node_summaries:
+            self.all_nodes.add(summary["node"])
+            self.all_pids.update(summary["pids"])
+            if summary["skipped_samples"]:
+                print("Interpolated %d samples on node %s that process_guard.py skipped"
+                      % (summary["skipped_samples"], summary["node"]), file=sys.stderr)
+            for pid, times in summary["utime_warnings"].items():
+                print("A process with name (%s) was measured to have a utime larger than 0.9 for %d times"
+                      % (pid, times), file=sys.stderr)
+
+        if not self.node_summaries:
+            return
+
+        self.start_timestamp = min(summary["start_timestamp"] for summary in self.node_summaries)
+        self.max_timestamp = max(summary["max_timestamp"] for summary in self.node_summaries)
+
+        with open(os.path.join(self.columnar_dir, "index.json"), "w") as index_file:
+            json.dump({"metrics": RESOURCE_METRICS, "nodes": self.node_summaries}, index_file)
+
+        with open(os.path.join(self.output_dir, "axis_stats.txt"), "w") as axis_stats_file:
+            axis_stats_file.write("XMIN=0\n")
+            axis_stats_file.write("XMAX=%d\n" % (self.max_timestamp - self.start_timestamp))
+            axis_stats_file.write("XSTART=%d\n" % self.start_timestamp)
+
+    def export_text(self):
         """
-        Check a provided utimes dictionary whether processes did not take too much utime.
+        Write the per-pid (<metric>.txt) and per-node (<metric>_node.txt) text files from the columnar data.
         """
-        nr_1utime = defaultdict(int)
-        warn_utime = {}
-        for pid_dict in self.utimes.values():
-            for pid, utime in pid_dict.items():
-                if isinstance(utime, float) and utime > 0.9:
-                    nr_1utime[pid] += 1
+        if not self.node_summaries:
+            return
 
-                if nr_1utime[pid] > 5:
-                    warn_utime[pid] = max(nr_1utime[pid], warn_utime.get(pid, nr_1utime[pid]))
+        node_times = [np.load(os.path.join(self.columnar_dir, summary["node"], "times.npy"))
+                      for summary in self.node_summaries]
+        times = np.unique(np.concatenate(node_times))
+        rows = [np.searchsorted(times, node_time) for node_time in node_times]
 
-        for pid, times in warn_utime.items():
-            print("A process with name (%s) was measured to have a utime larger than 0.9 for %d times"
-                  % (pid, times), file=sys.stderr)
+        pid_names = [pid for summary in self.node_summaries for pid in summary["pids"]]
+        node_names = [summary["node"] for summary in self.node_summaries]
 
-    def parse_resource_files(self):
-        def calc_diff(curtime, prevtime, curvalue, prevvalue):
-            diff = curvalue - prevvalue
-            diff_in_log = curtime - prevtime
+        for metric in RESOURCE_METRICS:
+            pid_matrix = np.full((len(times), len(pid_names)), np.nan)
+            node_matrix = np.full((len(times), len(node_names)), np.nan)
+            pid_column = 0
+            for node_column, summary in enumerate(self.node_summaries):
+                node_dir = os.path.join(self.columnar_dir, summary["node"])
+                matrix = np.load(os.path.join(node_dir, "%s.npy" % metric))
+                pid_matrix[rows[node_column], pid_column:pid_column + matrix.shape[1]] = matrix
+                node_matrix[rows[node_column], node_column] = np.load(os.path.join(node_dir, "%s_node.npy" % metric))
+                pid_column += matrix.shape[1]
 
-            if diff_in_log:
-                return float(diff) / diff_in_log
-            return 0
+            write_records(pid_names, times, pid_matrix, os.path.join(self.output_dir, "%s.txt" % metric))
+            write_records(node_names, times, node_matrix, os.path.join(self.output_dir, "%s_node.txt" % metric))
 
-        max_timestamp = 0
 
-        resource_usage_fn = 'resource_usage.log'
-        for root, _, files in os.walk(self.input_dir):
-            if resource_usage_fn in files:
-                nodename = root.split('/')[-1]
-                self.all_nodes.add(nodename)
-
-                print("Parsing resource_usage file %s" % (os.path.join(nodename, "/", resource_usage_fn)),
-                      file=sys.stderr)
-
-                resource_file_path = os.path.join(root, resource_usage_fn)
-                if os.stat(resource_file_path).st_size == 0:
-                    print("Empty file, skipping", file=sys.stderr)
-                    continue
-
-                with open(resource_file_path, "r") as resource_file:
-                    # The first line of the resource file gives the sc_clk_tck and pagesize of the node
-                    line = resource_file.readline()
-                    metainfo = json.loads(line)
-                    sc_clk_tck = float(metainfo['sc_clk_tck'])
-                    pagesize = float(metainfo['pagesize'])
-                    start_timestamp = None
-
-                    for line in resource_file:
-                        parts = line.split()
-
-                        if start_timestamp is None:
-                            start_timestamp = float(parts[0])
-                        max_timestamp = max(max_timestamp, float(parts[0]))
-                        cur_time = float(parts[0]) - start_timestamp
-                        pid = nodename + "_" + parts[2][1:-1] + "_" + parts[1]
-
-                        if pid not in self.all_pids:
-                            self.all_pids.add(pid)
-
-                        utime = int(parts[PROCFS_UTIME])
-                        stime = int(parts[PROCFS_STIME])
-
-                        time_diff = calc_diff(cur_time, self.prev_times.get(pid, cur_time), utime,
-                                              self.prev_utimes.get(pid, utime)) / sc_clk_tck
-                        self.utimes.setdefault(cur_time, {})[pid] = time_diff
-                        time_diff = calc_diff(cur_time, self.prev_times.get(pid, cur_time), stime,
-                                              self.prev_stimes.get(pid, stime)) / sc_clk_tck
-                        self.stimes.setdefault(cur_time, {})[pid] = time_diff
-                        self.utimes[cur_time].setdefault(nodename, []).append(self.utimes[cur_time][pid])
-                        self.stimes[cur_time].setdefault(nodename, []).append(self.stimes[cur_time][pid])
-
-                        vsize = int(parts[PROCFS_VSIZE])
-                        self.vsizes.setdefault(cur_time, {})[pid] = vsize / 1048576.0
-                        self.vsizes[cur_time].setdefault(nodename, []).append(self.vsizes[cur_time][pid])
-
-                        num_threads = int(parts[PROCFS_NUM_THREADS])
-                        self.threads.setdefault(cur_time, {})[pid] = num_threads
-                        self.threads[cur_time].setdefault(nodename, []).append(self.threads[cur_time][pid])
-
-                        rss = int(parts[PROCFS_RSS])
-                        self.rsizes.setdefault(cur_time, {})[pid] = (rss * pagesize) / 1048576.0
-                        self.rsizes[cur_time].setdefault(nodename, []).append(self.rsizes[cur_time][pid])
-
-                        write_bytes = int(parts[PROCFS_WRITE_BYTES])
-                        read_bytes = int(parts[PROCFS_READ_BYTES])
-
-                        self.writebytes_sum.setdefault(cur_time, {})[pid] = write_bytes / 1024.0
-                        self.writebytes_sum[cur_time].setdefault(nodename, []).append(
-                            self.writebytes_sum[cur_time][pid])
-                        self.readbytes_sum.setdefault(cur_time, {})[pid] = read_bytes / 1024.0
-                        self.readbytes_sum[cur_time].setdefault(nodename, []).append(
-                            self.readbytes_sum[cur_time][pid])
-
-                        time_diff = calc_diff(cur_time, self.prev_times.get(pid, cur_time), read_bytes,
-                                              self.prev_readbytes.get(pid, read_bytes)) / 1024.0
-                        self.readbytes.setdefault(cur_time, {})[pid] = time_diff
-                        time_diff = calc_diff(cur_time, self.prev_times.get(pid, cur_time), write_bytes,
-                                              self.prev_writebytes.get(pid, write_bytes)) / 1024.0
-                        self.writebytes.setdefault(cur_time, {})[pid] = time_diff
-                        self.readbytes[cur_time].setdefault(nodename, []).append(self.readbytes[cur_time][pid])
-                        self.writebytes[cur_time].setdefault(nodename, []).append(self.writebytes[cur_time][pid])
-
-                        wchar = int(parts[PROCFS_WCHARS])
-                        rchar = int(parts[PROCFS_RCHARS])
-
-                        self.wchars_sum.setdefault(cur_time, {})[pid] = wchar / 1024.0
-                        self.wchars_sum[cur_time].setdefault(nodename, []).append(self.wchars_sum[cur_time][pid])
-                        self.rchars_sum.setdefault(cur_time, {})[pid] = rchar / 1024.0
-                        self.rchars_sum[cur_time].setdefault(nodename, []).append(self.rchars_sum[cur_time][pid])
-
-                        self.rchars.setdefault(cur_time, {})[pid] = calc_diff(cur_time,
-                                                                              self.prev_times.get(pid, cur_time),
-                                                                              rchar,
-                                                                              self.prev_rchar.get(pid, rchar)) / 1024.0
-                        self.wchars.setdefault(cur_time, {})[pid] = calc_diff(cur_time,
-                                                                              self.prev_times.get(pid, cur_time),
-                                                                              wchar,
-                                                                              self.prev_wchar.get(pid, wchar)) / 1024.0
-                        self.rchars[cur_time].setdefault(nodename, []).append(self.rchars[cur_time][pid])
-                        self.wchars[cur_time].setdefault(nodename, []).append(self.wchars[cur_time][pid])
-
-                        self.prev_utimes[pid] = utime
-                        self.prev_stimes[pid] = stime
-                        self.prev_rchar[pid] = rchar
-                        self.prev_wchar[pid] = wchar
-                        self.prev_readbytes[pid] = read_bytes
-                        self.prev_writebytes[pid] = write_bytes
-                        self.prev_times[pid] = cur_time
-
-        self.check_utime_sanity()
-
-        # Write all data away
-        pids_list = list(self.all_pids)
-        write_records(pids_list, self.utimes, os.path.join(self.output_dir, "utimes.txt"))
-        write_records(pids_list, self.stimes, os.path.join(self.output_dir, "stimes.txt"))
-        write_records(pids_list, self.wchars, os.path.join(self.output_dir, "wchars.txt"))
-        write_records(pids_list, self.rchars, os.path.join(self.output_dir, "rchars.txt"))
-        write_records(pids_list, self.wchars_sum, os.path.join(self.output_dir, "wchars_sum.txt"))
-        write_records(pids_list, self.rchars_sum, os.path.join(self.output_dir, "rchars_sum.txt"))
-        write_records(pids_list, self.writebytes, os.path.join(self.output_dir, "writebytes.txt"))
-        write_records(pids_list, self.readbytes, os.path.join(self.output_dir, "readbytes.txt"))
-        write_records(pids_list, self.writebytes_sum, os.path.join(self.output_dir, "writebytes_sum.txt"))
-        write_records(pids_list, self.readbytes_sum, os.path.join(self.output_dir, "readbytes_sum.txt"))
-        write_records(pids_list, self.vsizes, os.path.join(self.output_dir, "vsizes.txt"))
-        write_records(pids_list, self.rsizes, os.path.join(self.output_dir, "rsizes.txt"))
-        write_records(pids_list, self.threads, os.path.join(self.output_dir, "threads.txt"))
-
-        # calculate sum for all nodes
-        for dictionary in [self.utimes, self.stimes, self.wchars, self.rchars, self.wchars_sum, self.rchars_sum,
-                           self.vsizes, self.rsizes, self.writebytes, self.readbytes,
-                           self.writebytes_sum, self.readbytes_sum, self.threads]:
-            for cur_time, values in dictionary.items():
-                for node in self.all_nodes:
-                    if node in values:
-                        values[node] = sum(values[node])
-
-        # write mean for all nodes to separate files
-        nodes_list = list(self.all_nodes)
-        write_records(nodes_list, self.utimes, os.path.join(self.output_dir, "utimes_node.txt"))
-        write_records(nodes_list, self.stimes, os.path.join(self.output_dir, "stimes_node.txt"))
-        write_records(nodes_list, self.wchars, os.path.join(self.output_dir, "wchars_node.txt"))
-        write_records(nodes_list, self.rchars, os.path.join(self.output_dir, "rchars_node.txt"))
-        write_records(nodes_list, self.wchars_sum, os.path.join(self.output_dir, "wchars_sum_node.txt"))
-        write_records(nodes_list, self.rchars_sum, os.path.join(self.output_dir, "rchars_sum_node.txt"))
-        write_records(nodes_list, self.writebytes, os.path.join(self.output_dir, "writebytes_node.txt"))
-        write_records(nodes_list, self.readbytes, os.path.join(self.output_dir, "readbytes_node.txt"))
-        write_records(nodes_list, self.writebytes_sum, os.path.join(self.output_dir, "writebytes_sum_node.txt"))
-        write_records(nodes_list, self.readbytes_sum, os.path.join(self.output_dir, "readbytes_sum_node.txt"))
-        write_records(nodes_list, self.vsizes, os.path.join(self.output_dir, "vsizes_node.txt"))
-        write_records(nodes_list, self.rsizes, os.path.join(self.output_dir, "rsizes_node.txt"))
-        write_records(nodes_list, self.threads, os.path.join(self.output_dir, "threads_node.txt"))
-
-        with open(os.path.join(self.output_dir, "axis_stats.txt"), "w") as axis_stats_file:
-            axis_stats_file.write("XMIN=0\n")
-            axis_stats_file.write("XMAX=%d\n" % (max_timestamp - start_timestamp))
-            axis_stats_file.write("XSTART=%d\n" % start_timestamp)
+class ResourceUsageStatisticsParser(StatisticsParser):
+    """
+    Runs the resource usage parser as an aggregation step, so it can run together with the steps of other statistics
+    parsers. The statistics are written to the output directory and exported as text files.
+    """
 
+    @aggregation_step(inputs=("resource_usage.log", "resource_usage.bin"),
+                      outputs=(COLUMNAR_DIR, "axis_stats.txt") + tuple("%s%s.txt" % (metric, suffix)
+                                                                      for metric in RESOURCE_METRICS
+                                                                      for suffix in ("", "_node")))
+    def parse_resource_usage(self):
+        resource_parser = ResourceUsageParser(self.node_directory, ".", self.step_workers)
+        resource_parser.parse_resource_files()
+        resource_parser.export_text()
 
-if __name__ == "__main__":
-    if len(sys.argv) < 3:
-        print("Usage: %s <input-directory> <output-directory> [<experiment start timestamp>]" % (sys.argv[0]),
-              file=sys.stderr)
-        print("Got:", sys.argv, file=sys.stderr)
+    def get_input_size(self, step):
+        # The resource usage files are written to the node directories, which are not in the output catalog
+        return sum(os.path.getsize(resource_file_path) for _, resource_file_path
+                   in ResourceUsageParser(self.node_directory, ".").find_resource_files())
 
-        sys.exit(1)
 
-    parser = ResourceUsageParser(sys.argv[1], sys.argv[2])
-    parser.parse_resource_files()
+if __name__ == "__main__":
+    parser = ArgumentParser(description="Parse the resource usage files written by process_guard.py")
+    parser.add_argument("input_dir", help="The directory to search for resource usage files")
+    parser.add_argument("output_dir", help="The directory to write the statistics to")
+    parser.add_argument("start_timestamp", nargs="?", help="The experiment start timestamp (unused)")
+    parser.add_argument("--text", action="store_true", default=False,
+                        help="Also export the statistics as space-separated text files")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="The number of parser processes (defaults to the number of CPUs)")
+    args = parser.parse_args(sys.argv[1:])
+
+    resource_parser = ResourceUsageParser(args.input_dir, args.output_dir, args.workers)
+    resource_parser.parse_resource_files()
+    if args.text:
+        resource_parser.export_text()
@@ -0,0 +1,174 @@
+"""
+A shared pool of HTTP connections, for modules that talk to (JSON-RPC) endpoints, like the API of a blockchain node.
+
+All modules of an instance share one pool, with keep-alive connections to every endpoint. The number of concurrent
+requests to an endpoint is bounded. JSON-RPC calls to the same endpoint can be sent together in a batch, by setting
+RPC_BATCH_SIZE to the maximum number of calls in a batch. Calls wait at most RPC_BATCH_DELAY seconds for a batch to
+fill up.
+"""
+import logging
+import os
+from asyncio import Semaphore, get_event_loop
+from itertools import count
+from urllib.parse import urlsplit
+
+import aiohttp
+
+
+class RPCError(Exception):
+
+    def __init__(self, error):
+        super(RPCError, self).__init__(error.get("message", error) if isinstance(error, dict) else error)
+        self.error = error
+
+
+class RPCClientPool(object):
+
+    def __init__(self, max_concurrency=64, batch_size=1, batch_delay=0.005, timeout=30):
+        """
+        :param max_concurrency: the maximum number of concurrent requests to a single endpoint.
+        :param batch_size: the maximum number of JSON-RPC calls that are sent together.
+        :param batch_delay: the number of seconds that a call waits for other calls to batch with.
+        :param timeout: the number of seconds after which a request fails.
+        """
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.timeout = timeout
+        self.session = None
+        self.endpoint_slots = {}
+        self.pending_batches = {}
+        self.call_ids = count()
+
+    def get_session(self):
+        if not self.session or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=0, limit_per_host=self.max_concurrency)
+            self.session = aiohttp.ClientSession(connector=connector,
+                                                 timeout=aiohttp.ClientTimeout(total=self.timeout))
+        return self.session
+
+    def get_endpoint_slots(self, url):
+        parts = urlsplit(url)
+        endpoint = (parts.scheme, parts.netloc)
+        if endpoint not in self.endpoint_slots:
+            self.endpoint_slots[endpoint] = Semaphore(self.max_concurrency)
+        return self.endpoint_slots[endpoint]
+
+    async def request(self, method, url, **kwargs):
+        """
+        Perform a HTTP request and return the status code and the body of the response, as text. The keyword
+        arguments are passed on to aiohttp.
+        """
+        async with self.get_endpoint_slots(url):
+            async with self.get_session().request(method, url, **kwargs) as response:
+                return response.status, await response.text()
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post_json(self, url, payload, **kwargs):
+        """
+        Post a JSON payload and return the decoded JSON response.
+        """
+        async with self.get_endpoint_slots(url):
+            async with self.get_session().post(url, json=payload, **kwargs) as response:
+                return await response.json(content_type=None)
+
+    async def call(self, url, method, params=None):
+        """
+        Perform a JSON-RPC call, and return its result. Raises a RPCError if the call fails.
+        """
+        payload = {"jsonrpc": "2.0", "id": next(self.call_ids), "method": method, "params": params or []}
+        if self.batch_size <= 1:
+            return self.get_result(await self.post_json(url, payload))
+
+        future = get_event_loop().create_future()
+        batch = self.pending_batches.setdefault(url, [])
+        batch.append((payload, future))
+        if len(batch) >= self.batch_size:
+            self.send_batch(url)
+        elif len(batch) == 1:
+            get_event_loop().call_later(self.batch_delay, self.send_batch, url, batch)
+        return await future
+
+    async def call_batch(self, url, method, params_list):
+        """
+        Perform the same JSON-RPC call with each of the given parameters, in a single request, and return the results
+        in order. Raises a RPCError if any of the calls fails.
+        """
+        payloads = [{"jsonrpc": "2.0", "id": next(self.call_ids), "method": method, "params": params}
+                    for params in params_list]
+        if not payloads:
+            return []
+        responses = await self.post_json(url, payloads)
+        if isinstance(responses, dict):
+            raise RPCError(responses.get("error", responses))
+        responses = {response.get("id"): response for response in responses}
+        return [self.get_result(responses.get(payload["id"], {"error": "No response to call %d" % payload["id"]}))
+                for payload in payloads]
+
+    def send_batch(self, url, batch=None):
+        if batch is not None and self.pending_batches.get(url) is not batch:
+            # This batch has been sent already, because it was full
+            return
+        batch = self.pending_batches.pop(url)
+        get_event_loop().create_task(self.post_batch(url, batch))
+
+    async def post_batch(self, url, batch):
+        try:
+            responses = await self.post_json(url, [payload for payload, _ in batch])
+            if isinstance(responses, dict):
+                # The endpoint does not support batches and returned a single error
+                raise RPCError(responses.get("error", responses))
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        responses = {response.get("id"): response for response in responses}
+        for payload, future in batch:
+            if future.done():
+                continue
+            if payload["id"] in responses:
+                try:
+                    future.set_result(self.get_result(responses[payload["id"]]))
+                except RPCError as e:
+                    future.set_exception(e)
+            else:
+                future.set_exception(RPCError("No response to call %d" % payload["id"]))
+
+    @staticmethod
+    def get_result(response):
+        if "error" in response and response["error"] is not None:
+            raise RPCError(response["error"])
+        return response.get("result")
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+
+_rpc_client_pool = None
+
+
+def get_rpc_client_pool():
+    """
+    Return the pool that is shared by all modules of this instance.
+    """
+    global _rpc_client_pool
+    if _rpc_client_pool is None:
+        _rpc_client_pool = RPCClientPool(max_concurrency=int(os.environ.get("RPC_MAX_CONCURRENCY", "64")),
+                                         batch_size=int(os.environ.get("RPC_BATCH_SIZE", "1")),
+                                         batch_delay=float(os.environ.get("RPC_BATCH_DELAY", "0.005")))
+    return _rpc_client_pool
+
+
+async def close_rpc_client_pool():
+    """
+    Close the connections of the shared pool, if any module has used it.
+    """
+    if _rpc_client_pool is not None:
+        await _rpc_client_pool.close()
@@ -9,16 +9,142 @@ Usage example:
     s.register(t.test_method)
     s.run()
 """
+import hashlib
+import json
 import logging
+import random
 import shlex
-from asyncio import ensure_future, iscoroutine
-from functools import partial
-from os import environ, path
+from asyncio import ensure_future, gather, iscoroutine, sleep
+from bisect import bisect_left, bisect_right
+from functools import lru_cache, partial
+from heapq import heapify, heappop
+from math import sqrt
+from os import environ, getpid, path, replace, stat
 from re import compile as re_compile
 from threading import RLock
 from time import time
 
-from gumby.util import run_task
+
+class PeerSpec(object):
+    """
+    A compiled peer specification. The peer numbers it lists are kept as sorted, non-overlapping intervals, so
+    matching a peer number takes a binary search, regardless of how many peers the specification covers.
+    """
+    __slots__ = ("negated", "starts", "ends")
+
+    def __init__(self, intervals, negated=False):
+        self.negated = negated
+        self.starts = []
+        self.ends = []
+        for low, high in sorted(intervals):
+            if self.ends and low <= self.ends[-1] + 1:
+                self.ends[-1] = max(self.ends[-1], high)
+            else:
+                self.starts.append(low)
+                self.ends.append(high)
+
+    def matches(self, peernumber):
+        if not self.starts:
+            # A specification without peers matches every peer
+            return True
+        index = bisect_right(self.starts, peernumber) - 1
+        listed = index >= 0 and peernumber <= self.ends[index]
+        return listed != self.negated
+
+
+@lru_cache(maxsize=None)
+def compile_peerspec(peerspec):
+    """
+    Compiles a peer specification (the part between the braces) into a PeerSpec. The compiled specifications are
+    cached, as the same specification is usually repeated on many scenario lines.
+    """
+    negated = peerspec.startswith("!")
+    if negated:
+        peerspec = peerspec[1:]
+
+    intervals = []
+    for peer in peerspec.split(","):
+        peer = peer.strip()
+        if peer:
+            # parse the peer number (or peer number pair)
+            if "-" in peer:
+                low, high = peer.split("-")
+                if int(low) <= int(high):
+                    intervals.append((int(low), int(high)))
+            else:
+                intervals.append((int(peer), int(peer)))
+
+    return PeerSpec(intervals, negated)
+
+
+class Pacing(object):
+    """
+    The schedule of a repeated scenario line. The callable is called between begin and end (in seconds since the
+    start of the experiment), at a rate that changes linearly from start_rate to end_rate. With poisson, the times
+    between calls are exponentially distributed, otherwise the calls are evenly spaced.
+    """
+
+    def __init__(self, begin, end, start_rate, end_rate, poisson=False):
+        self.begin = begin
+        self.end = end
+        self.start_rate = start_rate
+        self.end_rate = end_rate
+        self.poisson = poisson
+
+    def call_times(self):
+        """
+        Yields the times of the calls, relative to begin. The n-th call happens when the expected number of calls
+        since begin, the integral of the rate, reaches n. Every time follows from the schedule alone, so the calls do
+        not drift when some of them happen late.
+        """
+        if self.start_rate <= 0 and self.end_rate <= 0:
+            return
+        duration = self.end - self.begin
+        # The expected number of calls after t seconds is a * t^2 + b * t
+        a = (self.end_rate - self.start_rate) / (2 * duration)
+        b = self.start_rate
+        calls = random.expovariate(1) if self.poisson else 0.0
+        while True:
+            discriminant = b * b + 4 * a * calls
+            if discriminant < 0 or (calls and b + sqrt(discriminant) <= 0):
+                return
+            offset = 2 * calls / (b + sqrt(discriminant)) if calls else 0.0
+            if offset >= duration:
+                return
+            yield offset
+            calls += random.expovariate(1) if self.poisson else 1
+
+
+class PacedLineStats(object):
+    """
+    A summary of the calls of a repeated scenario line: the number of calls, a histogram of their delays, and the
+    total and maximum delay and duration. Repeated lines can be called many times per second, so their calls are not
+    recorded one by one in the dispatch log.
+    """
+    __slots__ = ("calls", "delay_histogram", "total_delay", "max_delay", "finished", "total_duration", "max_duration")
+
+    # Upper bounds (in seconds) of the buckets of the delay histogram
+    DELAY_BUCKETS = (0.001, 0.01, 0.1, 1.0, 10.0)
+
+    def __init__(self):
+        self.calls = 0
+        self.delay_histogram = [0] * (len(self.DELAY_BUCKETS) + 1)
+        self.total_delay = 0.0
+        self.max_delay = 0.0
+        self.finished = 0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+
+    def add_call(self, delay):
+        self.calls += 1
+        self.delay_histogram[bisect_left(self.DELAY_BUCKETS, delay)] += 1
+        self.total_delay += delay
+        self.max_delay = max(self.max_delay, delay)
+
+    def add_duration(self, duration):
+        self.finished += 1
+        self.total_duration += duration
+        self.max_duration = max(self.max_duration, duration)
 
 
 class ScenarioParser(object):
@@ -26,10 +152,17 @@ class ScenarioParser(object):
     Scenario line format:
         TIMESPEC CALLABLE [ARGS] [PEERSPEC]
 
-        TIMESPEC = [@][H:]M:S[-[H:]M:S]
+        TIMESPEC = [@][H:]M:S[-[H:]M:S] [PACING]
 
             Use @ to schedule events based on the synchronized experiment starting timestamp.
 
+        PACING = every SECONDS [poisson] | rate RATE[-RATE][/s] [poisson]
+
+            Only for a time range: call the callable repeatedly from the start until the end of the range, every
+            SECONDS seconds or RATE times per second. With two rates, the rate changes linearly over the range.
+            With poisson, the calls are spread as a Poisson process with the same average rate.
+            Example: "@0:30-0:90 every 0.05 request_random_signature {2-500}".
+
         CALLABLE = string
 
             Name of a callable previously registered using register()
@@ -49,6 +182,12 @@ class ScenarioParser(object):
         Notes:
              - Have in mind that in case of having several lines with the same
                time stamp, they will be executed in order.
+
+    Reading a scenario resolves its includes and splits off the peer specifications. If SCENARIO_CACHE_DIR is set,
+    the result is cached there as JSON, so the other instances of the experiment can skip this step. Use a directory
+    of the experiment, like its output directory, that other users cannot write to. das_node_run_job.sh uses a
+    directory next to the output directory of each node by default. A cached scenario is only used while its files
+    are unchanged and its includes still resolve to the same files.
     """
     _re_substitution = re_compile(r"(\$\w+)")
     _re_preprocessor_dir = re_compile(r"^&(\w+)\s+")
@@ -60,9 +199,7 @@ class ScenarioParser(object):
         self.file_lock = RLock()
         self.line_buffer = []
         self.user_defined_vars = {}
-        self.preprocessor_callbacks = {
-            "include": self._preproc_include_file
-        }
+        self.preprocessor_callbacks = {}
         self._peernumber = None
 
     def add_scenario(self, filename):
@@ -70,25 +207,69 @@ class ScenarioParser(object):
         Read the scenario into this scenario parser.
         """
         with self.file_lock:
-            with open(filename, "r") as scenario_file:
-                lines = scenario_file.readlines()
-
-            line_number = 1
-            for line in lines:
-                if line.startswith("&"):
-                    preproc_match = self._re_preprocessor_dir.match(line)
-                    if preproc_match and preproc_match.group(1) in self.preprocessor_callbacks:
-                        self.preprocessor_callbacks[preproc_match.group(1)](filename, line_number,
-                                                                            line[preproc_match.end():].strip())
+            cache_file = self._get_cache_file(filename)
+            entries = self._load_cached_scenario(cache_file) if cache_file else None
+            if entries is None:
+                entries, dependencies, includes = [], {}, []
+                self._read_scenario(filename, entries, dependencies, includes)
+                if cache_file:
+                    self._store_cached_scenario(cache_file, entries, dependencies, includes)
+
+            for entry in entries:
+                if entry[0] == "line":
+                    self.line_buffer.append(entry[1:])
+                else:
+                    _, directive, filename, line_number, line = entry
+                    if directive in self.preprocessor_callbacks:
+                        self.preprocessor_callbacks[directive](filename, line_number, line)
                     else:
                         self._logger.error("Error reading scenario %s:%d, preprocessor callback %s is unknown.",
-                                           filename, line_number, line)
-                elif not line.startswith('#'):
-                    line = line.strip()
-                    self.line_buffer.append((filename, line_number, line))
-                line_number += 1
+                                           filename, line_number, directive)
+
+    def _read_scenario(self, filename, entries, dependencies, includes):
+        """
+        Read a scenario file and the files it includes into a list of entries. An entry is either a
+        ("line", FILENAME, LINENO, LINE, PEERSPEC) tuple or a ("directive", NAME, FILENAME, LINENO, ARGS) tuple for
+        preprocessor directives other than include. The files that have been read are added to dependencies, and the
+        (FILENAME, INCLUDE, RESOLVED FILENAME) of every include to includes.
+        """
+        with open(filename, "r") as scenario_file:
+            lines = scenario_file.readlines()
+        dependencies[path.abspath(filename)] = self._get_file_stamp(filename)
+
+        line_number = 1
+        for line in lines:
+            if line.startswith("&"):
+                preproc_match = self._re_preprocessor_dir.match(line)
+                if preproc_match and preproc_match.group(1) == "include":
+                    include_line = line[preproc_match.end():].strip()
+                    include_name = self._find_include_file(filename, line_number, include_line)
+                    includes.append((path.abspath(filename), include_line,
+                                     path.abspath(include_name) if include_name else None))
+                    if include_name:
+                        self._read_scenario(include_name, entries, dependencies, includes)
+                elif preproc_match:
+                    entries.append(("directive", preproc_match.group(1), filename, line_number,
+                                    line[preproc_match.end():].strip()))
+                else:
+                    self._logger.error("Error reading scenario %s:%d, preprocessor callback %s is unknown.",
+                                       filename, line_number, line)
+            elif not line.startswith('#'):
+                line = line.strip()
+                if line.endswith('}'):
+                    start = line.rfind('{') + 1
+                    entries.append(("line", filename, line_number, line[:start - 1], line[start:-1]))
+                else:
+                    entries.append(("line", filename, line_number, line, ''))
+            line_number += 1
 
-    def _preproc_include_file(self, filename, line_number, line):
+    def _find_include_file(self, filename, line_number, line):
+        include_name = self._resolve_include_file(filename, line)
+        if not include_name:
+            self._logger.error("Error reading scenario %s:%d, include %s does not exist.", filename, line_number, line)
+        return include_name
+
+    def _resolve_include_file(self, filename, line):
         exline = self._expand_line(line)
         if not path.isabs(line):
             include_name = path.join(path.dirname(filename), exline)
@@ -99,26 +280,60 @@ class ScenarioParser(object):
         if not path.exists(include_name):
             include_name = path.join(environ["EXPERIMENT_DIR"], exline)
         if path.exists(include_name):
-            self.add_scenario(include_name)
-        else:
-            self._logger.error("Error reading scenario %s:%d, include %s does not exist.", filename, line_number, line)
+            return include_name
+        return None
+
+    @staticmethod
+    def _get_file_stamp(filename):
+        file_stat = stat(filename)
+        return file_stat.st_mtime_ns, file_stat.st_size
+
+    def _get_cache_file(self, filename):
+        cache_dir = environ.get("SCENARIO_CACHE_DIR")
+        if not cache_dir:
+            return None
+        key = hashlib.sha1(path.abspath(filename).encode()).hexdigest()
+        return path.join(cache_dir, "gumby_scenario_%s.cache" % key)
+
+    def _load_cached_scenario(self, cache_file):
+        """
+        Returns the cached entries of a scenario, or None if there are none, if any of its files has changed, or if
+        any of its includes now resolves to another file.
+        """
+        try:
+            with open(cache_file, "r") as cache:
+                dependencies, includes, entries = json.load(cache)
+            if all(self._get_file_stamp(filename) == tuple(stamp) for filename, stamp in dependencies.items()) \
+                    and all(self._get_resolved_include(filename, line) == resolved_name
+                            for filename, line, resolved_name in includes):
+                return [tuple(entry) for entry in entries]
+        except (OSError, ValueError, TypeError, AttributeError):
+            pass
+        return None
+
+    def _get_resolved_include(self, filename, line):
+        include_name = self._resolve_include_file(filename, line)
+        return path.abspath(include_name) if include_name else None
+
+    def _store_cached_scenario(self, cache_file, entries, dependencies, includes):
+        # Write to a temporary file first, the other instances might be reading the cache at the same time
+        temp_file = "%s.%d" % (cache_file, getpid())
+        try:
+            with open(temp_file, "w") as cache:
+                json.dump((dependencies, includes, entries), cache)
+            replace(temp_file, cache_file)
+        except OSError:
+            self._logger.warning("Could not write the scenario cache %s", cache_file, exc_info=True)
 
     def _parse_scenario(self):
         """
         Returns a list of commands that will be executed.
 
-        A command is a (TIMESTAMP, FILENAME, LINENO, CALLABLE, ARGS, KWARGS) tuple. CALLABLE is
+        A command is a (TIMESTAMP, FILENAME, LINENO, CALLABLE, ARGS, KWARGS, PACING) tuple. CALLABLE is
         the name of a function, method, etc. registered with this scenario using
-        the register() method.
+        the register() method. PACING is a Pacing for repeated lines, and None otherwise.
         """
-        for filename, line_number, line in self.line_buffer:
-            if line.endswith('}'):
-                start = line.rfind('{') + 1
-                peerspec = line[start:-1]
-                line = line[:start - 1]
-            else:
-                peerspec = ''
-
+        for filename, line_number, line, peerspec in self.line_buffer:
             cmds = self._parse_scenario_line(filename, line_number, line, peerspec)
             if cmds:
                 for cmd in cmds:
@@ -166,17 +381,19 @@ class ScenarioParser(object):
                     timespec, callable = parts
                     args = ''
 
+                pacing = None
                 if len(timespec) > 1 and timespec[0] == '@' and timespec[1] == '!':
                     begin = -1
                 else:
                     if timespec[0] == '@':
                         timespec = timespec[1:]
-                    timespec = timespec.split(':')
-                    begin = float(timespec[-1])
-                    if len(timespec) > 1:
-                        begin += int(timespec[-2]) * 60
-                    if len(timespec) > 2:
-                        begin += int(timespec[-3]) * 3600
+                    if '-' in timespec:
+                        begin_spec, end_spec = timespec.split('-')
+                        begin = self._parse_timestamp(begin_spec)
+                        pacing, callable, args = self._parse_pacing(begin, self._parse_timestamp(end_spec),
+                                                                    callable, args)
+                    else:
+                        begin = self._parse_timestamp(timespec)
 
                 commands = []
 
@@ -185,7 +402,7 @@ class ScenarioParser(object):
                     raise Exception()
 
                 unnamed_args, named_args = self._parse_arguments(args)
-                commands = [(begin, filename, line_number, callable, unnamed_args, named_args)]
+                commands = [(begin, filename, line_number, callable, unnamed_args, named_args, pacing)]
 
                 return commands
 
@@ -196,37 +413,50 @@ class ScenarioParser(object):
         # line not for this peer or a parse error occurred
         return None
 
-    def _parse_peerspec(self, peerspec):
+    @staticmethod
+    def _parse_timestamp(timespec):
+        timespec = timespec.split(':')
+        timestamp = float(timespec[-1])
+        if len(timespec) > 1:
+            timestamp += int(timespec[-2]) * 60
+        if len(timespec) > 2:
+            timestamp += int(timespec[-3]) * 3600
+        return timestamp
+
+    def _parse_pacing(self, begin, end, directive, args):
+        """
+        Parses the pacing of a line with a time range. Returns the Pacing, and the callable and arguments that follow
+        the pacing.
         """
-        Checks if current peernumber matches a peer specification.
+        parts = args.split(' ')
+        if directive == 'every':
+            start_rate = end_rate = 1 / float(parts.pop(0))
+        elif directive == 'rate':
+            rates = parts.pop(0)
+            if rates.endswith('/s'):
+                rates = rates[:-2]
+            start_rate, _, end_rate = rates.partition('-')
+            start_rate = float(start_rate)
+            end_rate = float(end_rate) if end_rate else start_rate
+        else:
+            raise ValueError("A time range should be followed by every or rate, not %s" % directive)
+
+        poisson = parts[0] == 'poisson'
+        if poisson:
+            parts.pop(0)
+        if end <= begin or start_rate < 0 or end_rate < 0 or not parts[0]:
+            raise ValueError("Invalid pacing for %s" % directive)
+
+        return Pacing(begin, end, start_rate, end_rate, poisson), parts[0], ' '.join(parts[1:])
 
-        A peer specification if formatted as:
+    def _parse_peerspec(self, peerspec):
+        """
+        Returns the compiled PeerSpec for a peer specification, formatted as:
             [{PEERNR1 [, PEERNR2, ...] [, PEERNR3-PEERNR6, ...]}]
 
         Note: An empty peer specification matches everything.
         """
-        # get individual peers, if any, for a peer spec
-        yes_peers = set()
-        no_peers = set()
-
-        if peerspec:
-            if peerspec[0] == "!":
-                peers = no_peers
-                peerspec = peerspec[1:]
-            else:
-                peers = yes_peers
-
-            for peer in peerspec.split(","):
-                peer = peer.strip()
-                if peer:
-                    # parse the peer number (or peer number pair)
-                    if "-" in peer:
-                        low, high = peer.split("-")
-                        peers.update(range(int(low), int(high) + 1))
-                    else:
-                        peers.add(int(peer))
-
-        return yes_peers, no_peers
+        return compile_peerspec(peerspec)
 
     def _parse_for_this_peer(self, peerspec):
         raise NotImplementedError('override this method please')
@@ -254,12 +484,24 @@ class ScenarioRunner(ScenarioParser):
     Users should register callables using register() before calling run(). All
     scenario events (lines) using unregistered callable names will be silently
     ignored. The callables will be executed on the event loop.
+
+    The scenario is compiled into a single timeline (a heap of events) when run() is called. This timeline is
+    processed by one dispatcher coroutine, so the number of pending timers does not grow with the number of scenario
+    lines. Lines with the same timestamp are fired in scenario order during the same loop iteration. Repeated lines
+    are called by one pacing coroutine per line, which is started when the line is due.
     """
 
     def __init__(self, expstartstamp=None):
         super(ScenarioRunner, self).__init__()
         self._callables = {}
         self.exp_start_time = expstartstamp
+        self.timeline = []
+        self.dispatcher = None
+        self.pacers = []
+        # [filename, line_number, callable, scheduled time, actual time, duration] for every fired event
+        self.dispatch_log = []
+        # The PacedLineStats of every repeated line, by (filename, line_number, callable)
+        self.pacing_stats = {}
 
     def set_peernumber(self, peernumber):
         self._peernumber = peernumber
@@ -279,31 +521,146 @@ class ScenarioRunner(ScenarioParser):
 
     def run(self):
         """
-        Schedules calls for each scenario line.
+        Compiles the scenario into a timeline and starts the dispatcher. Lines with the @! timestamp are called
+        immediately while compiling, so variables they set are visible to the lines that follow them.
         """
         self._logger.info("Running scenario")
 
         if self.exp_start_time is None:
             self.exp_start_time = time()
 
-        for tstmp, filename, line_number, clb, args, kwargs in self._parse_scenario():
+        self.timeline = self.compile_timeline()
+        self._logger.info("Compiled scenario timeline with %d events", len(self.timeline))
+        if self.timeline:
+            self.dispatcher = ensure_future(self.dispatch_timeline())
+
+    def compile_timeline(self):
+        """
+        Parses the scenario into a heap of (TIMESTAMP, SEQUENCE, FILENAME, LINENO, CALLABLE, ARGS, KWARGS, PACING)
+        events. The sequence number preserves the scenario order of events with the same timestamp.
+        """
+        timeline = []
+        for tstmp, filename, line_number, clb, args, kwargs, pacing in self._parse_scenario():
             if clb not in self._callables:
                 self._logger.error("Error running scenario %s:%d, undefined callback %s.", filename, line_number, clb)
                 continue
             if tstmp >= 0:
-                tstmp = tstmp + self.exp_start_time
-                delay = tstmp - time()
-                self._logger.info("Register call %s %s:%d %s %s %s", tstmp, filename, line_number, clb,
-                                  repr(args), repr(kwargs))
-                for target in self._callables[clb]:
-                    run_task(partial(target, **kwargs), *args, delay=max(0, delay))
+                timeline.append((tstmp + self.exp_start_time, len(timeline), filename, line_number, clb, args,
+                                 kwargs, pacing))
             else:
                 self._logger.info("Calling immediately %s:%d %s %s %s", filename, line_number, clb,
                                   repr(args), repr(kwargs))
-                for target in self._callables[clb]:
-                    coro = target(*args, **kwargs)
-                    if iscoroutine(coro):
-                        ensure_future(coro)
+                self._call(clb, args, kwargs)
+
+        heapify(timeline)
+        return timeline
+
+    async def dispatch_timeline(self):
+        """
+        Fires the events in the timeline when they are due. All events that are due are fired in one go.
+        """
+        while self.timeline:
+            delay = self.timeline[0][0] - time()
+            if delay > 0:
+                await sleep(delay)
+
+            now = time()
+            while self.timeline and self.timeline[0][0] <= now:
+                tstmp, _, filename, line_number, clb, args, kwargs, pacing = heappop(self.timeline)
+                if pacing:
+                    self._logger.info("Repeating %s:%d %s %s %s until %s", filename, line_number, clb, repr(args),
+                                      repr(kwargs), pacing.end + self.exp_start_time)
+                    self.pacers.append(ensure_future(self.pace(filename, line_number, clb, args, kwargs, pacing)))
+                    continue
+                self._logger.info("Calling %s %s:%d %s %s %s (%.3f s late)", tstmp, filename, line_number, clb,
+                                  repr(args), repr(kwargs), now - tstmp)
+                self._dispatch(filename, line_number, clb, args, kwargs, tstmp, now)
+
+    async def pace(self, filename, line_number, clb, args, kwargs, pacing):
+        """
+        Calls a repeated scenario line according to its pacing. Calls that are due are made in one go, so calls that
+        are late because the event loop was busy are caught up with.
+        """
+        start_time = self.exp_start_time + pacing.begin
+        stats = self.pacing_stats.setdefault((filename, line_number, clb), PacedLineStats())
+        call_times = pacing.call_times()
+        next_time = next(call_times, None)
+        calls = 0
+        while next_time is not None:
+            delay = start_time + next_time - time()
+            if delay > 0:
+                await sleep(delay)
+
+            now = time()
+            while next_time is not None and start_time + next_time <= now:
+                self._dispatch(filename, line_number, clb, args, kwargs, start_time + next_time, now, stats)
+                calls += 1
+                next_time = next(call_times, None)
+
+        self._logger.info("Finished repeating %s:%d %s after %d calls", filename, line_number, clb, calls)
+
+    def _dispatch(self, filename, line_number, clb, args, kwargs, scheduled, actual, stats=None):
+        """
+        Calls a scenario line and records it in the dispatch log, or in the stats of a repeated line. The duration of
+        a line includes the coroutines it started, so it is filled in once they are done.
+        """
+        if stats is None:
+            entry = [filename, line_number, clb, scheduled, actual, None]
+            self.dispatch_log.append(entry)
+            set_duration = partial(entry.__setitem__, 5)
+        else:
+            stats.add_call(actual - scheduled)
+            set_duration = stats.add_duration
+        futures = self._call(clb, args, kwargs)
+        if futures:
+            gather(*futures, return_exceptions=True).add_done_callback(lambda _: set_duration(time() - actual))
+        else:
+            set_duration(time() - actual)
+
+    def _call(self, clb, args, kwargs):
+        """
+        Calls all targets registered under a name, and returns the futures of the coroutines they returned.
+        """
+        futures = []
+        for target in self._callables[clb]:
+            try:
+                coro = target(*args, **kwargs)
+            except Exception:
+                self._logger.exception("Error while calling %s", clb)
+                continue
+            if iscoroutine(coro):
+                futures.append(ensure_future(coro))
+        return futures
+
+    def write_dispatch_log(self, filename):
+        """
+        Writes the scheduled and actual fire times, and the durations, of all dispatched events to a CSV file.
+        The duration of events that are still running is left empty.
+        """
+        with open(filename, "w") as dispatch_file:
+            dispatch_file.write("file,line,callable,scheduled,actual,delay,duration\n")
+            for scenario_file, line_number, clb, scheduled, actual, duration in self.dispatch_log:
+                dispatch_file.write("%s,%d,%s,%f,%f,%f,%s\n" % (path.basename(scenario_file), line_number, clb,
+                                                                 scheduled - self.exp_start_time,
+                                                                 actual - self.exp_start_time, actual - scheduled,
+                                                                 "" if duration is None else "%f" % duration))
+
+    def write_pacing_log(self, filename):
+        """
+        Writes the number of calls of every repeated line, with the histogram and the mean and maximum of their
+        delays, and the mean and maximum of their durations, to a CSV file.
+        """
+        buckets = PacedLineStats.DELAY_BUCKETS
+        bounds = ["le_%s" % bound for bound in buckets] + ["gt_%s" % buckets[-1]]
+        with open(filename, "w") as pacing_file:
+            pacing_file.write("file,line,callable,calls,mean_delay,max_delay,finished,mean_duration,max_duration,%s\n"
+                              % ",".join("delay_%s" % bound for bound in bounds))
+            for (scenario_file, line_number, clb), stats in self.pacing_stats.items():
+                pacing_file.write("%s,%d,%s,%d,%f,%f,%d,%f,%f,%s\n" % (
+                    path.basename(scenario_file), line_number, clb, stats.calls,
+                    stats.total_delay / stats.calls if stats.calls else 0, stats.max_delay, stats.finished,
+                    stats.total_duration / stats.finished if stats.finished else 0, stats.max_duration,
+                    ",".join(str(count) for count in stats.delay_histogram)))
 
     def _parse_for_this_peer(self, peerspec):
         # TODO: an extra check should be applied here to see if the peerspec contains variables, and if it does, they
@@ -311,10 +668,5 @@ class ScenarioRunner(ScenarioParser):
         #       variable. In case a variable is used, but it does not exist, then it should fail later on in
         #       _parse_scenario_line
         if peerspec and '$' not in peerspec:
-            yes_peers, no_peers = self._parse_peerspec(peerspec)
-            return (
-                not (yes_peers or no_peers) or
-                (yes_peers and self._peernumber in yes_peers) or
-                (no_peers and not self._peernumber in no_peers)
-            )
+            return self._parse_peerspec(peerspec).matches(self._peernumber)
         return True
@@ -1,6 +1,348 @@
+import csv
 import fnmatch
+import json
+import logging
 import os
 import re
+import shutil
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import numpy as np
+
+# The percentiles reported by the LoopMonitorStatisticsParser
+PERCENTILES = (50, 90, 99, 99.9)
+
+# The names of peer directories
+PEER_PATTERN = re.compile('[0-9]+')
+
+
+def aggregation_step(inputs=(), outputs=(), requires=()):
+    """
+    This decorator marks the methods of a statistics parser that aggregate the output of the peers. Steps only
+    communicate through files, so steps that do not require each other can run in parallel, in separate processes.
+
+    @aggregation_step(inputs=("bandwidth.txt",), outputs=("total_bandwidth.log",))
+    def aggregate_bandwidth(self):
+        ...
+
+    :param inputs: the patterns of the peer files that the step reads.
+    :param outputs: the files that the step writes.
+    :param requires: the names of the steps of the same parser that should be completed before this step starts.
+    """
+    def aggregation_step_wrapper(f):
+        f.aggregation_step = {"inputs": tuple(inputs), "outputs": tuple(outputs), "requires": tuple(requires)}
+        return f
+    return aggregation_step_wrapper
+
+
+def run_step(parser, name, working_directory, step_workers=1):
+    """
+    Run a step of a parser, in a worker process, and return how long it took.
+
+    :param step_workers: the number of worker processes that the step may start itself.
+    """
+    os.chdir(working_directory)
+    parser.step_workers = step_workers
+    start_time = time.time()
+    getattr(parser, name)()
+    return time.time() - start_time
+
+
+def divide_workers(free_workers, input_sizes):
+    """
+    Divide the free workers over steps with the given input sizes. Every step gets at least one worker, and the rest
+    are divided in proportion to the input sizes, so a step with little input does not hold on to workers.
+    """
+    shares = [1] * len(input_sizes)
+    extra_workers = free_workers - len(input_sizes)
+    total_size = sum(input_sizes)
+    if extra_workers <= 0 or not total_size:
+        return shares
+    for index, input_size in enumerate(input_sizes):
+        shares[index] += extra_workers * input_size // total_size
+    # Give the workers that are left after rounding down to the largest step
+    largest = max(range(len(input_sizes)), key=lambda index: input_sizes[index])
+    shares[largest] += free_workers - sum(shares)
+    return shares
+
+
+def run_parsers(parsers, workers=None):
+    """
+    Run the aggregation steps of the given parsers in a pool of worker processes. A step starts as soon as the steps
+    it requires are completed. Of the steps that can start, the ones with the most input files go first.
+
+    :param workers: the number of worker processes, all cores if None. With a single worker, the steps run in this
+    process. When steps start, the workers that are not used by the running steps are divided over them by the size
+    of their input, which is the number of workers that a step may use itself.
+    """
+    logger = logging.getLogger("StatisticsParser")
+    steps = {}
+    outputs = {}
+    for parser_index, parser in enumerate(parsers):
+        parser_steps = parser.get_steps()
+        for name, step in parser_steps.items():
+            for required_name in step["requires"]:
+                if required_name not in parser_steps:
+                    raise ValueError("Step %s requires unknown step %s" % (name, required_name))
+            for output in step["outputs"]:
+                if output in outputs:
+                    raise ValueError("Steps %s and %s both write %s" % (outputs[output], name, output))
+                outputs[output] = name
+            # Scan the output tree before the workers are started, so they share the catalog
+            catalog = OutputCatalog.get(parser.node_directory)
+            num_inputs = sum(len(catalog.find(pattern)) for pattern in step["inputs"])
+            steps[(parser_index, name)] = ({(parser_index, required_name) for required_name in step["requires"]},
+                                           num_inputs, parser.get_input_size(step))
+
+    working_directory = os.getcwd()
+    completed = set()
+    pending = dict(steps)
+
+    def pop_ready_steps():
+        ready = sorted((key for key, (requires, _, _) in pending.items() if requires <= completed),
+                       key=lambda key: (-pending[key][1], key))
+        for key in ready:
+            pending.pop(key)
+        return ready
+
+    if workers == 1:
+        while pending:
+            ready = pop_ready_steps()
+            if not ready:
+                raise ValueError("The steps %s require each other" % ", ".join(name for _, name in pending))
+            for parser_index, name in ready:
+                duration = run_step(parsers[parser_index], name, working_directory)
+                logger.info("Step %s took %.3f seconds", name, duration)
+                completed.add((parser_index, name))
+        return
+
+    total_workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        running = {}
+        while pending or running:
+            ready = pop_ready_steps()
+            free_workers = total_workers - sum(step_workers for _, step_workers in running.values())
+            shares = divide_workers(free_workers, [steps[key][2] for key in ready])
+            for (parser_index, name), step_workers in zip(ready, shares):
+                future = executor.submit(run_step, parsers[parser_index], name, working_directory, step_workers)
+                running[future] = ((parser_index, name), step_workers)
+            if not running:
+                raise ValueError("The steps %s require each other" % ", ".join(name for _, name in pending))
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                key, step_workers = running.pop(future)
+                logger.info("Step %s took %.3f seconds with %d workers", key[1], future.result(), step_workers)
+                completed.add(key)
+
+
+class OutputCatalog(object):
+    """
+    An index of the non-empty files in the peer directories of an output tree, with both the DAS structure
+    (headnode/node/peer) and the localhost structure (peer). The tree is scanned once, after which all lookups are
+    served from memory. The catalog is saved to a cache file in the output directory, so the parsers that run after
+    this one do not have to scan the tree again. The cache is used as long as no head-node or peer directory has been
+    added or removed, and the size and modification time of every directory and file below them, including the empty
+    files, are unchanged. This costs a stat per file instead of a directory listing per directory. The parsers write
+    their own output to the node directory itself, so the node directory is not checked.
+    """
+
+    CACHE_FILENAME = ".output_catalog.json"
+
+    # The catalogs of this process by node directory. They are not checked against the output tree again, so a parser
+    # that adds files to the peer directories should get the catalog with refresh=True afterwards.
+    _catalogs = {}
+
+    def __init__(self, node_directory, workers=1):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.node_directory = node_directory
+        self.workers = workers
+        self.entries = []
+        self.basename_index = {}
+        self.top_level_dirs = []
+        # The [size, modification time] of every directory and file in the head-node and peer directories
+        self.stamps = {}
+
+    @classmethod
+    def get(cls, node_directory, refresh=False):
+        """
+        Return the catalog of the given directory that is shared by all parsers in this process. The catalog is loaded
+        from the cache file if it is still valid, and scanned otherwise. With refresh, the tree is scanned again.
+        """
+        key = os.path.abspath(node_directory)
+        if refresh or key not in cls._catalogs:
+            catalog = OutputCatalog(node_directory, workers=int(os.environ.get("OUTPUT_CATALOG_WORKERS", "1")))
+            if refresh or not catalog.load():
+                catalog.scan()
+                catalog.save()
+            cls._catalogs[key] = catalog
+        return cls._catalogs[key]
+
+    def get_cache_filename(self):
+        return os.path.join(os.environ.get("OUTPUT_DIR", self.node_directory), self.CACHE_FILENAME)
+
+    def scan(self):
+        """
+        Scan the output tree. With more than one worker, the top-level directories are scanned in parallel.
+        """
+        top_level = self.list_dirs(self.node_directory)
+
+        if self.workers > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(self.scan_top_level, top_level))
+        else:
+            results = [self.scan_top_level(path) for path in top_level]
+
+        self.stamps = {}
+        self.top_level_dirs = []
+        das_entries, localhost_entries = [], []
+        for path, (das, localhost, stamps) in zip(top_level, results):
+            das_entries += das
+            localhost_entries += localhost
+            if stamps:
+                self.top_level_dirs.append(os.path.basename(path))
+                self.stamps.update(stamps)
+        self.top_level_dirs.sort()
+        # The files in the DAS structure come first
+        self.set_entries(das_entries + localhost_entries)
+
+    def scan_top_level(self, path):
+        """
+        Scan a directory in the node directory, both as the head node of a DAS structure and as a localhost peer.
+        Returns the entries of both structures and the stamps of the directories and files that were scanned, which
+        are only returned if the directory holds peer directories.
+        """
+        das_entries, localhost_entries, stamps = [], [], {}
+        if not os.path.isdir(path):
+            return das_entries, localhost_entries, stamps
+
+        stamps[path] = self.get_stamp(os.stat(path))
+        found_peers = False
+        for nodedir in self.list_dirs(path):
+            stamps[nodedir] = self.get_stamp(os.stat(nodedir))
+            for peerdir in self.list_dirs(nodedir):
+                peer = os.path.basename(peerdir)
+                if PEER_PATTERN.match(peer):
+                    try:
+                        peer_nr = int(peer)
+                    except ValueError:
+                        break
+                    found_peers = True
+                    self.scan_peer(peer_nr, peerdir, das_entries, stamps)
+
+        peer = os.path.basename(path)
+        if PEER_PATTERN.match(peer):
+            found_peers = True
+            self.scan_peer(int(peer), path, localhost_entries, stamps)
+        return das_entries, localhost_entries, stamps if found_peers else {}
+
+    def has_peer_dirs(self, path):
+        """
+        Return whether a directory in the node directory is a peer directory, or a head node with peer directories.
+        """
+        if PEER_PATTERN.match(os.path.basename(path)):
+            return True
+        for nodedir in self.list_dirs(path):
+            for peerdir in self.list_dirs(nodedir):
+                peer = os.path.basename(peerdir)
+                if PEER_PATTERN.match(peer):
+                    # Like scan_top_level, a name that only starts with a number ends the node directory
+                    if peer.isdigit():
+                        return True
+                    break
+        return False
+
+    @staticmethod
+    def get_stamp(stat_result):
+        return [stat_result.st_size, stat_result.st_mtime_ns]
+
+    @staticmethod
+    def list_dirs(path):
+        with os.scandir(path) as dir_entries:
+            return [entry.path for entry in dir_entries if entry.is_dir()]
+
+    def scan_peer(self, peer_nr, peerdir, entries, stamps, directory=None):
+        """
+        Recursively add the non-empty files in a peer directory, in the same order as os.walk would find them. The
+        stamps of all files are kept, so a file that is written after it was found empty invalidates the cache.
+        """
+        directory = directory or peerdir
+        stamps[directory] = self.get_stamp(os.stat(directory))
+        subdirs = []
+        with os.scandir(directory) as dir_entries:
+            for entry in dir_entries:
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        subdirs.append(entry.path)
+                    continue
+                try:
+                    stamps[entry.path] = self.get_stamp(entry.stat())
+                except OSError:
+                    continue
+                if stamps[entry.path][0] > 0:
+                    entries.append((peer_nr, entry.path, peerdir))
+        for subdir in subdirs:
+            self.scan_peer(peer_nr, peerdir, entries, stamps, subdir)
+
+    def set_entries(self, entries):
+        self.entries = [tuple(entry) for entry in entries]
+        self.basename_index = {}
+        for position, (_, filename, _) in enumerate(self.entries):
+            self.basename_index.setdefault(os.path.basename(filename), []).append(position)
+
+    def load(self):
+        """
+        Load the catalog from the cache file, and return whether it is still valid.
+        """
+        try:
+            with open(self.get_cache_filename()) as cache_file:
+                cache = json.load(cache_file)
+        except (OSError, ValueError):
+            return False
+
+        if cache.get("node_directory") != os.path.abspath(self.node_directory):
+            return False
+        try:
+            top_level_dirs = sorted(os.path.basename(path) for path in self.list_dirs(self.node_directory)
+                                    if self.has_peer_dirs(path))
+            if top_level_dirs != cache.get("top_level_dirs"):
+                return False
+            if any(self.get_stamp(os.stat(path)) != stamp for path, stamp in cache["stamps"].items()):
+                return False
+        except (OSError, KeyError):
+            return False
+
+        self.top_level_dirs = top_level_dirs
+        self.stamps = cache["stamps"]
+        self.set_entries(cache["entries"])
+        return True
+
+    def save(self):
+        cache = {"node_directory": os.path.abspath(self.node_directory), "top_level_dirs": self.top_level_dirs,
+                 "stamps": self.stamps, "entries": self.entries}
+        try:
+            with open(self.get_cache_filename(), "w") as cache_file:
+                json.dump(cache, cache_file)
+        except OSError as e:
+            self._logger.warning("Could not save the output catalog: %s", e)
+
+    def find(self, file_pattern):
+        """
+        Return the (peer_nr, filename, peerdir) entries of the files with a basename that matches the pattern.
+        """
+        if not any(char in file_pattern for char in "*?["):
+            positions = self.basename_index.get(file_pattern, [])
+        else:
+            positions = sorted(position for basename, basename_positions in self.basename_index.items()
+                               if fnmatch.fnmatch(basename, file_pattern) for position in basename_positions)
+        return [self.entries[position] for position in positions]
+
+    def get_size(self, filename):
+        """
+        Return the size of a file in the catalog, as it was when the tree was scanned.
+        """
+        return self.stamps[filename][0]
 
 
 class StatisticsParser(object):
@@ -10,55 +352,153 @@ class StatisticsParser(object):
 
     def __init__(self, node_directory):
         self.node_directory = node_directory
+        # The number of worker processes that a step may start itself, which is set by run_parsers
+        self.step_workers = 1
 
     def yield_files(self, file_pattern):
-        peer_pattern = re.compile('[0-9]+')
-
-        def find_matching_files(directory):
-            """
-            Recursively find files matching a specific pattern.
-            Returns the list of (absolute) filenames of files that match the pattern.
-            """
-            matching_files = []
-            for root, _, files in os.walk(directory):
-                for basename in files:
-                    if fnmatch.fnmatch(basename, file_pattern):
-                        filename = os.path.join(root, basename)
-                        matching_files.append(filename)
-            return matching_files
-
-        # DAS structure
-        for headnode in os.listdir(self.node_directory):
-            headdir = os.path.join(self.node_directory, headnode)
-            if os.path.isdir(headdir):
-                for node in os.listdir(headdir):
-                    nodedir = os.path.join(self.node_directory, headnode, node)
-                    if os.path.isdir(nodedir):
-                        for peer in os.listdir(nodedir):
-                            peerdir = os.path.join(self.node_directory, headnode, node, peer)
-                            if os.path.isdir(peerdir) and peer_pattern.match(peer):
-                                try:
-                                    peer_nr = int(peer)
-
-                                    dir_path = os.path.join(self.node_directory, headnode, node, peer)
-                                    matching_files = find_matching_files(dir_path)
-                                    for matching_file in matching_files:
-                                        if os.stat(matching_file).st_size > 0:
-                                            yield peer_nr, matching_file, peerdir
-                                except ValueError:
-                                    break
-
-        # Localhost structure
-        for peer in os.listdir(self.node_directory):
-            peerdir = os.path.join(self.node_directory, peer)
-            if os.path.isdir(peerdir) and peer_pattern.match(peer):
-                peer_nr = int(peer)
-
-                dir_path = os.path.join(self.node_directory, peer)
-                matching_files = find_matching_files(dir_path)
-                for matching_file in matching_files:
-                    if os.stat(matching_file).st_size > 0:
-                        yield peer_nr, matching_file, peerdir
+        for entry in OutputCatalog.get(self.node_directory).find(file_pattern):
+            yield entry
+
+    def get_input_size(self, step):
+        """
+        Return the total size of the input files of an aggregation step, which decides its share of the workers.
+        """
+        catalog = OutputCatalog.get(self.node_directory)
+        return sum(catalog.get_size(filename) for pattern in step["inputs"] for _, filename, _ in catalog.find(pattern))
+
+    def get_steps(self):
+        """
+        Return the aggregation steps of this parser by name, in the order in which they are defined.
+        """
+        steps = {}
+        for cls in reversed(type(self).__mro__):
+            for name, value in vars(cls).items():
+                if hasattr(value, "aggregation_step"):
+                    steps[name] = value.aggregation_step
+                elif name in steps:
+                    # The step is overridden by a method that is not a step
+                    del steps[name]
+        return steps
+
+    def run_parallel(self, workers=None):
+        """
+        Run the aggregation steps in parallel, with POST_PROCESS_WORKERS worker processes unless workers is given.
+        """
+        run_parsers([self], workers or int(os.environ.get("POST_PROCESS_WORKERS", "0")) or None)
 
     def run(self):
-        pass
+        run_parsers([self], workers=1)
+
+
+class ProfileCollector(StatisticsParser):
+    """
+    This class is responsible for collecting profile logs and placing them in one directory.
+    """
+
+    @aggregation_step(inputs=("yappi.stats",), outputs=("profile",))
+    def collect_profiles(self):
+        if not os.path.exists('profile'):
+            os.mkdir('profile')
+
+        for peer_nr, filename, _ in self.yield_files('yappi.stats'):
+            shutil.copyfile(filename, os.path.join("profile", "%s.stats" % peer_nr))
+
+
+class LoopMonitorStatisticsParser(StatisticsParser):
+    """
+    Merges the measurements of the LoopMonitorModule of all peers into experiment-wide percentiles of the loop lag and
+    of the delay and duration of scenario lines, and a summary of the slow callbacks.
+    """
+
+    @staticmethod
+    def format_percentiles(values):
+        if not len(values):
+            return ["" for _ in PERCENTILES] + [""]
+        return ["%f" % value for value in np.percentile(values, PERCENTILES)] + ["%f" % np.max(values)]
+
+    @aggregation_step(inputs=("loop_lag.csv",), outputs=("loop_lag_percentiles.csv",))
+    def aggregate_loop_lag(self):
+        percentile_names = ["p%s" % percentile for percentile in PERCENTILES] + ["max"]
+        all_lags = []
+        with open("loop_lag_percentiles.csv", "w") as output_file:
+            output_file.write(",".join(["peer", "samples"] + percentile_names) + "\n")
+            for peer_nr, filename, _ in sorted(self.yield_files('loop_lag.csv')):
+                lags = np.loadtxt(filename, delimiter=',', skiprows=1, usecols=1, ndmin=1)
+                all_lags.append(lags)
+                output_file.write(",".join([str(peer_nr), str(len(lags))] + self.format_percentiles(lags)) + "\n")
+            all_lags = np.concatenate(all_lags) if all_lags else np.empty(0)
+            output_file.write(",".join(["all", str(len(all_lags))] + self.format_percentiles(all_lags)) + "\n")
+
+    @aggregation_step(inputs=("scenario_dispatch.csv",), outputs=("scenario_dispatch_percentiles.csv",))
+    def aggregate_scenario_dispatch(self):
+        percentile_names = ["p%s" % percentile for percentile in PERCENTILES] + ["max"]
+        delays = defaultdict(list)
+        durations = defaultdict(list)
+        for _, filename, _ in self.yield_files('scenario_dispatch.csv'):
+            with open(filename) as dispatch_file:
+                for row in csv.DictReader(dispatch_file):
+                    delays[row["callable"]].append(float(row["delay"]))
+                    if row.get("duration"):
+                        durations[row["callable"]].append(float(row["duration"]))
+
+        with open("scenario_dispatch_percentiles.csv", "w") as output_file:
+            output_file.write(",".join(["callable", "count"] + ["delay_%s" % name for name in percentile_names] +
+                                       ["duration_%s" % name for name in percentile_names]) + "\n")
+            for name in sorted(delays) + ["all"]:
+                if name == "all":
+                    name_delays = [delay for values in delays.values() for delay in values]
+                    name_durations = [duration for values in durations.values() for duration in values]
+                else:
+                    name_delays, name_durations = delays[name], durations[name]
+                output_file.write(",".join([name, str(len(name_delays))] + self.format_percentiles(name_delays) +
+                                           self.format_percentiles(name_durations)) + "\n")
+
+    @aggregation_step(inputs=("scenario_pacing.csv",), outputs=("scenario_pacing_summary.csv",))
+    def aggregate_scenario_pacing(self):
+        """
+        Sum the calls of the repeated scenario lines of all peers, with their delay histograms.
+        """
+        header = None
+        summaries = {}
+        for _, filename, _ in self.yield_files('scenario_pacing.csv'):
+            with open(filename) as pacing_file:
+                reader = csv.DictReader(pacing_file)
+                histogram_columns = [column for column in reader.fieldnames if column.startswith("delay_")]
+                header = header or ["callable", "calls", "mean_delay", "max_delay", "mean_duration",
+                                    "max_duration"] + histogram_columns
+                for row in reader:
+                    summary = summaries.setdefault(row["callable"], defaultdict(float))
+                    calls, finished = int(row["calls"]), int(row["finished"])
+                    summary["calls"] += calls
+                    summary["total_delay"] += float(row["mean_delay"]) * calls
+                    summary["max_delay"] = max(summary["max_delay"], float(row["max_delay"]))
+                    summary["finished"] += finished
+                    summary["total_duration"] += float(row["mean_duration"]) * finished
+                    summary["max_duration"] = max(summary["max_duration"], float(row["max_duration"]))
+                    for column in histogram_columns:
+                        summary[column] += int(row[column])
+
+        with open("scenario_pacing_summary.csv", "w") as output_file:
+            if header is None:
+                return
+            output_file.write(",".join(header) + "\n")
+            for name, summary in sorted(summaries.items()):
+                values = [summary["calls"], summary["total_delay"] / summary["calls"] if summary["calls"] else 0,
+                          summary["max_delay"],
+                          summary["total_duration"] / summary["finished"] if summary["finished"] else 0,
+                          summary["max_duration"]]
+                output_file.write(",".join([name, "%d" % values[0]] + ["%f" % value for value in values[1:]] +
+                                           ["%d" % summary[column] for column in header[6:]]) + "\n")
+
+    @aggregation_step(inputs=("slow_callbacks.csv",), outputs=("slow_callbacks_summary.csv",))
+    def aggregate_slow_callbacks(self):
+        slow_callbacks = defaultdict(list)
+        for _, filename, _ in self.yield_files('slow_callbacks.csv'):
+            with open(filename) as slow_callbacks_file:
+                for row in csv.DictReader(slow_callbacks_file):
+                    slow_callbacks[row["callback"]].append(float(row["duration"]))
+
+        with open("slow_callbacks_summary.csv", "w") as output_file:
+            output_file.write("callback,count,total_duration,max_duration\n")
+            for name, durations in sorted(slow_callbacks.items(), key=lambda item: -sum(item[1])):
+                output_file.write("%s,%d,%f,%f\n" % (name, len(durations), sum(durations), max(durations)))
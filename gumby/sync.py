@@ -1,11 +1,13 @@
 """
 Experiment metainfo and time synchronization server.
 
-It receives 3 types of commands:
+It receives 4 types of commands:
 * time:<float>  -> Tells the service the local time for the subprocess for sync reasons.
 * set:key:value -> Sets an arbitrary variable associated with this connection to the
                    specified value, can be used to share arbitrary data generated at
                    startup between nodes just before starting the experiment.
+* framing:<codecs> -> Tells the service that this subprocess can receive the JSON document as a length-prefixed
+                   frame, compressed with one of the comma-separated codecs (see FRAME_CODECS).
 * ready         -> Indicates that this specific instance has ending sending its info
                    and its ready to start.
 
@@ -26,21 +28,38 @@ Example of an expected exchange:
 -> vars_received
 <- go:1388665322.478153
 
+Subscribers that negotiated framing receive the JSON document, compressed once by the service, as
+"frame:<codec>:<length>" followed by <length> bytes of compressed data instead of as a single line.
+This is not limited by the maximum line length.
+
 After the initial time synchronization and experiment metainfo exchange, peers can send messages to each
 other using the synchronization server. This command looks like msg:<peer_id>:<message> where peer_id is the
 peer to which the message should be forwarded to.
+
+Instead of connecting to the server directly, the instances on a node can connect to a sync relay running on that
+node (see SyncRelayFactory). The relay opens a single connection to the server, on which it first sends
+relay:<count> and then multiplexes the lines of its <count> instances as sub:<index>:<line> in both directions.
+The relay does not pass on the time, set and ready lines of its instances. Once all of them are ready, it sends a
+single frame with a JSON document that maps the index of every instance to its time and vars instead, which tells the
+server that all instances of the relay are ready.
 """
 import json
 import logging
-from asyncio import Future, Semaphore, ensure_future, get_event_loop, sleep
+from asyncio import Future, ensure_future, gather, get_event_loop, sleep
 from random import randint
 from time import time
 
 from gumby.experiment import ExperimentClient
-from gumby.line_receiver import LineReceiver
+from gumby.line_receiver import FRAME_CODECS, LineReceiver
 from gumby.util import run_task
 
 EXPERIMENT_SYNC_TIMEOUT = 30
+# The codec the server uses to send the json doc to a relay
+RELAY_FRAME_CODEC = b"zlib"
+# The number of transports we write to before yielding to the event loop
+WRITE_BATCH_SIZE = 250
+# Wait until a batch has less than this many bytes buffered before writing to the next batch
+WRITE_BUFFER_LIMIT = 2 ** 26
 
 
 class ExperimentServiceProto(LineReceiver):
@@ -53,14 +72,21 @@ class ExperimentServiceProto(LineReceiver):
         self.id = id
         self.factory = factory
         self.ready = False
-        self.state = 'init'
+        self.state = 'connect'
         self.vars = {}
+        self.frame_codec = None
         self.ready_future = Future()
+        # If this connection comes from a relay, the subscribers it speaks for, by their index at the relay
+        self.relayed_subscribers = {}
+        self.all_vars_sent = False
+
+    @property
+    def host(self):
+        return self.transport.get_extra_info('peername')[0]
 
     def connection_made(self, transport):
         super(ExperimentServiceProto, self).connection_made(transport)
         self._logger.debug("New connection from: %s", str(self.transport.get_extra_info('peername')))
-        self.factory.set_connection_made(self)
 
     def line_received(self, line):
         try:
@@ -77,9 +103,17 @@ class ExperimentServiceProto(LineReceiver):
         self.send_line(b"id:%d" % self.id)
         return self.ready_future
 
+    def send_all_vars(self, json_vars, frames):
+        if self.frame_codec:
+            self.send_frame(frames[self.frame_codec], self.frame_codec)
+        else:
+            self.send_line(json_vars)
+
     def connection_lost(self, exc):
         self._logger.debug("Lost connection with: %s with ID %d", str(self.transport.get_extra_info('peername')),
                            self.id)
+        for subscriber in self.relayed_subscribers.values():
+            self.factory.unregister_connection(subscriber)
         self.factory.unregister_connection(self)
         LineReceiver.connection_lost(self, exc)
 
@@ -87,13 +121,60 @@ class ExperimentServiceProto(LineReceiver):
     # Protocol state handlers
     #
 
+    def proto_connect(self, line):
+        if line.startswith(b"relay:"):
+            num_subscribers = int(line.strip().split(b':')[1])
+            self._logger.info("Relay at %s speaks for %d subscribers", self.host, num_subscribers)
+            for index in range(num_subscribers):
+                subscriber = self.factory.create_relayed_subscriber(self, index)
+                self.relayed_subscribers[index] = subscriber
+                self.factory.set_connection_made(subscriber)
+            return 'relay'
+
+        self.factory.set_connection_made(self)
+        return self.proto_init(line)
+
+    def proto_relay(self, line):
+        if line.startswith(b"frame:"):
+            _, self.frame_codec, length = line.strip().split(b':')
+            self.expect_raw_data(int(length))
+            return 'relay'
+
+        _, index, line = line.split(b':', 2)
+        subscriber = self.relayed_subscribers[int(index)]
+        subscriber.line_received(line)
+        return 'relay'
+
+    def raw_data_received(self, data):
+        self.relayed_subscribers_ready(json.loads(FRAME_CODECS[self.frame_codec][1](data)))
+
+    def relayed_subscribers_ready(self, subscribers_info):
+        """
+        Set the time offset and vars of all subscribers of this relay, and mark them ready.
+        """
+        for index, info in subscribers_info.items():
+            subscriber = self.relayed_subscribers[int(index)]
+            subscriber.set_time_offset(info["time"])
+            subscriber.vars.update(info["vars"])
+            subscriber.state = subscriber.set_ready()
+
+    def set_time_offset(self, subscriber_time):
+        self.vars["time_offset"] = subscriber_time - time()
+        if abs(self.vars['time_offset']) < 0.5:  # ignore time_offset if smaller than +0.5/-0.5
+            self.vars['time_offset'] = 0
+
+        self._logger.debug("Time offset is %s", self.vars["time_offset"])
+
+    def set_ready(self):
+        self._logger.debug("This subscriber is ready now.")
+        self.ready = True
+        self.factory.set_connection_ready(self)
+        self.ready_future.set_result(self)
+        return 'vars_received'
+
     def proto_init(self, line):
         if line.startswith(b"time"):
-            self.vars["time_offset"] = float(line.strip().split(b':')[1]) - time()
-            if abs(self.vars['time_offset']) < 0.5:  # ignore time_offset if smaller than +0.5/-0.5
-                self.vars['time_offset'] = 0
-
-            self._logger.debug("Time offset is %s", self.vars["time_offset"])
+            self.set_time_offset(float(line.strip().split(b':')[1]))
             return 'init'
 
         elif line.startswith(b"set:"):
@@ -102,12 +183,14 @@ class ExperimentServiceProto(LineReceiver):
             self.vars[key.decode()] = value.decode()
             return 'init'
 
+        elif line.startswith(b"framing:"):
+            codecs = line.strip().split(b':')[1].split(b',')
+            self.frame_codec = next((codec for codec in codecs if codec in FRAME_CODECS), None)
+            self._logger.debug("This subscriber accepts frames compressed with %s", self.frame_codec)
+            return 'init'
+
         elif line.strip() == b"ready":
-            self._logger.debug("This subscriber is ready now.")
-            self.ready = True
-            self.factory.set_connection_ready(self)
-            self.ready_future.set_result(self)
-            return 'vars_received'
+            return self.set_ready()
 
         else:
             self._logger.error('Unexpected command received "%s"', line)
@@ -140,6 +223,30 @@ class ExperimentServiceProto(LineReceiver):
         return "running"
 
 
+class RelayedSubscriberProto(ExperimentServiceProto):
+    """
+    A subscriber that is connected to the server through a relay. Its lines are multiplexed on the connection with
+    the relay, prefixed with the index of the subscriber at the relay.
+    """
+
+    def __init__(self, factory, id, relay, index):
+        super(RelayedSubscriberProto, self).__init__(factory, id)
+        self.relay = relay
+        self.index = index
+        self.state = 'init'
+        self.frame_codec = RELAY_FRAME_CODEC
+        self.transport = relay.transport
+
+    def send_line(self, line):
+        return self.relay.send_line(b"sub:%d:%s" % (self.index, line))
+
+    def send_all_vars(self, json_vars, frames):
+        # The relay receives the json doc once, and passes it on to all of its subscribers
+        if not self.relay.all_vars_sent:
+            self.relay.all_vars_sent = True
+            self.relay.send_frame(frames[self.frame_codec], self.frame_codec)
+
+
 class ExperimentServiceFactory:
 
     def __init__(self, expected_subscribers, experiment_start_delay):
@@ -147,13 +254,15 @@ class ExperimentServiceFactory:
 
         self.expected_subscribers = expected_subscribers
         self.experiment_start_delay = experiment_start_delay
-        self.parsing_semaphore = Semaphore(500)
         self.connection_counter = -1
-        self.connections_made = []
-        self.connections_ready = []
-        self.vars_received = []
+        # Connections in the order they were made, mapped to their host
+        self.connections_made = {}
+        self.connections_ready = set()
+        self.vars_received = set()
         self.last_status_update = 0
         self.id_to_connection = {}
+        # The time at which each phase of the experiment startup completed
+        self.phase_times = {}
 
         self._timeout_delayed_call = None
 
@@ -161,15 +270,42 @@ class ExperimentServiceFactory:
         self.connection_counter += 1
         return ExperimentServiceProto(self, self.connection_counter + 1)
 
+    def create_relayed_subscriber(self, relay, index):
+        self.connection_counter += 1
+        return RelayedSubscriberProto(self, self.connection_counter + 1, relay, index)
+
     def reset_sync_timeout(self):
         if self._timeout_delayed_call:
             self._timeout_delayed_call.cancel()
         self._timeout_delayed_call = get_event_loop().call_later(EXPERIMENT_SYNC_TIMEOUT,
                                                                  self.on_experiment_setup_timeout)
 
+    def set_phase_completed(self, phase):
+        """
+        Record the time at which a startup phase completed, relative to the first connection.
+        """
+        self.phase_times[phase] = time()
+        start_time = self.phase_times.get("first_connection", self.phase_times[phase])
+        self._logger.info("Startup phase '%s' completed after %.3f seconds", phase, self.phase_times[phase] - start_time)
+
+    def get_phase_durations(self):
+        """
+        Return the duration of each startup phase that has completed so far.
+        """
+        durations = {}
+        previous_time = self.phase_times.get("first_connection")
+        for phase in ("connected", "ready", "vars_received", "go"):
+            if phase not in self.phase_times:
+                break
+            durations[phase] = self.phase_times[phase] - previous_time
+            previous_time = self.phase_times[phase]
+        return durations
+
     def set_connection_made(self, proto):
         self.reset_sync_timeout()
-        self.connections_made.append(proto)
+        self.connections_made[proto] = proto.host
+        if len(self.connections_made) == 1:
+            self.set_phase_completed("first_connection")
 
         if len(self.connections_made) == 1 or time() - self.last_status_update > 1:
             self._logger.info("%d of %d expected subscribers connected.",
@@ -178,47 +314,41 @@ class ExperimentServiceFactory:
 
         if len(self.connections_made) >= self.expected_subscribers:
             self._logger.info("All subscribers connected!")
+            self.set_phase_completed("connected")
+            self.assign_ids()
+            ensure_future(self.push_id_to_subscribers())
 
-            # Assign IDs to the connected subscribers, based on their address
-            host_dict = {}
-            for connection in self.connections_made:
-                connection_host = connection.transport.get_extra_info('peername')[0]
-                if connection_host not in host_dict:
-                    host_dict[connection_host] = []
-                host_dict[connection_host].append(connection)
-
-            # Sort them on IP
-            def split_ip(ip):
-                return tuple(int(part) for part in ip.split('.'))
-
-            def ip_addr_key(ip_addr):
-                return split_ip(ip_addr)
-
-            sorted_hosts = sorted(list(host_dict.keys()), key=ip_addr_key)
+    def assign_ids(self):
+        """
+        Assign IDs to the connected subscribers, round-robin over their hosts sorted on IP address.
+        """
+        host_connections = {}
+        for connection, host in self.connections_made.items():
+            host_connections.setdefault(host, []).append(connection)
 
-            # Assign
-            cur_peer_index = 1
-            cur_host_index = 0
-            while cur_peer_index <= len(self.connections_made):
-                # Get the next connection
-                if host_dict[sorted_hosts[cur_host_index]]:
-                    connection = host_dict[sorted_hosts[cur_host_index]].pop(0)
-                    connection.id = cur_peer_index
+        def split_ip(ip):
+            return tuple(int(part) for part in ip.split('.'))
 
-                cur_host_index += 1
-                cur_host_index %= len(sorted_hosts)
-                cur_peer_index += 1
+        sorted_hosts = sorted(host_connections.keys(), key=split_ip)
 
-            ensure_future(self.push_id_to_subscribers())
+        cur_peer_index = 1
+        for connection_index in range(max(len(connections) for connections in host_connections.values())):
+            for host in sorted_hosts:
+                if connection_index < len(host_connections[host]):
+                    host_connections[host][connection_index].id = cur_peer_index
+                    cur_peer_index += 1
 
     async def push_id_to_subscribers(self):
-        for proto in self.connections_made:
-            async with self.parsing_semaphore:
-                await proto.send_and_wait_for_ready()
+        """
+        Send every subscriber its ID at once, and wait until all of them are ready.
+        """
+        connections = list(self.connections_made)
+        ready_futures = [proto.send_and_wait_for_ready() for proto in connections]
+        await gather(*ready_futures)
 
     def set_connection_ready(self, proto):
         self.reset_sync_timeout()
-        self.connections_ready.append(proto)
+        self.connections_ready.add(proto)
 
         if len(self.connections_ready) == 1 or time() - self.last_status_update > 1:
             self._logger.info("%d of %d expected subscribers ready.",
@@ -227,6 +357,7 @@ class ExperimentServiceFactory:
 
         if len(self.connections_ready) >= self.expected_subscribers:
             self._logger.info("All subscribers are ready, pushing data!")
+            self.set_phase_completed("ready")
             self.push_info_to_subscribers()
 
     def push_info_to_subscribers(self):
@@ -237,7 +368,7 @@ class ExperimentServiceFactory:
             if "port" not in subscriber_vars:
                 subscriber_vars['port'] = subscriber.id + 12000
             if "host" not in subscriber_vars:
-                subscriber_vars['host'] = subscriber.transport.get_extra_info('peername')[0]
+                subscriber_vars['host'] = subscriber.host
             vars[subscriber.id] = subscriber_vars
 
         vars = {
@@ -247,20 +378,38 @@ class ExperimentServiceFactory:
                 },
             "clients": vars
         }
-        json_vars = json.dumps(vars)
+        json_vars = json.dumps(vars).encode()
         del vars
         self._logger.info("Pushing a %d bytes long json doc.", len(json_vars))
 
-        # Send the json doc to the subscribers
-        self._send_line_to_all(json_vars.encode())
+        # Compress the json doc once for every codec requested by the subscribers
+        frames = {}
+        for codec in {subscriber.frame_codec for subscriber in self.connections_ready} - {None}:
+            frames[codec] = FRAME_CODECS[codec][0](json_vars)
+            self._logger.info("Compressed the json doc with %s to %d bytes.", codec.decode(), len(frames[codec]))
 
-    def _send_line_to_all(self, line):
-        for subscriber in self.connections_ready:
-            subscriber.send_line(line)
+        # Send the json doc to the subscribers
+        ensure_future(self._write_to_all(list(self.connections_ready),
+                                         lambda subscriber: subscriber.send_all_vars(json_vars, frames)))
+
+    async def _write_to_all(self, subscribers, send):
+        """
+        Send data to every subscriber, in batches. After each batch we yield to the event loop, and wait until the
+        batch has flushed most of its data, so we never buffer the data for all subscribers at once.
+        """
+        for batch_start in range(0, len(subscribers), WRITE_BATCH_SIZE):
+            batch = subscribers[batch_start:batch_start + WRITE_BATCH_SIZE]
+            for subscriber in batch:
+                send(subscriber)
+
+            await sleep(0)
+            while sum(subscriber.transport.get_write_buffer_size() for subscriber in batch
+                      if not subscriber.transport.is_closing()) > WRITE_BUFFER_LIMIT:
+                await sleep(0.01)
 
     def set_connection_received(self, proto):
         self.reset_sync_timeout()
-        self.vars_received.append(proto)
+        self.vars_received.add(proto)
 
         if len(self.vars_received) == 1 or time() - self.last_status_update > 1:
             self._logger.info("%d of %d expected subscribers received the data.",
@@ -270,6 +419,7 @@ class ExperimentServiceFactory:
         if len(self.vars_received) >= self.expected_subscribers:
             self._logger.info("Data sent to all subscribers, giving the go signal in %.1f secs.",
                               self.experiment_start_delay)
+            self.set_phase_completed("vars_received")
             ensure_future(self.start_experiment())
             self._timeout_delayed_call.cancel()
 
@@ -278,12 +428,19 @@ class ExperimentServiceFactory:
         self._logger.info("Starting the experiment!")
 
         start_time = time() + self.experiment_start_delay
-        for subscriber in self.connections_ready:
-            # Sync the experiment start time among instances
-            subscriber.send_line(b"go:%f" % (start_time + subscriber.vars['time_offset']))
+        subscribers = list(self.connections_ready)
+        for subscriber in subscribers:
             subscriber.state = "running"
             self.id_to_connection[subscriber.id] = subscriber
 
+        # Sync the experiment start time among instances
+        await self._write_to_all(subscribers, lambda subscriber: subscriber.send_line(
+            b"go:%f" % (start_time + subscriber.vars['time_offset'])))
+
+        self.set_phase_completed("go")
+        self._logger.info("Startup phase durations: %s",
+                          ", ".join("%s %.3f s" % item for item in self.get_phase_durations().items()))
+
         await sleep(5)
 
     def forwardMessage(self, from_id, to_id, msg_type, msg):
@@ -297,12 +454,9 @@ class ExperimentServiceFactory:
             subscriber.transport.close()
 
     def unregister_connection(self, proto):
-        if proto in self.connections_ready:
-            self.connections_ready.remove(proto)
-        if proto in self.vars_received:
-            self.vars_received.remove(proto)
-        if proto.id in self.vars_received:
-            self.vars_received.remove(proto.id)
+        self.connections_made.pop(proto, None)
+        self.connections_ready.discard(proto)
+        self.vars_received.discard(proto)
 
         self._logger.debug("Connection cleanly unregistered.")
 
@@ -324,6 +478,201 @@ class ExperimentServiceFactory:
         self._logger.error("Line length exceeded, %d bytes remain.", len(line))
 
 
+class SyncRelayLocalProto(LineReceiver):
+    """
+    The connection between a sync relay and an experiment client on the same node.
+    """
+    MAX_LENGTH = 2 ** 22
+
+    def __init__(self, factory, index):
+        super(SyncRelayLocalProto, self).__init__()
+        self.factory = factory
+        self.index = index
+        self.id = None
+        self.frame_codec = None
+        self.time_delta = 0
+        self.vars = {}
+        self.ready = False
+        self.pending_lines = []
+
+    def connection_made(self, transport):
+        super(SyncRelayLocalProto, self).connection_made(transport)
+        self.factory.set_connection_made(self)
+
+    def line_received(self, line):
+        # The relay sends the time, vars and ready of all its clients at once, see set_connection_ready of the factory
+        if line.startswith(b"time:"):
+            self.time_delta = float(line.strip().split(b':')[1]) - time()
+            return
+        elif line.startswith(b"set:"):
+            _, key, value = line.strip().split(b':', 2)
+            self.vars[key.decode()] = value.decode()
+            return
+        elif line.strip() == b"ready":
+            self.ready = True
+            self.factory.set_connection_ready(self)
+            return
+        elif line.startswith(b"framing:"):
+            # The relay decides how to send the json doc to this client, the server always sends it to the relay
+            codecs = line.strip().split(b':')[1].split(b',')
+            self.frame_codec = next((codec for codec in codecs if codec in FRAME_CODECS), None)
+            return
+        elif line.startswith(b"msg:") and self.id is not None:
+            _, peer_id, msg_type, msg = line.strip().split(b':', 3)
+            subscriber = self.factory.id_to_subscriber.get(int(peer_id))
+            if subscriber:
+                # Deliver messages between clients on this node without a round trip to the server
+                subscriber.send_line(b"msg:%d:%s:%s" % (self.id, msg_type, msg))
+                return
+
+        if self.factory.upstream:
+            self.send_upstream(line)
+        else:
+            self.pending_lines.append(line)
+
+    def send_upstream(self, line):
+        self.factory.upstream.send_line(b"sub:%d:%s" % (self.index, line))
+
+    def flush_pending_lines(self):
+        for line in self.pending_lines:
+            self.send_upstream(line)
+        self.pending_lines = []
+
+    def send_all_vars(self, json_vars, frames):
+        if self.frame_codec:
+            self.send_frame(frames[self.frame_codec], self.frame_codec)
+        else:
+            self.send_line(json_vars)
+
+    def connection_lost(self, exc):
+        self.factory.unregister_connection(self)
+
+
+class SyncRelayUpstreamProto(LineReceiver):
+    """
+    The connection between a sync relay and the experiment server.
+    """
+    MAX_LENGTH = 2 ** 22
+
+    def __init__(self, factory):
+        super(SyncRelayUpstreamProto, self).__init__()
+        self.factory = factory
+        self.frame_codec = None
+
+    def connection_made(self, transport):
+        super(SyncRelayUpstreamProto, self).connection_made(transport)
+        self.factory.set_upstream(self)
+
+    def line_received(self, line):
+        if line.startswith(b"sub:"):
+            _, index, line = line.split(b':', 2)
+            self.factory.send_to_subscriber(int(index), line)
+        elif line.startswith(b"frame:"):
+            _, self.frame_codec, length = line.strip().split(b':')
+            self.expect_raw_data(int(length))
+        else:
+            self._logger.error('Unexpected command received from the server "%s"', line)
+
+    def raw_data_received(self, data):
+        self.factory.push_info_to_subscribers(FRAME_CODECS[self.frame_codec][1](data))
+
+    def connection_lost(self, exc):
+        self.factory.on_upstream_lost()
+
+
+class SyncRelayFactory:
+    """
+    A sync relay aggregates the experiment clients on a single node, and speaks to the experiment server on their
+    behalf over a single connection. The relay connects to the server once all of its clients have connected, and
+    sends the time and vars of all its clients in a single frame once they are all ready. The server sends the json
+    doc only once to every relay, which passes it on to its clients, and messages between clients on the same node are
+    delivered by the relay itself.
+    """
+
+    def __init__(self, server_host, server_port, expected_subscribers):
+        self._logger = logging.getLogger(self.__class__.__name__)
+
+        self.server_host = server_host
+        self.server_port = server_port
+        self.expected_subscribers = expected_subscribers
+        self.connection_counter = -1
+        self.subscribers = {}
+        self.id_to_subscriber = {}
+        self.upstream = None
+
+    def __call__(self):
+        self.connection_counter += 1
+        return SyncRelayLocalProto(self, self.connection_counter)
+
+    def set_connection_made(self, proto):
+        self.subscribers[proto.index] = proto
+        self._logger.debug("%d of %d expected subscribers connected to the relay.",
+                           len(self.subscribers), self.expected_subscribers)
+
+        if len(self.subscribers) == self.expected_subscribers:
+            self._logger.info("All subscribers connected, connecting to the server at %s:%d",
+                              self.server_host, self.server_port)
+            ensure_future(self.connect_to_server())
+
+    async def connect_to_server(self):
+        while True:
+            try:
+                await get_event_loop().create_connection(lambda: SyncRelayUpstreamProto(self),
+                                                         self.server_host, self.server_port)
+                return
+            except OSError as e:
+                self._logger.warning("Could not connect to the server (%s), retrying", e)
+                await sleep(1)
+
+    def set_upstream(self, proto):
+        self.upstream = proto
+        self.upstream.send_line(b"relay:%d" % len(self.subscribers))
+        for subscriber in self.subscribers.values():
+            subscriber.flush_pending_lines()
+
+    def send_to_subscriber(self, index, line):
+        subscriber = self.subscribers.get(index)
+        if not subscriber:
+            return
+
+        if line.startswith(b"id:"):
+            subscriber.id = int(line.strip().split(b':')[1])
+            self.id_to_subscriber[subscriber.id] = subscriber
+        subscriber.send_line(line)
+
+    def set_connection_ready(self, proto):
+        if not self.upstream or not all(subscriber.ready for subscriber in self.subscribers.values()):
+            return
+
+        self._logger.info("All %d subscribers are ready, sending their vars to the server", len(self.subscribers))
+        subscribers_info = {subscriber.index: {"time": time() + subscriber.time_delta, "vars": subscriber.vars}
+                            for subscriber in self.subscribers.values()}
+        self.upstream.send_frame(FRAME_CODECS[RELAY_FRAME_CODEC][0](json.dumps(subscribers_info).encode()),
+                                 RELAY_FRAME_CODEC)
+
+    def push_info_to_subscribers(self, json_vars):
+        self._logger.info("Passing a %d bytes long json doc on to %d subscribers.",
+                          len(json_vars), len(self.subscribers))
+        frames = {codec: FRAME_CODECS[codec][0](json_vars)
+                  for codec in {subscriber.frame_codec for subscriber in self.subscribers.values()} - {None}}
+        for subscriber in self.subscribers.values():
+            subscriber.send_all_vars(json_vars, frames)
+
+    def unregister_connection(self, proto):
+        self.subscribers.pop(proto.index, None)
+        self.id_to_subscriber.pop(proto.id, None)
+
+        if not self.subscribers and self.upstream:
+            self._logger.info("All subscribers disconnected, shutting down the relay.")
+            self.upstream.transport.close()
+
+    def on_upstream_lost(self):
+        self._logger.info("Lost the connection with the server, shutting down the relay.")
+        for subscriber in list(self.subscribers.values()):
+            subscriber.transport.close()
+        get_event_loop().call_later(0, stop_loop, 0)
+
+
 class ExperimentClientFactory:
 
     def __init__(self, vars={}, protocol=ExperimentClient):
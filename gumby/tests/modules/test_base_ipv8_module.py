@@ -0,0 +1,54 @@
+import os
+import shutil
+import tempfile
+import unittest
+from asyncio import new_event_loop, set_event_loop, sleep
+from unittest.mock import patch
+
+from gumby.modules.base_ipv8_module import IPv8Provider
+
+
+class MockExperiment(object):
+
+    def __init__(self):
+        self.experiment_modules = []
+
+    def register(self, module):
+        self.experiment_modules.append(module)
+
+
+class TestIPv8Provider(unittest.TestCase):
+
+    def setUp(self):
+        self.current_dir = os.getcwd()
+        self.test_dir = tempfile.mkdtemp()
+        os.chdir(self.test_dir)
+        self.loop = new_event_loop()
+        set_event_loop(self.loop)
+        with patch.dict(os.environ, {"SYNC_HOST": "localhost", "SYNC_PORT": "1234"}):
+            self.provider = IPv8Provider(MockExperiment())
+
+    def tearDown(self):
+        self.provider.stop_ipv8_statistics_monitor()
+        # Let the cancelled monitor finish
+        self.loop.run_until_complete(sleep(0))
+        self.loop.close()
+        os.chdir(self.current_dir)
+        shutil.rmtree(self.test_dir)
+
+    def test_restart_statistics_monitor(self):
+        """
+        Test that starting the statistics monitor twice stops the first monitor and closes its recorder
+        """
+        async def restart():
+            self.provider.start_ipv8_statistics_monitor()
+            recorder, monitor = self.provider.statistics_recorder, self.provider.statistics_monitor.runner
+            self.provider.start_ipv8_statistics_monitor()
+            await sleep(0)
+            return recorder, monitor
+
+        recorder, monitor = self.loop.run_until_complete(restart())
+        self.assertTrue(recorder.deltas_file.closed)
+        self.assertTrue(monitor.cancelled())
+        self.assertIsNot(self.provider.statistics_recorder, recorder)
+        self.assertFalse(self.provider.statistics_recorder.deltas_file.closed)
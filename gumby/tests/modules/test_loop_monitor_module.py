@@ -0,0 +1,60 @@
+import unittest
+from asyncio import events, new_event_loop
+from time import sleep
+
+from gumby.modules.loop_monitor_module import LoopMonitorModule
+
+
+class MockExperiment(object):
+
+    def register(self, module):
+        pass
+
+
+class TestLoopMonitorModule(unittest.TestCase):
+
+    def setUp(self):
+        self.original_handle_run = events.Handle._run
+        self.monitors = [LoopMonitorModule(MockExperiment()), LoopMonitorModule(MockExperiment())]
+        self.monitors[0].slow_callback_threshold = 0.01
+        self.monitors[1].slow_callback_threshold = 1.0
+        self.loop = new_event_loop()
+
+    def tearDown(self):
+        for monitor in self.monitors:
+            monitor.uninstall_callback_timer()
+        self.loop.close()
+        events.Handle._run = self.original_handle_run
+
+    def run_slow_callback(self):
+        def slow_callback():
+            sleep(0.05)
+        self.loop.call_soon(slow_callback)
+        self.loop.call_soon(self.loop.stop)
+        self.loop.run_forever()
+
+    def test_install_uninstall(self):
+        """
+        Test that the callbacks are timed once, however often the timer is installed, and that uninstalling the last
+        monitor restores asyncio
+        """
+        self.monitors[0].install_callback_timer()
+        timed_run = events.Handle._run
+        self.assertIsNot(timed_run, self.original_handle_run)
+        self.monitors[0].install_callback_timer()
+        self.monitors[1].install_callback_timer()
+        self.assertIs(events.Handle._run, timed_run)
+
+        self.run_slow_callback()
+        self.assertEqual([name for _, _, name in self.monitors[0].slow_callbacks],
+                         ["TestLoopMonitorModule.run_slow_callback.<locals>.slow_callback"])
+        self.assertEqual(self.monitors[1].slow_callbacks, [])
+
+        self.monitors[0].uninstall_callback_timer()
+        self.assertIs(events.Handle._run, timed_run)
+        self.monitors[0].uninstall_callback_timer()
+        self.monitors[1].uninstall_callback_timer()
+        self.assertIs(events.Handle._run, self.original_handle_run)
+
+        self.run_slow_callback()
+        self.assertEqual(len(self.monitors[0].slow_callbacks), 1)
@@ -0,0 +1,36 @@
+import unittest
+
+from gumby.scenario import ScenarioRunner, compile_peerspec
+
+
+class TestPeerSpec(unittest.TestCase):
+
+    def assert_matches(self, peerspec, peers):
+        self.assertEqual([peer for peer in range(1, 21) if compile_peerspec(peerspec).matches(peer)], peers)
+
+    def test_single_peers(self):
+        self.assert_matches("1,3, 20", [1, 3, 20])
+
+    def test_ranges(self):
+        self.assert_matches("3-6,5-8,10-10,12", [3, 4, 5, 6, 7, 8, 10, 12])
+
+    def test_adjacent_ranges(self):
+        spec = compile_peerspec("1-3,4-6,7")
+        self.assertEqual((spec.starts, spec.ends), ([1], [7]))
+
+    def test_negated(self):
+        self.assert_matches("!1-5,20", list(range(6, 20)))
+
+    def test_empty(self):
+        self.assert_matches("", list(range(1, 21)))
+        self.assert_matches("!", list(range(1, 21)))
+
+    def test_cached(self):
+        self.assertIs(compile_peerspec("1-5000"), compile_peerspec("1-5000"))
+
+    def test_for_this_peer(self):
+        runner = ScenarioRunner()
+        runner.set_peernumber(4)
+        self.assertTrue(runner._parse_for_this_peer("!1-3,5-5000"))
+        self.assertFalse(runner._parse_for_this_peer("5-5000"))
+        self.assertTrue(runner._parse_for_this_peer("$peers"))
@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from gumby.scenario import ScenarioRunner
+
+
+class TestScenarioCache(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.test_dir, "cache")
+        os.mkdir(self.cache_dir)
+        self.env_patch = patch.dict(os.environ, {"SCENARIO_CACHE_DIR": self.cache_dir})
+        self.env_patch.start()
+
+        self.scenario_file = self.write_file("test.scenario", "&include included.scenario\n"
+                                                              "&module some_module\n"
+                                                              "@0:1 echo hello {1-3}\n")
+        self.write_file("included.scenario", "@0:2 echo included\n")
+
+    def tearDown(self):
+        self.env_patch.stop()
+        shutil.rmtree(self.test_dir)
+
+    def write_file(self, name, content):
+        file_path = os.path.join(self.test_dir, name)
+        with open(file_path, "w") as scenario_file:
+            scenario_file.write(content)
+        return file_path
+
+    def read_scenario(self):
+        runner = ScenarioRunner()
+        runner.modules = []
+        runner.preprocessor_callbacks["module"] = lambda filename, line_number, line: runner.modules.append(line)
+        runner.add_scenario(self.scenario_file)
+        return runner
+
+    def test_cached_scenario(self):
+        """
+        Test whether a cached scenario is read without reading the scenario files, and still runs its directives
+        """
+        runner = self.read_scenario()
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
+
+        with patch.object(ScenarioRunner, "_read_scenario", side_effect=AssertionError):
+            cached_runner = self.read_scenario()
+
+        self.assertEqual(cached_runner.line_buffer, runner.line_buffer)
+        self.assertEqual([line.strip() for _, _, line, _ in runner.line_buffer],
+                         ["@0:2 echo included", "@0:1 echo hello"])
+        self.assertEqual(runner.line_buffer[1][3], "1-3")
+        self.assertEqual(cached_runner.modules, ["some_module"])
+
+    def test_invalidate_cache(self):
+        """
+        Test whether the cache is not used after an included file changes
+        """
+        self.read_scenario()
+        self.write_file("included.scenario", "@0:2 echo changed\n@0:3 echo lines\n")
+
+        runner = self.read_scenario()
+        self.assertEqual(runner.line_buffer[1][2], "@0:3 echo lines")
+
+    def test_invalidate_cache_include(self):
+        """
+        Test whether the cache is not used after an include resolves to another file
+        """
+        self.write_file("test.scenario", "&include $SCENARIO_PART.scenario\n")
+        self.write_file("other.scenario", "@0:3 echo other\n")
+        os.environ["SCENARIO_PART"] = "included"
+        self.read_scenario()
+
+        os.environ["SCENARIO_PART"] = "other"
+        runner = self.read_scenario()
+        self.assertEqual([line for _, _, line, _ in runner.line_buffer], ["@0:3 echo other"])
+
+    def test_cache_disabled(self):
+        """
+        Test whether scenarios are not cached unless SCENARIO_CACHE_DIR is set
+        """
+        del os.environ["SCENARIO_CACHE_DIR"]
+        with patch("gumby.scenario.ScenarioParser._store_cached_scenario", side_effect=AssertionError):
+            runner = self.read_scenario()
+        self.assertEqual(len(runner.line_buffer), 2)
+        self.assertFalse(os.listdir(self.cache_dir))
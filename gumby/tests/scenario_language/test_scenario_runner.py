@@ -0,0 +1,139 @@
+import os
+import shutil
+import tempfile
+import unittest
+from asyncio import new_event_loop, set_event_loop, sleep
+from time import time
+
+from gumby.scenario import Pacing, ScenarioRunner
+
+
+class TestScenarioRunner(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.loop = new_event_loop()
+        set_event_loop(self.loop)
+        self.calls = []
+
+        self.runner = ScenarioRunner()
+        self.runner.set_peernumber(2)
+        self.runner.register(self.record)
+        self.runner.register(self.record_async)
+
+    def tearDown(self):
+        self.loop.close()
+        shutil.rmtree(self.test_dir)
+
+    def record(self, value):
+        self.calls.append(value)
+
+    async def record_async(self, value):
+        self.calls.append(value)
+
+    def write_scenario(self, content):
+        scenario_path = os.path.join(self.test_dir, "test.scenario")
+        with open(scenario_path, "w") as scenario_file:
+            scenario_file.write(content)
+        self.runner.add_scenario(scenario_path)
+
+    def run_scenario(self, duration):
+        self.runner.run()
+        self.loop.run_until_complete(sleep(duration))
+
+    def test_timeline_order(self):
+        """
+        Test whether events are fired in timestamp order, and in scenario order for equal timestamps
+        """
+        self.write_scenario("@0:0.2 record c\n"
+                            "@0:0.1 record a\n"
+                            "@0:0.1 record_async b\n"
+                            "@0:0.1 record d {1}\n"
+                            "@0:0.2 record e {!1}\n")
+        self.run_scenario(0.4)
+
+        self.assertEqual(["a", "b", "c", "e"], self.calls)
+        self.assertFalse(self.runner.timeline)
+        self.assertEqual(4, len(self.runner.dispatch_log))
+
+    def test_immediate_call(self):
+        """
+        Test whether @! events are called while compiling the timeline
+        """
+        self.write_scenario("@0:0.1 record b\n"
+                            "@! record a\n")
+        self.runner.run()
+        self.assertEqual(["a"], self.calls)
+        self.loop.run_until_complete(sleep(0.2))
+        self.assertEqual(["a", "b"], self.calls)
+
+    def test_dispatch_log(self):
+        """
+        Test whether the scheduled and actual fire times of events are recorded
+        """
+        self.write_scenario("@0:0.1 record a\n")
+        self.runner.exp_start_time = time()
+        self.run_scenario(0.2)
+
+        _, line_number, clb, scheduled, actual, duration = self.runner.dispatch_log[0]
+        self.assertEqual(1, line_number)
+        self.assertEqual("record", clb)
+        self.assertGreaterEqual(actual, scheduled)
+        self.assertGreaterEqual(duration, 0)
+
+        log_path = os.path.join(self.test_dir, "scenario_dispatch.csv")
+        self.runner.write_dispatch_log(log_path)
+        with open(log_path) as log_file:
+            self.assertEqual(2, len(log_file.readlines()))
+
+    def test_every(self):
+        """
+        Test whether a line with a time range and every is called repeatedly until the end of the range
+        """
+        self.write_scenario("@0:0.1-0:0.3 every 0.02 record a\n"
+                            "@0:0.1-0:0.3 every 0.02 record b {1}\n")
+        self.run_scenario(0.4)
+
+        self.assertEqual(["a"] * 10, self.calls)
+        self.assertEqual(1, len(self.runner.pacers))
+
+        # The calls of repeated lines are summarised instead of logged one by one
+        self.assertFalse(self.runner.dispatch_log)
+        stats = list(self.runner.pacing_stats.values())
+        self.assertEqual(1, len(stats))
+        self.assertEqual(10, stats[0].calls)
+        self.assertEqual(10, sum(stats[0].delay_histogram))
+        self.assertEqual(10, stats[0].finished)
+
+        log_path = os.path.join(self.test_dir, "scenario_pacing.csv")
+        self.runner.write_pacing_log(log_path)
+        with open(log_path) as log_file:
+            lines = log_file.read().splitlines()
+        self.assertEqual(2, len(lines))
+        self.assertEqual(lines[1].split(",")[1:4], ["1", "record", "10"])
+
+    def test_invalid_pacing(self):
+        """
+        Test whether lines with a time range but without a valid pacing are rejected
+        """
+        self.write_scenario("@0:0.1-0:0.3 record a\n"
+                            "@0:0.3-0:0.1 every 0.02 record a\n"
+                            "@0:0.1-0:0.3 rate fast record a\n")
+        self.run_scenario(0.4)
+
+        self.assertFalse(self.calls)
+
+    def test_pacing_rate(self):
+        """
+        Test whether the number and the spacing of calls follow the rate
+        """
+        self.assertEqual([0.0, 0.5, 1.0, 1.5], list(Pacing(0, 2, 2, 2).call_times()))
+        self.assertEqual([], list(Pacing(0, 2, 0, 0).call_times()))
+
+        # A ramp from 0 to 100 calls per second over 10 seconds makes about 500 calls, with most calls at the end
+        call_times = list(Pacing(0, 10, 0, 100).call_times())
+        self.assertEqual(500, len(call_times))
+        self.assertEqual(375, len([call_time for call_time in call_times if call_time >= 5]))
+
+        call_times = list(Pacing(0, 100, 50, 50, poisson=True).call_times())
+        self.assertAlmostEqual(5000, len(call_times), delta=400)
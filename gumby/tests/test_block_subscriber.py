@@ -0,0 +1,100 @@
+import os
+import shutil
+import tempfile
+import unittest
+from asyncio import all_tasks, gather, new_event_loop, set_event_loop, sleep
+
+from gumby.block_subscriber import BlockSubscriber
+
+
+class MockBlockSubscriber(BlockSubscriber):
+
+    def __init__(self, **kwargs):
+        super(MockBlockSubscriber, self).__init__(poll_interval=0.01, **kwargs)
+        self.chain = []
+        self.next_block_nr = 0
+        self.fail = False
+
+    async def fetch_blocks(self):
+        if self.fail:
+            raise RuntimeError("Node not available")
+        # Fetch at most two blocks at a time
+        blocks = self.chain[self.next_block_nr:self.next_block_nr + 2]
+        self.next_block_nr += len(blocks)
+        return blocks
+
+
+class TestBlockSubscriber(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = new_event_loop()
+        set_event_loop(self.loop)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.subscriber = MockBlockSubscriber(blocks_filename=os.path.join(self.tmp_dir, "blocks.txt"),
+                                              confirmations_filename=os.path.join(self.tmp_dir, "confirmed.txt"))
+        self.confirmed = []
+        self.subscriber.confirmed_callback = lambda tx_id, block_time: self.confirmed.append(tx_id)
+
+    def tearDown(self):
+        pending = all_tasks(self.loop)
+        for task in pending:
+            task.cancel()
+        self.loop.run_until_complete(gather(*pending, return_exceptions=True))
+        self.loop.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def add_block(self, tx_ids):
+        block_nr = len(self.subscriber.chain) + 1
+        self.subscriber.chain.append((1000 + block_nr, tx_ids, {"number": block_nr}))
+
+    def read(self, filename):
+        with open(os.path.join(self.tmp_dir, filename)) as in_file:
+            return in_file.read()
+
+    def test_streaming(self):
+        """
+        Test whether confirmations are written while the blocks arrive, also after the node was unavailable
+        """
+        self.subscriber.start()
+        for block_nr in range(5):
+            self.add_block(["tx%d" % block_nr])
+        self.loop.run_until_complete(sleep(0.02))
+        self.assertEqual(self.read("confirmed.txt").count("\n"), 5)
+
+        self.subscriber.fail = True
+        self.add_block(["tx5"])
+        self.loop.run_until_complete(sleep(0.03))
+        self.subscriber.fail = False
+        self.loop.run_until_complete(sleep(0.02))
+        self.assertEqual(self.confirmed, ["tx%d" % block_nr for block_nr in range(6)])
+        self.assertIn("tx5,1006000\n", self.read("confirmed.txt"))
+
+    def test_tracked_transactions(self):
+        """
+        Test whether only the tracked transactions are confirmed, and missing blocks are fetched when stopping
+        """
+        self.subscriber.track("b")
+        self.subscriber.track("d")
+        self.subscriber.start()
+        for tx_ids in (["a", "b"], ["c"], ["d", "e"], [], ["f"]):
+            self.add_block(tx_ids)
+        self.loop.run_until_complete(self.subscriber.stop())
+
+        self.assertEqual(self.confirmed, ["b", "d"])
+        self.assertEqual(self.subscriber.tracked_transactions, set())
+        self.assertEqual(self.read("blocks.txt").count("\n"), 5)
+
+    def test_track_transactions(self):
+        """
+        Test whether a subscriber that tracks transactions records nothing before the first transaction is tracked
+        """
+        subscriber = MockBlockSubscriber(track_transactions=True)
+        subscriber.confirmed_callback = lambda tx_id, block_time: self.confirmed.append(tx_id)
+        subscriber.chain = [(1001, ["a"], None), (1002, ["b"], None)]
+        self.loop.run_until_complete(subscriber.poll())
+        subscriber.track("c")
+        subscriber.chain.append((1003, ["c", "d"], None))
+        self.loop.run_until_complete(subscriber.poll())
+
+        self.assertEqual(self.confirmed, ["c"])
+        self.assertEqual(subscriber.num_blocks, 3)
@@ -0,0 +1,111 @@
+import unittest
+from asyncio import all_tasks, gather, new_event_loop, set_event_loop, sleep
+
+from gumby.direct_messages import DirectMessageEndpoint
+
+
+class MockClient:
+
+    def __init__(self, my_id, all_vars):
+        self.my_id = my_id
+        self.all_vars = all_vars
+        self.received = []
+        self.sent_via_server = []
+
+    def proto_running(self, line):
+        self.received.append(line)
+
+    def send_message_via_server(self, peer_id, msg_type, msg):
+        self.sent_via_server.append((peer_id, msg_type, msg))
+
+
+class TestDirectMessages(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = new_event_loop()
+        set_event_loop(self.loop)
+
+        self.all_vars = {}
+        self.clients = [MockClient(peer_id, self.all_vars) for peer_id in (1, 2)]
+        self.endpoints = [DirectMessageEndpoint(client) for client in self.clients]
+        for client, endpoint in zip(self.clients, self.endpoints):
+            self.all_vars[str(client.my_id)] = {"host": "127.0.0.1", "msg_port": str(endpoint.listen())}
+
+    def tearDown(self):
+        for endpoint in self.endpoints:
+            endpoint.close()
+        pending = all_tasks(self.loop)
+        for task in pending:
+            task.cancel()
+        self.loop.run_until_complete(gather(*pending, return_exceptions=True))
+        self.loop.close()
+
+    def test_direct_messages(self):
+        """
+        Test whether messages are sent directly, in order, over a single connection
+        """
+        async def send_messages():
+            for index in range(5):
+                self.endpoints[0].send_message(2, b"test", b"%d" % index)
+            await sleep(0.1)
+            self.endpoints[0].send_message(2, b"test", b"5")
+            await sleep(0.1)
+
+        self.loop.run_until_complete(send_messages())
+
+        self.assertEqual(self.clients[1].received, [b"msg:1:test:%d" % index for index in range(6)])
+        self.assertEqual(len(self.endpoints[0].connections), 1)
+        self.assertFalse(self.clients[0].sent_via_server)
+
+    def test_close(self):
+        """
+        Test whether closing an endpoint closes its server and all its connections
+        """
+        async def send_and_close():
+            self.endpoints[0].send_message(2, b"test", b"0")
+            await sleep(0.1)
+            server = self.endpoints[1].server_task.result()
+            self.endpoints[1].close()
+            await sleep(0.1)
+            self.assertFalse(server.is_serving())
+
+        self.loop.run_until_complete(send_and_close())
+        self.assertFalse(self.endpoints[1].protocols)
+        self.assertFalse(self.endpoints[0].connections)
+
+    def test_fallback_to_server(self):
+        """
+        Test whether messages are sent through the sync server if a peer is unreachable or has no message port
+        """
+        self.all_vars["2"]["msg_port"] = "1"
+        self.all_vars["3"] = {"host": "127.0.0.1"}
+
+        async def send_messages():
+            self.endpoints[0].send_message(2, b"test", b"a")
+            self.endpoints[0].send_message(3, b"test", b"b")
+            await sleep(0.5)
+
+        self.loop.run_until_complete(send_messages())
+
+        self.assertEqual(sorted(self.clients[0].sent_via_server), [(2, b"test", b"a"), (3, b"test", b"b")])
+        self.assertIn(2, self.endpoints[0].unreachable_peers)
+
+    def test_closing_connection(self):
+        """
+        Test whether a message to a peer whose connection is closing is sent through the sync server, and the next
+        message over a new connection
+        """
+        async def send_messages():
+            self.endpoints[0].send_message(2, b"test", b"a")
+            await sleep(0.1)
+            self.endpoints[0].connections[2].transport.close()
+            self.endpoints[0].send_message(2, b"test", b"b")
+            await sleep(0.1)
+            self.endpoints[0].send_message(2, b"test", b"c")
+            await sleep(0.1)
+
+        self.loop.run_until_complete(send_messages())
+
+        self.assertEqual(self.clients[0].sent_via_server, [(2, b"test", b"b")])
+        self.assertEqual(self.clients[1].received, [b"msg:1:test:a", b"msg:1:test:c"])
+        self.assertEqual(len(self.endpoints[0].connections), 1)
@@ -1,9 +1,18 @@
+import json
 import os
 import shutil
+import struct
 import tempfile
 import unittest
 
-from gumby.process_guard_stats_parser import ResourceUsageParser
+import numpy
+
+from experiments.ipv8.parse_ipv8_statistics import IPv8StatisticsParser
+
+from gumby.process_guard import BINARY_RECORD_FIELDS, BINARY_RECORD_FORMAT
+from gumby.process_guard_stats_parser import PROCFS_RSS, RESOURCE_FIELDS, RESOURCE_METRICS, ResourceUsageParser, \
+    ResourceUsageStatisticsParser
+from gumby.statsparser import ProfileCollector, run_parsers
 
 
 class TestExtractProcessGuardStats(unittest.TestCase):
@@ -23,13 +32,118 @@ class TestExtractProcessGuardStats(unittest.TestCase):
         """
         parser = ResourceUsageParser(self.PROCESS_GUARD_INPUT_DIR, self.test_dir)
         parser.parse_resource_files()
+        parser.export_text()
 
         self.assertEqual(len(parser.all_nodes), 2)
 
         file_prefixes = ["utimes", "stimes", "wchars", "rchars", "wchars_sum", "rchars_sum", "vsizes", "rsizes",
                          "writebytes", "readbytes", "writebytes_sum", "readbytes_sum", "threads"]
         for prefix in file_prefixes:
+            for node in parser.all_nodes:
+                self.assertTrue(os.path.exists(os.path.join(self.test_dir, "resource_usage", node, "%s.npy" % prefix)))
             self.assertTrue(os.path.exists(os.path.join(self.test_dir, "%s.txt" % prefix)))
             self.assertTrue(os.path.exists(os.path.join(self.test_dir, "%s_node.txt" % prefix)))
 
         self.assertTrue(os.path.exists(os.path.join(self.test_dir, "axis_stats.txt")))
+
+    def test_run_with_other_parsers(self):
+        """
+        Test parsing the resources together with the steps of other statistics parsers
+        """
+        shutil.copytree(os.path.join(self.PROCESS_GUARD_INPUT_DIR, "localhost"),
+                        os.path.join(self.test_dir, "localhost"))
+        os.mkdir(os.path.join(self.test_dir, "1"))
+        shutil.copy(os.path.join(self.TESTS_DIR, "data", "stats1.txt"),
+                    os.path.join(self.test_dir, "1", "ipv8_statistics.txt"))
+        with open(os.path.join(self.test_dir, "1", "yappi.stats"), "w") as profile_file:
+            profile_file.write("profile")
+
+        current_dir = os.getcwd()
+        os.chdir(self.test_dir)
+        try:
+            run_parsers([IPv8StatisticsParser("."), ResourceUsageStatisticsParser("."), ProfileCollector(".")],
+                        workers=2)
+        finally:
+            os.chdir(current_dir)
+
+        for filename in ["axis_stats.txt", "threads_node.txt", "ipv8_msg_stats.csv",
+                         os.path.join("profile", "1.stats")]:
+            self.assertTrue(os.path.exists(os.path.join(self.test_dir, filename)))
+
+    def test_parse_resources_columnar(self):
+        """
+        Test whether the columnar output holds a (time x pid) matrix for every node.
+        """
+        parser = ResourceUsageParser(self.PROCESS_GUARD_INPUT_DIR, self.test_dir, workers=1)
+        parser.parse_resource_files()
+
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, "utimes.txt")))
+        for summary in parser.node_summaries:
+            node_dir = os.path.join(self.test_dir, "resource_usage", summary["node"])
+            times = numpy.load(os.path.join(node_dir, "times.npy"))
+            threads = numpy.load(os.path.join(node_dir, "threads.npy"))
+            threads_node = numpy.load(os.path.join(node_dir, "threads_node.npy"))
+            self.assertEqual((len(times), len(summary["pids"])), threads.shape)
+            self.assertEqual(numpy.nansum(threads[0]), threads_node[0])
+
+    def test_parse_resources_binary(self):
+        """
+        Test whether parsing a binary resource usage file gives the same results as parsing the text file.
+        """
+        text_dir = os.path.join(self.PROCESS_GUARD_INPUT_DIR, "localhost", "node321")
+        binary_dir = os.path.join(self.test_dir, "input", "node321")
+        os.makedirs(binary_dir)
+
+        # Convert the text log to the binary format written by process_guard.py --binary
+        record_struct = struct.Struct(BINARY_RECORD_FORMAT)
+        with open(os.path.join(text_dir, "resource_usage.log")) as text_file, \
+                open(os.path.join(binary_dir, "resource_usage.bin"), "wb") as binary_file:
+            metainfo = json.loads(text_file.readline())
+            metainfo.update({"format": "binary", "fields": BINARY_RECORD_FIELDS, "byteorder": "<"})
+            binary_file.write(json.dumps(metainfo).encode() + b"\n")
+            for line in text_file:
+                parts = line.split()
+                binary_file.write(record_struct.pack(float(parts[0]), int(parts[1]), parts[2][1:-1].encode(),
+                                                     *[int(parts[field]) for field in RESOURCE_FIELDS]))
+
+        text_parser = ResourceUsageParser(text_dir, os.path.join(self.test_dir, "text"), workers=1)
+        text_parser.parse_resource_files()
+        binary_parser = ResourceUsageParser(os.path.join(self.test_dir, "input"),
+                                            os.path.join(self.test_dir, "binary"), workers=1)
+        binary_parser.parse_resource_files()
+
+        self.assertEqual(text_parser.all_pids, binary_parser.all_pids)
+        for metric in RESOURCE_METRICS:
+            text_matrix = numpy.load(os.path.join(self.test_dir, "text", "resource_usage", "node321",
+                                                  "%s.npy" % metric))
+            binary_matrix = numpy.load(os.path.join(self.test_dir, "binary", "resource_usage", "node321",
+                                                    "%s.npy" % metric))
+            numpy.testing.assert_array_equal(text_matrix, binary_matrix)
+
+    def test_interpolate_skipped_samples(self):
+        """
+        Test whether samples that process guard skipped are interpolated.
+        """
+        node_dir = os.path.join(self.test_dir, "input", "node1")
+        os.makedirs(node_dir)
+
+        def resource_line(timestamp, rss):
+            parts = [str(timestamp), "1234", "(python3)"] + ["0"] * 57
+            parts[PROCFS_RSS] = str(rss)
+            return ' '.join(parts) + "\n"
+
+        with open(os.path.join(node_dir, "resource_usage.log"), "w") as resource_file:
+            resource_file.write(json.dumps({"sc_clk_tck": 100.0, "pagesize": 1048576}) + "\n")
+            resource_file.write(resource_line(100.0, 10))
+            resource_file.write(resource_line(110.0, 30))
+        with open(os.path.join(node_dir, "resource_usage_skipped.log"), "w") as skipped_file:
+            skipped_file.write("110.0 1 5.0\n")
+
+        parser = ResourceUsageParser(os.path.join(self.test_dir, "input"), self.test_dir, workers=1)
+        parser.parse_resource_files()
+
+        self.assertEqual(1, parser.node_summaries[0]["skipped_samples"])
+        times = numpy.load(os.path.join(self.test_dir, "resource_usage", "node1", "times.npy"))
+        rsizes = numpy.load(os.path.join(self.test_dir, "resource_usage", "node1", "rsizes.npy"))
+        numpy.testing.assert_array_equal([0, 5, 10], times)
+        numpy.testing.assert_array_equal([[10], [20], [30]], rsizes)
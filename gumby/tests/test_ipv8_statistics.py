@@ -0,0 +1,79 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+from experiments.ipv8.parse_ipv8_statistics import IPv8StatisticsParser
+
+from gumby.ipv8_statistics import IPv8StatisticsRecorder, read_ipv8_statistics
+
+
+def create_statistics(counters):
+    return {prefix: {msg_id: SimpleNamespace(num_up=num_up, num_down=num_down, bytes_up=bytes_up,
+                                             bytes_down=bytes_down)
+                     for msg_id, (num_up, num_down, bytes_up, bytes_down) in messages.items()}
+            for prefix, messages in counters.items()}
+
+
+class TestIPv8StatisticsRecorder(unittest.TestCase):
+
+    # The counters of two overlays, at four ticks
+    TICKS = [(1.0, {b"\x01": {1: (1, 0, 10, 0)}}),
+             (2.0, {b"\x01": {1: (1, 0, 10, 0), 2: (0, 1, 0, 20)}, b"\x02": {1: (3, 0, 30, 0)}}),
+             (3.0, {b"\x01": {1: (1, 0, 10, 0), 2: (0, 1, 0, 20)}, b"\x02": {1: (3, 0, 30, 0)}}),
+             (6.0, {b"\x01": {1: (2, 0, 20, 0), 2: (0, 1, 0, 20)}, b"\x02": {1: (3, 0, 30, 0)}})]
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.test_dir, "1"))
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def record(self):
+        recorder = IPv8StatisticsRecorder(os.path.join(self.test_dir, "1", "ipv8_statistics.csv"),
+                                          os.path.join(self.test_dir, "1", "ipv8_statistics_keys.csv"))
+        for tick_time, counters in self.TICKS:
+            recorder.record(tick_time, create_statistics(counters))
+        recorder.close()
+
+    def test_record_deltas(self):
+        """
+        Test that only changed counters are written, and that the full time series can be rebuilt from them
+        """
+        self.record()
+        with open(os.path.join(self.test_dir, "1", "ipv8_statistics.csv")) as deltas_file:
+            lines = deltas_file.read().splitlines()
+        self.assertEqual(lines, ["time,key,num_up,num_down,bytes_up,bytes_down", "1.000,0,1,0,10,0",
+                                 "2.000,1,0,1,0,20", "2.000,2,3,0,30,0", "3.000,-1,0,0,0,0", "6.000,0,1,0,10,0"])
+
+        times, msg_ids, counters = read_ipv8_statistics(os.path.join(self.test_dir, "1", "ipv8_statistics.csv"))
+        self.assertEqual(times.tolist(), [1.0, 2.0, 3.0, 6.0])
+        self.assertEqual(msg_ids, ["1", "2"])
+        self.assertEqual(counters.tolist(), [[[1, 0, 10, 0], [0, 0, 0, 0]],
+                                             [[4, 0, 40, 0], [0, 1, 0, 20]],
+                                             [[4, 0, 40, 0], [0, 1, 0, 20]],
+                                             [[5, 0, 50, 0], [0, 1, 0, 20]]])
+
+    def test_parse_deltas(self):
+        """
+        Test that the parser aggregates recorded deltas like the statistics written as JSON
+        """
+        self.record()
+        IPv8StatisticsParser(self.test_dir).aggregate_messages()
+        with open(os.path.join(self.test_dir, "ipv8_msg_stats.csv")) as output_file:
+            delta_lines = output_file.read().splitlines()
+
+        json_dir = os.path.join(self.test_dir, "json")
+        os.makedirs(os.path.join(json_dir, "1"))
+        with open(os.path.join(json_dir, "1", "ipv8_statistics.txt"), "w") as stats_file:
+            for tick_time, counters in self.TICKS:
+                stats = {prefix.hex(): {str(msg_id): vars(msg_stats) for msg_id, msg_stats in messages.items()}
+                         for prefix, messages in create_statistics(counters).items()}
+                stats_file.write(json.dumps({"time": tick_time, "stats": stats}) + "\n")
+        IPv8StatisticsParser(json_dir).aggregate_messages()
+        with open(os.path.join(json_dir, "ipv8_msg_stats.csv")) as output_file:
+            self.assertEqual(output_file.read().splitlines(), delta_lines)
+        self.assertEqual(delta_lines[-2:], ["5,1,4,0,40,0", "5,2,0,1,0,20"])
@@ -0,0 +1,82 @@
+import unittest
+import zlib
+
+from gumby.line_receiver import LineReceiver
+
+
+class MockTransport:
+
+    def is_closing(self):
+        return False
+
+
+class RecordingLineReceiver(LineReceiver):
+    MAX_LENGTH = 100
+
+    def __init__(self):
+        super().__init__()
+        self.transport = MockTransport()
+        self.received = []
+        self.exceeded = None
+
+    def line_received(self, line):
+        self.received.append(line)
+        if line.startswith(b"frame:"):
+            self.expect_raw_data(int(line.split(b':')[2]))
+
+    def raw_data_received(self, data):
+        self.received.append(zlib.decompress(data))
+
+    def line_length_exceeded(self, line):
+        self.exceeded = line
+
+
+class TestLineReceiver(unittest.TestCase):
+
+    def setUp(self):
+        self.receiver = RecordingLineReceiver()
+
+    def feed(self, data, chunk_size):
+        for index in range(0, len(data), chunk_size):
+            self.receiver.data_received(data[index:index + chunk_size])
+
+    def test_fragmented_lines(self):
+        """
+        Test whether lines are split correctly, regardless of how the data is fragmented
+        """
+        lines = [b"line %d" % index * (index % 7) for index in range(50)]
+        data = b"".join(line + b"\r\n" for line in lines)
+        for chunk_size in (1, 2, 3, 64, len(data)):
+            self.receiver.received = []
+            self.feed(data, chunk_size)
+            self.assertEqual(self.receiver.received, lines)
+
+    def test_partial_line(self):
+        """
+        Test whether a partial line is kept until its delimiter arrives
+        """
+        self.receiver.data_received(b"first\r\nsec")
+        self.receiver.data_received(b"ond\r")
+        self.assertEqual(self.receiver.received, [b"first"])
+        self.receiver.data_received(b"\nthird")
+        self.assertEqual(self.receiver.received, [b"first", b"second"])
+
+    def test_raw_frame(self):
+        """
+        Test whether a frame is passed on as a whole, and lines are split again afterwards
+        """
+        payload = zlib.compress(b"x" * 1000)
+        data = b"frame:zlib:%d\r\n" % len(payload) + payload + b"after\r\n"
+        self.feed(data, 5)
+        self.assertEqual(self.receiver.received, [b"frame:zlib:%d" % len(payload), b"x" * 1000, b"after"])
+
+    def test_line_length_exceeded(self):
+        """
+        Test whether a line longer than MAX_LENGTH is reported, also when its delimiter has not arrived yet
+        """
+        self.receiver.data_received(b"y" * 150)
+        self.assertEqual(self.receiver.exceeded, b"y" * 150)
+
+        self.receiver.exceeded = None
+        self.receiver.data_received(b"z" * 101 + b"\r\nnext")
+        self.assertEqual(self.receiver.exceeded, b"z" * 101 + b"\r\nnext")
@@ -0,0 +1,108 @@
+import os
+import unittest
+from asyncio import all_tasks, gather, new_event_loop, set_event_loop, sleep
+from itertools import islice
+from tempfile import mkstemp
+
+from gumby.load_generator import ACKED, CONFIRMED, ConstantArrivals, LoadGenerator, PoissonArrivals, \
+    StepRampArrivals, TraceArrivals
+
+
+class TestArrivalProcesses(unittest.TestCase):
+
+    def test_constant(self):
+        self.assertEqual(list(islice(ConstantArrivals(4, phase=0.5).offsets(), 3)), [0.5, 0.75, 1.0])
+
+    def test_poisson(self):
+        """
+        Test whether the Poisson arrivals have the configured average rate, and are reproducible
+        """
+        offsets = list(islice(PoissonArrivals(100, seed=42).offsets(), 10000))
+        self.assertAlmostEqual(len(offsets) / offsets[-1], 100, delta=5)
+        self.assertEqual(offsets[:10], list(islice(PoissonArrivals(100, seed=42).offsets(), 10)))
+
+    def test_step_ramp(self):
+        """
+        Test whether the rate increases every step, until the maximum rate
+        """
+        offsets = list(islice(StepRampArrivals(2, 2, 1, max_rate=4).offsets(), 14))
+        counts = [sum(1 for offset in offsets if step <= offset < step + 1) for step in range(3)]
+        self.assertEqual(counts, [2, 4, 4])
+
+    def test_step_ramp_no_arrivals(self):
+        """
+        Test that there are no arrivals if the rate never becomes positive, or no more once it drops to zero
+        """
+        self.assertEqual(list(StepRampArrivals(0, 0, 1).offsets()), [])
+        self.assertEqual(list(StepRampArrivals(0, 2, 1, max_rate=0).offsets()), [])
+        self.assertEqual(list(StepRampArrivals(2, -1, 1).offsets()), [0, 0.5, 1])
+        self.assertEqual(list(islice(StepRampArrivals(-1, 1, 1).offsets(), 2)), [2, 3])
+
+    def test_trace(self):
+        """
+        Test whether a trace is split over multiple instances
+        """
+        handle, filename = mkstemp()
+        with os.fdopen(handle, "w") as trace_file:
+            trace_file.write("\n".join(str(100 + offset) for offset in [0, 0.5, 1, 1.5, 2]) + "\n")
+        try:
+            self.assertEqual(list(TraceArrivals.from_file(filename, index=1, stride=2).offsets()), [0.5, 1.5])
+        finally:
+            os.remove(filename)
+
+
+class TestLoadGenerator(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = new_event_loop()
+        set_event_loop(self.loop)
+
+    def tearDown(self):
+        pending = all_tasks(self.loop)
+        for task in pending:
+            task.cancel()
+        self.loop.run_until_complete(gather(*pending, return_exceptions=True))
+        self.loop.close()
+
+    def run_load(self, load_generator, duration):
+        load_generator.start()
+        self.loop.run_until_complete(sleep(duration))
+        load_generator.stop()
+
+    def test_open_loop(self):
+        """
+        Test whether requests are submitted on schedule while earlier requests are in flight, up to the window
+        """
+        async def submit():
+            await sleep(0.1)
+
+        load_generator = LoadGenerator(submit, ConstantArrivals(100), max_in_flight=5, capacity=4)
+        self.run_load(load_generator, 0.305)
+
+        stats = load_generator.get_stats()
+        self.assertEqual(stats["requests"], 31)
+        self.assertGreater(stats["dropped"], 10)
+        self.assertEqual(stats["submitted"] + stats["dropped"], stats["requests"])
+        self.assertAlmostEqual(stats["offered_rate"], 100, delta=10)
+
+    def test_confirm(self):
+        """
+        Test whether requests are confirmed by the ID returned by the submit function
+        """
+        ids = iter(range(100))
+
+        def submit():
+            request_id = next(ids)
+            if request_id == 1:
+                raise RuntimeError("Failed to submit")
+            return "tx%d" % request_id
+
+        load_generator = LoadGenerator(submit, TraceArrivals([0, 0.01, 0.02]))
+        self.run_load(load_generator, 0.05)
+        self.assertTrue(load_generator.confirm("tx2"))
+        self.assertFalse(load_generator.confirm("tx1"))
+
+        timestamps = load_generator.timestamps[:load_generator.num_requests]
+        self.assertEqual(load_generator.failed, 1)
+        self.assertEqual(list(timestamps[:, ACKED] > 0), [True, False, True])
+        self.assertEqual(list(timestamps[:, CONFIRMED] > 0), [False, False, True])
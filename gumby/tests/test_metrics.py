@@ -0,0 +1,69 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+from asyncio import new_event_loop, set_event_loop, sleep
+
+from gumby.metrics import MetricsSink
+
+
+class TestMetricsSink(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.test_dir, "metrics.csv")
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def read_lines(self):
+        with open(self.filename) as metrics_file:
+            return metrics_file.read().splitlines()
+
+    def test_buffered_writes(self):
+        """
+        Test that writes are buffered until the buffer is full or the sink is flushed or closed
+        """
+        sink = MetricsSink(flush_interval=0, max_buffered=3)
+        sink.open(self.filename, "w").write("time,value\n")
+        sink.write(self.filename, "1,1\n")
+        self.assertFalse(os.path.exists(self.filename))
+
+        sink.write(self.filename, "2,2\n")
+        self.assertEqual(self.read_lines(), ["time,value", "1,1", "2,2"])
+
+        writer = csv.writer(sink.open(self.filename))
+        writer.writerow([3, "a,b"])
+        sink.flush()
+        self.assertEqual(self.read_lines()[-1], '3,"a,b"')
+
+        sink.close()
+        sink.write(self.filename, "4,4\n")
+        sink.close()
+        self.assertEqual(len(self.read_lines()), 5)
+
+        sink.write(self.filename, "5,5\n")
+        sink.open(self.filename, "w").write("time,value\n")
+        sink.close()
+        self.assertEqual(self.read_lines(), ["time,value"])
+
+    def test_periodic_flush(self):
+        """
+        Test that the buffers are flushed periodically while the event loop runs
+        """
+        loop = new_event_loop()
+        set_event_loop(loop)
+        sink = MetricsSink(flush_interval=0.05)
+
+        async def write_metrics():
+            sink.write(self.filename, "1,1\n")
+            self.assertFalse(os.path.exists(self.filename))
+            await sleep(0.15)
+
+        try:
+            loop.run_until_complete(write_metrics())
+            self.assertEqual(self.read_lines(), ["1,1"])
+        finally:
+            sink.close()
+            loop.close()
@@ -0,0 +1,79 @@
+import unittest
+from asyncio import all_tasks, gather, new_event_loop, set_event_loop, sleep
+
+from gumby.load_generator import ConstantArrivals, LoadGenerator
+from gumby.mock_chain import MockChain, MockChainNode
+from gumby.rpc_client import RPCClientPool, RPCError
+
+
+class TestMockChain(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = new_event_loop()
+        set_event_loop(self.loop)
+        self.chain = MockChain(latency=0.05, capacity=100, block_interval=0.1, mempool_size=25)
+        self.node = MockChainNode(self.chain)
+        self.url = "http://127.0.0.1:%d" % self.loop.run_until_complete(self.node.start("127.0.0.1", 0))
+        self.pool = RPCClientPool()
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.pool.close())
+        self.loop.run_until_complete(self.node.stop())
+        pending = all_tasks(self.loop)
+        for task in pending:
+            task.cancel()
+        self.loop.run_until_complete(gather(*pending, return_exceptions=True))
+        self.loop.close()
+
+    def test_capacity(self):
+        """
+        Test whether blocks hold at most the capacity of the chain, and transactions beyond the mempool are rejected
+        """
+        tx_ids = [self.chain.submit() for _ in range(30)]
+        self.assertEqual(tx_ids[25:], [None] * 5)
+        self.assertEqual(self.chain.get_status(tx_ids[0]), "Processing")
+
+        self.loop.run_until_complete(sleep(0.17))
+        self.assertEqual([len(tx_ids) for _, tx_ids, _ in self.chain.blocks], [10])
+        self.assertEqual(self.chain.get_status(tx_ids[0]), "Accepted")
+        self.assertEqual(self.chain.get_status(tx_ids[10]), "Processing")
+
+    def test_ethereum(self):
+        async def run():
+            tx_hash = await self.pool.call(self.url, "eth_sendTransaction", [{}])
+            receipt_before = await self.pool.call(self.url, "eth_getTransactionReceipt", [tx_hash])
+            await sleep(0.2)
+            receipt_after = await self.pool.call(self.url, "eth_getTransactionReceipt", [tx_hash])
+            return receipt_before, receipt_after
+
+        receipt_before, receipt_after = self.loop.run_until_complete(run())
+        self.assertIsNone(receipt_before)
+        self.assertEqual(receipt_after["status"], "0x1")
+
+    def test_avalanche(self):
+        async def run():
+            for _ in range(25):
+                await self.pool.call(self.url + "/ext/bc/X/wallet", "wallet.send", [{}])
+            with self.assertRaises(RPCError):
+                await self.pool.call(self.url + "/ext/bc/X/wallet", "wallet.send", [{}])
+
+        self.loop.run_until_complete(run())
+        self.assertEqual(self.chain.rejected, 1)
+
+    def test_load_generator(self):
+        """
+        Test whether the load generator submits transactions to the mock chain at the configured rate
+        """
+        async def transfer():
+            return await self.pool.call(self.url, "eth_sendTransaction", [{}])
+
+        self.chain.mempool_size = 1000
+        load_generator = LoadGenerator(transfer, ConstantArrivals(100))
+        load_generator.start()
+        self.loop.run_until_complete(sleep(0.295))
+        load_generator.stop()
+        self.loop.run_until_complete(sleep(0.05))
+
+        stats = load_generator.get_stats()
+        self.assertEqual(stats["acked"], 30)
+        self.assertEqual(len(self.chain.pending) + len(self.chain.confirm_times), 30)
@@ -1,7 +1,9 @@
+import json
 import os
 import shutil
 import tempfile
 import unittest
+from unittest.mock import patch
 
 from experiments.ipv8.parse_ipv8_statistics import IPv8StatisticsParser
 
@@ -33,3 +35,47 @@ class TestIPv8StatisticsParser(unittest.TestCase):
 
         stats_parser.aggregate_messages()
         self.assertTrue(os.path.exists(os.path.join(self.test_dir, "ipv8_msg_stats.csv")))
+
+    def write_samples(self):
+        samples = {"1": [(1, {"ov": {"1": (1, 0, 10, 0)}}), (6, {"ov": {"1": (2, 0, 20, 0)}})],
+                   "2": [(4, {"ov1": {"1": (0, 1, 0, 5)}, "ov2": {"1": (0, 1, 0, 5), "2": (1, 1, 1, 1)}})]}
+        for peer, peer_samples in samples.items():
+            os.mkdir(os.path.join(self.test_dir, peer))
+            with open(os.path.join(self.test_dir, peer, "ipv8_statistics.txt"), "w") as stats_file:
+                for stat_time, stats in reversed(peer_samples):
+                    stats = {prefix: {msg_id: dict(zip(("num_up", "num_down", "bytes_up", "bytes_down"), counters))
+                                      for msg_id, counters in msg_stats.items()}
+                             for prefix, msg_stats in stats.items()}
+                    stats_file.write(json.dumps({"time": stat_time, "stats": stats}) + "\n")
+
+    def test_aggregate_messages_buckets(self):
+        """
+        Test that each bucket sums the last statistics of every peer before the end of the bucket
+        """
+        self.write_samples()
+        stats_parser = IPv8StatisticsParser(self.test_dir)
+        with patch.dict(os.environ, {"IPV8_STATS_BUCKET_WIDTH": "2"}):
+            stats_parser.aggregate_messages()
+        with open(os.path.join(self.test_dir, "ipv8_msg_stats.csv")) as output_file:
+            lines = output_file.read().splitlines()
+        self.assertEqual(lines, ["time,msg_id,num_up,num_down,bytes_up,bytes_down",
+                                 "0,1,0,0,0,0", "0,2,0,0,0,0",
+                                 "2,1,1,0,10,0", "2,2,0,0,0,0",
+                                 "4,1,1,2,10,10", "4,2,1,1,1,1",
+                                 "6,1,2,2,20,10", "6,2,1,1,1,1"])
+
+    def test_aggregate_messages_fractional_buckets(self):
+        """
+        Test buckets that are not a whole number of seconds wide, with the files read by worker processes
+        """
+        self.write_samples()
+        stats_parser = IPv8StatisticsParser(self.test_dir)
+        stats_parser.step_workers = 2
+        with patch.dict(os.environ, {"IPV8_STATS_BUCKET_WIDTH": "2.5"}):
+            stats_parser.aggregate_messages()
+        with open(os.path.join(self.test_dir, "ipv8_msg_stats.csv")) as output_file:
+            lines = output_file.read().splitlines()
+        self.assertEqual(lines, ["time,msg_id,num_up,num_down,bytes_up,bytes_down",
+                                 "0,1,0,0,0,0", "0,2,0,0,0,0",
+                                 "2.5,1,1,0,10,0", "2.5,2,0,0,0,0",
+                                 "5,1,1,2,10,10", "5,2,1,1,1,1"])
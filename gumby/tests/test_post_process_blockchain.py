@@ -0,0 +1,63 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from gumby.post_process_blockchain import BlockchainTransactionsParser
+
+
+class RandomTransactionsParser(BlockchainTransactionsParser):
+
+    def parse_transactions(self):
+        rand = random.Random(42)
+        for tx_nr in range(5000):
+            submit_time = rand.randint(-500, 20000)
+            confirm_time = submit_time + rand.randint(0, 3000) if tx_nr % 10 else -1
+            latency = confirm_time - submit_time if confirm_time != -1 else -1
+            self.transactions.append((tx_nr % 4 + 1, "tx%d" % tx_nr, submit_time, confirm_time, latency))
+
+
+class TestBlockchainTransactionsParser(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.old_dir = os.getcwd()
+        os.chdir(self.test_dir)
+        self.parser = RandomTransactionsParser(self.test_dir)
+        self.parser.parse()
+
+    def tearDown(self):
+        os.chdir(self.old_dir)
+        shutil.rmtree(self.test_dir)
+
+    def test_cumulative_stats(self):
+        """
+        Test whether the cumulative counts match the number of transactions submitted and confirmed in every window
+        """
+        submit_times = [transaction[2] for transaction in self.parser.transactions]
+        confirm_times = [transaction[3] for transaction in self.parser.transactions if transaction[3] != -1]
+
+        self.assertEqual(self.parser.cumulative_stats[0].tolist(), [0, 0, 0])
+        self.assertEqual(self.parser.cumulative_stats[-1][0], 23000)
+        for window_end, submitted, confirmed in self.parser.cumulative_stats[1:].tolist():
+            self.assertEqual(submitted, sum(1 for submit_time in submit_times if submit_time <= window_end))
+            self.assertEqual(confirmed, sum(1 for confirm_time in confirm_times if confirm_time <= window_end))
+
+    def test_latencies(self):
+        """
+        Test the average, the percentiles and the histogram of the latencies of the confirmed transactions
+        """
+        latencies = sorted(transaction[4] for transaction in self.parser.transactions if transaction[4] != -1)
+
+        self.assertAlmostEqual(self.parser.avg_latency, sum(latencies) / len(latencies))
+        self.assertEqual([percentile for percentile, _ in self.parser.latency_percentiles], [50, 90, 99, 99.9])
+        self.assertAlmostEqual(self.parser.latency_percentiles[0][1], latencies[len(latencies) // 2], delta=5)
+        self.assertEqual(self.parser.latency_histogram[:, 1].sum(), len(latencies))
+        self.assertEqual(self.parser.latency_histogram[0].tolist(),
+                         [0, sum(1 for latency in latencies if latency < 100)])
+
+        with open("transactions.txt") as transactions_file:
+            lines = transactions_file.readlines()
+        self.assertEqual(len(lines), 5001)
+        self.assertEqual(lines[11], "3,tx10,%d,-1,-1\n" % self.parser.transactions[10][2])
@@ -0,0 +1,177 @@
+import json
+import os
+import shutil
+import signal
+import tempfile
+import unittest
+from time import sleep
+
+import numpy
+
+from gumby.process_guard import BINARY_RECORD_FIELDS, PGRP_SCAN_INTERVAL, ProcessMonitor, ResourceMonitor
+from gumby.process_guard_stats_parser import RESOURCE_FIELDS, ResourceUsageParser, read_binary_resource_file
+
+
+class TestProcessMonitor(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.sigterm_handler = signal.getsignal(signal.SIGTERM)
+
+    def tearDown(self):
+        signal.signal(signal.SIGTERM, self.sigterm_handler)
+        shutil.rmtree(self.test_dir)
+
+    def test_binary_round_trip(self):
+        """
+        Test that the records written by the process monitor can be read back by the stats parser
+        """
+        monitor_dir = os.path.join(self.test_dir, "input", "node1")
+        os.makedirs(monitor_dir)
+        monitor = ProcessMonitor(["exec sleep 10"], 0, 1.0, monitor_dir=monitor_dir, binary=True)
+        try:
+            # Give the shell the time to exec sleep
+            sleep(0.2)
+            pid = monitor._rm.pid_list[0]
+            monitor.write_sample(100.0, [pid])
+            # Format the line like the text log does
+            text_stats = ("%.1f %s" % (100.0, next(monitor._rm.get_raw_stats([pid])))).split()
+            monitor.write_sample(101.0, [pid])
+        finally:
+            monitor.stop()
+
+        resource_file_path = os.path.join(monitor_dir, "resource_usage.bin")
+        with open(resource_file_path, "rb") as resource_file:
+            metainfo = json.loads(resource_file.readline())
+            offset = resource_file.tell()
+        self.assertEqual([tuple(field) for field in metainfo["fields"]], BINARY_RECORD_FIELDS)
+
+        times, pid_names, pid_indices, samples = read_binary_resource_file(resource_file_path, metainfo, offset,
+                                                                           "node1")
+        self.assertEqual(times.tolist(), [100.0, 101.0])
+        self.assertEqual(pid_names, ["node1_sleep_%d" % pid])
+        self.assertEqual(pid_indices.tolist(), [0, 0])
+        # The binary records hold the same values as the text log
+        self.assertEqual(samples[0].tolist(), [int(text_stats[field]) for field in RESOURCE_FIELDS])
+
+        parser = ResourceUsageParser(os.path.join(self.test_dir, "input"), os.path.join(self.test_dir, "output"),
+                                     workers=1)
+        parser.parse_resource_files()
+        threads = numpy.load(os.path.join(self.test_dir, "output", "resource_usage", "node1", "threads.npy"))
+        self.assertEqual(threads.tolist(), [[1], [1]])
+
+
+class TestResourceMonitorPidTree(unittest.TestCase):
+    """
+    Tests for following the descendants of the monitored processes, in a fake /proc tree.
+    """
+
+    def setUp(self):
+        self.proc_dir = tempfile.mkdtemp()
+        self.monitor = ResourceMonitor(None, [])
+        self.monitor.proc_dir = self.proc_dir
+        self.monitor.pid_list = [100]
+        self.monitor.pgids = {100}
+        self.add_process(100, 100)
+
+    def tearDown(self):
+        shutil.rmtree(self.proc_dir)
+
+    def add_process(self, pid, pgrp, children=(), readable=True, children_readable=True):
+        task_dir = os.path.join(self.proc_dir, str(pid), "task", str(pid))
+        os.makedirs(task_dir)
+        with open(os.path.join(self.proc_dir, str(pid), "stat"), "w") as stat_file:
+            stat_file.write("%d (some process) S 1 %d 0\n" % (pid, pgrp))
+        if readable:
+            with open(os.path.join(self.proc_dir, str(pid), "io"), "w") as io_file:
+                io_file.write("rchar: 0\n")
+        if children_readable:
+            with open(os.path.join(task_dir, "children"), "w") as children_file:
+                children_file.write(" ".join(str(child) for child in children))
+
+    def remove_process(self, pid):
+        shutil.rmtree(os.path.join(self.proc_dir, str(pid)))
+
+    def set_children(self, pid, children):
+        with open(os.path.join(self.proc_dir, str(pid), "task", str(pid), "children"), "w") as children_file:
+            children_file.write(" ".join(str(child) for child in children))
+
+    def test_children(self):
+        """
+        Test finding descendants, also below processes that cannot be monitored
+        """
+        self.monitor.track_children = True
+        self.set_children(100, (101, 103))
+        self.add_process(101, 100, children=(102,))
+        self.add_process(102, 100)
+        self.add_process(103, 100, children=(104,), readable=False)
+        self.add_process(104, 100)
+
+        self.monitor.update_pid_tree()
+        self.assertEqual(sorted(self.monitor.pid_list), [100, 101, 102, 104])
+        self.assertIn(103, self.monitor.ignore_pids)
+
+        # A new child of the process we cannot monitor is found as well
+        self.set_children(103, (104, 105))
+        self.add_process(105, 100)
+        self.monitor.update_pid_tree()
+        self.assertIn(105, self.monitor.pid_list)
+
+    def test_children_unreadable(self):
+        """
+        Test falling back to the process groups if the children of a running process cannot be read
+        """
+        self.monitor.track_children = True
+        os.remove(os.path.join(self.proc_dir, "100", "task", "100", "children"))
+        self.add_process(101, 100)
+        self.add_process(200, 200)
+
+        self.monitor.update_pid_tree()
+        self.assertEqual(sorted(self.monitor.pid_list), [100, 101])
+
+    def test_reparented_descendant(self):
+        """
+        Test finding a descendant that was reparented to init by scanning the process groups now and then
+        """
+        self.monitor.track_children = True
+        self.add_process(101, 100)
+        self.add_process(200, 200)
+
+        self.monitor.update_pid_tree()
+        self.assertEqual(self.monitor.pid_list, [100])
+
+        for _ in range(PGRP_SCAN_INTERVAL - 1):
+            self.monitor.update_pid_tree()
+        self.assertEqual(sorted(self.monitor.pid_list), [100, 101])
+        self.assertIn(200, self.monitor.pgrp_ignore_pids)
+
+    def check_reused_pid(self):
+        self.set_children(100, (101,))
+        self.add_process(101, 100, readable=False)
+        self.monitor.update_pid_tree()
+        self.assertIn(101, self.monitor.ignore_pids)
+        self.assertNotIn(101, self.monitor.pid_list)
+
+        # The pid exits and is reused by a process we can monitor
+        self.remove_process(101)
+        self.set_children(100, ())
+        self.monitor.update_pid_tree()
+        self.assertNotIn(101, self.monitor.ignore_pids)
+        self.set_children(100, (101,))
+        self.add_process(101, 100)
+        self.monitor.update_pid_tree()
+        self.assertIn(101, self.monitor.pid_list)
+
+    def test_reused_pid_children(self):
+        """
+        Test that an ignored pid is forgotten when its process exits, when following children
+        """
+        self.monitor.track_children = True
+        self.check_reused_pid()
+
+    def test_reused_pid_pgrp(self):
+        """
+        Test that an ignored pid is forgotten when its process exits, when scanning process groups
+        """
+        self.monitor.track_children = False
+        self.check_reused_pid()
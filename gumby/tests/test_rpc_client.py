@@ -0,0 +1,119 @@
+import unittest
+from asyncio import gather, new_event_loop, set_event_loop, sleep
+from unittest.mock import patch
+
+from aiohttp import web
+
+from gumby.rpc_client import RPCClientPool, RPCError, close_rpc_client_pool, get_rpc_client_pool
+
+
+class TestRPCClientPool(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = new_event_loop()
+        set_event_loop(self.loop)
+        self.posts = []
+        self.concurrent = 0
+        self.max_concurrent = 0
+
+        app = web.Application()
+        app.router.add_post('/rpc', self.handle_rpc)
+        self.runner = web.AppRunner(app)
+        self.loop.run_until_complete(self.runner.setup())
+        site = web.TCPSite(self.runner, '127.0.0.1', 0)
+        self.loop.run_until_complete(site.start())
+        self.url = "http://127.0.0.1:%d/rpc" % site._server.sockets[0].getsockname()[1]
+
+    def tearDown(self):
+        self.loop.run_until_complete(self.runner.cleanup())
+        self.loop.close()
+
+    async def handle_rpc(self, request):
+        payload = await request.json()
+        self.posts.append(payload)
+        self.concurrent += 1
+        self.max_concurrent = max(self.max_concurrent, self.concurrent)
+        await sleep(0.01)
+        self.concurrent -= 1
+
+        def respond(call):
+            if call["method"] == "fail":
+                return {"jsonrpc": "2.0", "id": call["id"], "error": {"code": -1, "message": "failed"}}
+            return {"jsonrpc": "2.0", "id": call["id"], "result": call["params"][0] * 2}
+
+        if isinstance(payload, list):
+            return web.json_response([respond(call) for call in payload])
+        return web.json_response(respond(payload))
+
+    def run_calls(self, pool, values):
+        async def run():
+            try:
+                return await gather(*[pool.call(self.url, "double", [value]) for value in values])
+            finally:
+                await pool.close()
+        return self.loop.run_until_complete(run())
+
+    def test_concurrency_limit(self):
+        """
+        Test whether the number of concurrent requests to an endpoint is bounded
+        """
+        results = self.run_calls(RPCClientPool(max_concurrency=3), range(10))
+
+        self.assertEqual(results, [value * 2 for value in range(10)])
+        self.assertEqual(len(self.posts), 10)
+        self.assertEqual(self.max_concurrent, 3)
+
+    def test_batching(self):
+        """
+        Test whether calls are sent in batches, and each call gets its own result
+        """
+        results = self.run_calls(RPCClientPool(batch_size=4), range(10))
+
+        self.assertEqual(results, [value * 2 for value in range(10)])
+        self.assertEqual([len(post) for post in self.posts], [4, 4, 2])
+
+    def test_error(self):
+        """
+        Test whether a failed call raises an error, without affecting the other calls in its batch
+        """
+        pool = RPCClientPool(batch_size=2)
+
+        async def run():
+            try:
+                return await gather(pool.call(self.url, "fail"), pool.call(self.url, "double", [1]),
+                                    return_exceptions=True)
+            finally:
+                await pool.close()
+
+        error, result = self.loop.run_until_complete(run())
+        self.assertIsInstance(error, RPCError)
+        self.assertEqual(result, 2)
+
+    def test_call_batch(self):
+        """
+        Test whether the same call with different parameters is sent in a single request
+        """
+        pool = RPCClientPool()
+
+        async def run():
+            try:
+                return await pool.call_batch(self.url, "double", [[value] for value in range(5)])
+            finally:
+                await pool.close()
+
+        self.assertEqual(self.loop.run_until_complete(run()), [0, 2, 4, 6, 8])
+        self.assertEqual(len(self.posts), 1)
+
+    def test_close_shared_pool(self):
+        """
+        Test whether closing the shared pool closes its session, and does nothing if the pool was never used
+        """
+        with patch("gumby.rpc_client._rpc_client_pool", None):
+            self.loop.run_until_complete(close_rpc_client_pool())
+
+            pool = get_rpc_client_pool()
+            self.assertEqual(self.loop.run_until_complete(pool.call(self.url, "double", [1])), 2)
+            session = pool.session
+            self.loop.run_until_complete(close_rpc_client_pool())
+            self.assertTrue(session.closed)
+            self.assertIsNone(pool.session)
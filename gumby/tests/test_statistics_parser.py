@@ -3,7 +3,63 @@ import shutil
 import tempfile
 import unittest
 
-from gumby.statsparser import StatisticsParser
+from gumby.statsparser import LoopMonitorStatisticsParser, OutputCatalog, StatisticsParser, aggregation_step, \
+    divide_workers
+
+
+class StepsParser(StatisticsParser):
+
+    @aggregation_step(inputs=("stats.txt",), outputs=("num_stats.txt",))
+    def count_stats(self):
+        with open("num_stats.txt", "w") as output_file:
+            output_file.write("%d" % len(list(self.yield_files("stats.txt"))))
+
+    @aggregation_step(outputs=("summary.txt",), requires=("count_stats",))
+    def summarize(self):
+        with open("num_stats.txt") as input_file, open("summary.txt", "w") as output_file:
+            output_file.write("stats: %s" % input_file.read())
+
+    @aggregation_step(outputs=("pid.txt",))
+    def write_pid(self):
+        with open("pid.txt", "w") as output_file:
+            output_file.write("%d,%d" % (os.getpid(), self.step_workers))
+
+
+class HeavyStepsParser(StatisticsParser):
+    """
+    A parser with one step that reads a large file, next to trivial steps. Every step writes its number of workers.
+    """
+
+    def write_step_workers(self, filename):
+        with open(filename, "w") as output_file:
+            output_file.write("%d" % self.step_workers)
+
+    @aggregation_step(inputs=("large.txt",), outputs=("large_workers.txt",))
+    def heavy(self):
+        self.write_step_workers("large_workers.txt")
+
+    @aggregation_step(inputs=("small.txt",), outputs=("small_workers_1.txt",))
+    def trivial_1(self):
+        self.write_step_workers("small_workers_1.txt")
+
+    @aggregation_step(inputs=("small.txt",), outputs=("small_workers_2.txt",))
+    def trivial_2(self):
+        self.write_step_workers("small_workers_2.txt")
+
+    @aggregation_step(outputs=("no_input_workers.txt",))
+    def trivial_3(self):
+        self.write_step_workers("no_input_workers.txt")
+
+
+class CyclicStepsParser(StatisticsParser):
+
+    @aggregation_step(requires=("step_b",))
+    def step_a(self):
+        pass
+
+    @aggregation_step(requires=("step_a",))
+    def step_b(self):
+        pass
 
 
 class TestStatisticsParser(unittest.TestCase):
@@ -67,3 +123,161 @@ class TestStatisticsParser(unittest.TestCase):
         self.assertEqual(len(list(items)), 2)
         items = stats_parser.yield_files('*.txt')
         self.assertEqual(len(list(items)), 2)
+
+    def test_loop_monitor_statistics(self):
+        """
+        Test merging the loop monitor measurements of all peers into percentiles
+        """
+        for peer in ("1", "2"):
+            os.mkdir(os.path.join(self.test_dir, peer))
+            with open(os.path.join(self.test_dir, peer, "loop_lag.csv"), "w") as lag_file:
+                lag_file.write("time,lag\n" + "".join("%d,%f\n" % (index, index / 1000) for index in range(100)))
+            with open(os.path.join(self.test_dir, peer, "scenario_dispatch.csv"), "w") as dispatch_file:
+                dispatch_file.write("file,line,callable,scheduled,actual,delay,duration\n"
+                                    "test.scenario,1,start,1.0,1.1,0.1,0.5\n"
+                                    "test.scenario,2,stop,2.0,2.3,0.3,\n")
+            with open(os.path.join(self.test_dir, peer, "scenario_pacing.csv"), "w") as pacing_file:
+                pacing_file.write("file,line,callable,calls,mean_delay,max_delay,finished,mean_duration,max_duration,"
+                                  "delay_le_0.1,delay_gt_0.1\n"
+                                  "test.scenario,3,request,10,0.050000,0.200000,10,0.010000,0.020000,8,2\n")
+            with open(os.path.join(self.test_dir, peer, "slow_callbacks.csv"), "w") as slow_callbacks_file:
+                slow_callbacks_file.write("time,duration,callback\n1.0,0.2,Module.start\n")
+
+        current_dir = os.getcwd()
+        os.chdir(self.test_dir)
+        try:
+            LoopMonitorStatisticsParser(self.test_dir).run()
+        finally:
+            os.chdir(current_dir)
+
+        with open(os.path.join(self.test_dir, "loop_lag_percentiles.csv")) as output_file:
+            lines = output_file.read().splitlines()
+        self.assertEqual(lines[0], "peer,samples,p50,p90,p99,p99.9,max")
+        self.assertTrue(lines[3].startswith("all,200,0.049500"))
+
+        with open(os.path.join(self.test_dir, "scenario_dispatch_percentiles.csv")) as output_file:
+            lines = output_file.read().splitlines()
+        self.assertEqual([line.split(",")[:3] for line in lines[1:]],
+                         [["start", "2", "0.100000"], ["stop", "2", "0.300000"], ["all", "4", "0.200000"]])
+        self.assertEqual(lines[2].split(",")[-1], "")
+
+        with open(os.path.join(self.test_dir, "scenario_pacing_summary.csv")) as output_file:
+            self.assertEqual(output_file.read().splitlines()[1],
+                             "request,20,0.050000,0.200000,0.010000,0.020000,16,4")
+
+        with open(os.path.join(self.test_dir, "slow_callbacks_summary.csv")) as output_file:
+            self.assertEqual(output_file.read().splitlines()[1], "Module.start,2,0.400000,0.200000")
+
+    def test_output_catalog(self):
+        """
+        Test that the output catalog is saved to and loaded from its cache file, until the output tree changes
+        """
+        for peer in ("1", "2"):
+            os.mkdir(os.path.join(self.test_dir, peer))
+            os.mkdir(os.path.join(self.test_dir, peer, "logs"))
+            shutil.copy(os.path.join(self.TESTS_DATA_DIR, "stats1.txt"), os.path.join(self.test_dir, peer, "stats.txt"))
+            shutil.copy(os.path.join(self.TESTS_DATA_DIR, "stats2.txt"),
+                        os.path.join(self.test_dir, peer, "logs", "stats.txt"))
+            open(os.path.join(self.test_dir, peer, "empty.txt"), "w").close()
+
+        catalog = OutputCatalog.get(self.test_dir, refresh=True)
+        self.assertTrue(os.path.exists(os.path.join(self.test_dir, OutputCatalog.CACHE_FILENAME)))
+        self.assertEqual(len(catalog.find('stats.txt')), 4)
+        self.assertEqual(len(catalog.find('*.txt')), 4)
+        self.assertIs(OutputCatalog.get(self.test_dir), catalog)
+
+        parallel_catalog = OutputCatalog(self.test_dir, workers=4)
+        parallel_catalog.scan()
+        self.assertEqual(sorted(parallel_catalog.entries), sorted(catalog.entries))
+
+        loaded_catalog = OutputCatalog(self.test_dir)
+        self.assertTrue(loaded_catalog.load())
+        self.assertEqual(loaded_catalog.entries, catalog.entries)
+
+        # The output of the parsers in the node directory does not invalidate the cache
+        with open(os.path.join(self.test_dir, "output.csv"), "w") as output_file:
+            output_file.write("1\n")
+        os.makedirs(os.path.join(self.test_dir, "resource_usage", "node1"))
+        self.assertTrue(OutputCatalog(self.test_dir).load())
+
+        with open(os.path.join(self.test_dir, "1", "logs", "new.txt"), "w") as new_file:
+            new_file.write("1\n")
+        self.assertFalse(OutputCatalog(self.test_dir).load())
+        OutputCatalog.get(self.test_dir, refresh=True)
+        self.assertTrue(OutputCatalog(self.test_dir).load())
+
+        # Writing a file in place does not modify its directory, but invalidates the cache as well
+        with open(os.path.join(self.test_dir, "2", "empty.txt"), "w") as empty_file:
+            empty_file.write("1\n")
+        self.assertFalse(OutputCatalog(self.test_dir).load())
+        catalog = OutputCatalog.get(self.test_dir, refresh=True)
+        self.assertEqual(len(catalog.find('empty.txt')), 1)
+        self.assertEqual(catalog.get_size(catalog.find('empty.txt')[0][1]), 2)
+
+        os.mkdir(os.path.join(self.test_dir, "3"))
+        self.assertFalse(OutputCatalog(self.test_dir).load())
+
+    def test_run_parallel(self):
+        """
+        Test running the aggregation steps of a parser in worker processes, in the order of their requirements
+        """
+        for peer in ("1", "2"):
+            os.mkdir(os.path.join(self.test_dir, peer))
+            shutil.copy(os.path.join(self.TESTS_DATA_DIR, "stats1.txt"), os.path.join(self.test_dir, peer, "stats.txt"))
+
+        current_dir = os.getcwd()
+        os.chdir(self.test_dir)
+        try:
+            parser = StepsParser(self.test_dir)
+            self.assertEqual(list(parser.get_steps()), ["count_stats", "summarize", "write_pid"])
+            parser.run_parallel(workers=6)
+            with open("summary.txt") as summary_file:
+                self.assertEqual(summary_file.read(), "stats: 2")
+            with open("pid.txt") as pid_file:
+                pid, step_workers = pid_file.read().split(",")
+            self.assertNotEqual(int(pid), os.getpid())
+            # A step without input files gets a single worker
+            self.assertEqual(int(step_workers), 1)
+
+            parser.run()
+            with open("pid.txt") as pid_file:
+                self.assertEqual(pid_file.read(), "%d,1" % os.getpid())
+
+            self.assertRaises(ValueError, CyclicStepsParser(self.test_dir).run)
+        finally:
+            os.chdir(current_dir)
+
+    def test_divide_workers(self):
+        """
+        Test that the free workers are divided by input size, with at least one worker per step
+        """
+        self.assertEqual(divide_workers(8, [1000, 1, 0]), [6, 1, 1])
+        self.assertEqual(divide_workers(8, [100, 100]), [4, 4])
+        self.assertEqual(divide_workers(2, [1000, 1, 0]), [1, 1, 1])
+        self.assertEqual(divide_workers(8, [0, 0]), [1, 1])
+
+    def test_run_parallel_heavy_step(self):
+        """
+        Test that a step with a large input gets more than one worker when it runs next to trivial steps
+        """
+        for peer in ("1", "2"):
+            os.mkdir(os.path.join(self.test_dir, peer))
+            with open(os.path.join(self.test_dir, peer, "large.txt"), "w") as large_file:
+                large_file.write("x" * 100000)
+            with open(os.path.join(self.test_dir, peer, "small.txt"), "w") as small_file:
+                small_file.write("x")
+
+        current_dir = os.getcwd()
+        os.chdir(self.test_dir)
+        try:
+            HeavyStepsParser(self.test_dir).run_parallel(workers=6)
+            workers = {}
+            for filename in ("large_workers.txt", "small_workers_1.txt", "small_workers_2.txt",
+                             "no_input_workers.txt"):
+                with open(filename) as workers_file:
+                    workers[filename] = int(workers_file.read())
+        finally:
+            os.chdir(current_dir)
+
+        self.assertEqual(workers, {"large_workers.txt": 3, "small_workers_1.txt": 1, "small_workers_2.txt": 1,
+                                   "no_input_workers.txt": 1})
@@ -0,0 +1,141 @@
+import json
+import unittest
+import zlib
+from asyncio import all_tasks, gather, new_event_loop, open_connection, set_event_loop, wait_for
+from time import time
+from unittest.mock import patch
+
+from gumby.sync import ExperimentServiceFactory, ExperimentServiceProto, RelayedSubscriberProto, SyncRelayFactory
+
+
+class TestExperimentServiceFactory(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = new_event_loop()
+        set_event_loop(self.loop)
+        self.writers = []
+
+    def tearDown(self):
+        for writer in self.writers:
+            writer.close()
+        pending = all_tasks(self.loop)
+        for task in pending:
+            task.cancel()
+        self.loop.run_until_complete(gather(*pending, return_exceptions=True))
+        self.loop.close()
+
+    async def run_client(self, port, framing=False, num_clients=None):
+        reader, writer = await open_connection('127.0.0.1', port)
+        writer.write(b"time:%f\r\n" % time())
+        peer_id = int((await reader.readline()).strip().split(b':')[1])
+        if framing:
+            writer.write(b"framing:unknown,zlib\r\n")
+        writer.write(b"set:peer:%d\r\nready\r\n" % peer_id)
+        line = await reader.readline()
+        if framing:
+            _, codec, length = line.strip().split(b':')
+            self.assertEqual(codec, b"zlib")
+            line = zlib.decompress(await reader.readexactly(int(length)))
+        all_vars = json.loads(line)
+        writer.write(b"vars_received\r\n")
+        go_line = await reader.readline()
+        if num_clients:
+            # Send a message to the next peer, and wait for the message of the previous peer
+            writer.write(b"msg:%d:test:hello\r\n" % (peer_id % num_clients + 1))
+            go_line = (go_line, await reader.readline())
+        self.writers.append(writer)
+        return peer_id, all_vars, go_line
+
+    async def run_experiment(self, num_clients, relays=0, clients_per_relay=0):
+        factory = ExperimentServiceFactory(num_clients + relays * clients_per_relay, 0)
+        server = await self.loop.create_server(factory, '127.0.0.1', 0)
+        ports = [server.sockets[0].getsockname()[1]] * num_clients
+        relay_servers = []
+        for _ in range(relays):
+            relay_factory = SyncRelayFactory('127.0.0.1', ports[0], clients_per_relay)
+            relay_servers.append(await self.loop.create_server(relay_factory, '127.0.0.1', 0))
+            ports += [relay_servers[-1].sockets[0].getsockname()[1]] * clients_per_relay
+
+        messaging = len(ports) if relays else None
+        try:
+            results = [self.loop.create_task(self.run_client(port, framing=bool(index % 2), num_clients=messaging))
+                       for index, port in enumerate(ports)]
+            results = [await wait_for(result, 10) for result in results]
+        finally:
+            factory._timeout_delayed_call.cancel()
+            for relay_server in relay_servers:
+                relay_server.close()
+            server.close()
+        return factory, results
+
+    def test_startup(self):
+        """
+        Test whether all clients get a unique ID, receive the vars of all clients and get the go signal.
+        Half of the clients negotiate to receive the vars as a compressed frame.
+        """
+        factory, results = self.loop.run_until_complete(self.run_experiment(20))
+
+        self.assertEqual(sorted(peer_id for peer_id, _, _ in results), list(range(1, 21)))
+        for peer_id, all_vars, go_line in results:
+            self.assertEqual(len(all_vars["clients"]), 20)
+            self.assertEqual(all_vars["clients"][str(peer_id)]["peer"], str(peer_id))
+            self.assertTrue(go_line.startswith(b"go:"))
+        self.assertEqual(set(factory.get_phase_durations().keys()), {"connected", "ready", "vars_received", "go"})
+
+    def test_relay(self):
+        """
+        Test whether clients behind relays take part in the experiment like directly connected clients, and can send
+        messages to each other
+        """
+        factory, results = self.loop.run_until_complete(self.run_experiment(2, relays=2, clients_per_relay=3))
+
+        self.assertEqual(sorted(peer_id for peer_id, _, _ in results), list(range(1, 9)))
+        for peer_id, all_vars, (go_line, msg_line) in results:
+            self.assertEqual(len(all_vars["clients"]), 8)
+            self.assertTrue(go_line.startswith(b"go:"))
+            self.assertEqual(msg_line.strip(), b"msg:%d:test:hello" % ((peer_id - 2) % 8 + 1))
+
+    def test_relay_ready_batch(self):
+        """
+        Test whether a relay sends the vars and ready of all its clients in a single frame, instead of their lines
+        """
+        batches = []
+        relayed_init_lines = []
+        relayed_subscribers_ready = ExperimentServiceProto.relayed_subscribers_ready
+        proto_init = ExperimentServiceProto.proto_init
+
+        def record_batch(proto, subscribers_info):
+            batches.append(subscribers_info)
+            relayed_subscribers_ready(proto, subscribers_info)
+
+        def record_init_line(proto, line):
+            if isinstance(proto, RelayedSubscriberProto):
+                relayed_init_lines.append(line)
+            return proto_init(proto, line)
+
+        with patch.object(ExperimentServiceProto, "relayed_subscribers_ready", record_batch), \
+                patch.object(ExperimentServiceProto, "proto_init", record_init_line):
+            _, results = self.loop.run_until_complete(self.run_experiment(1, relays=2, clients_per_relay=3))
+
+        self.assertFalse(relayed_init_lines)
+        self.assertEqual(len(batches), 2)
+        for subscribers_info in batches:
+            self.assertEqual(sorted(subscribers_info.keys()), ["0", "1", "2"])
+        for peer_id, all_vars, _ in results:
+            self.assertEqual(all_vars["clients"][str(peer_id)]["peer"], str(peer_id))
+            self.assertEqual(all_vars["clients"][str(peer_id)]["time_offset"], 0)
+
+    def test_assign_ids_round_robin(self):
+        """
+        Test whether IDs are assigned round-robin over the hosts, also when hosts have a different number of peers
+        """
+        class MockConnection:
+            id = None
+
+        factory = ExperimentServiceFactory(5, 0)
+        connections = [MockConnection() for _ in range(5)]
+        for connection, host in zip(connections, ["10.0.0.2", "10.0.0.10", "10.0.0.2", "10.0.0.2", "10.0.0.10"]):
+            factory.connections_made[connection] = host
+        factory.assign_ids()
+
+        self.assertEqual([connection.id for connection in connections], [1, 2, 3, 5, 4])
@@ -0,0 +1,119 @@
+import time
+import unittest
+from asyncio import all_tasks, gather, new_event_loop, set_event_loop, sleep
+
+from gumby.util import PeriodicTask, run_task
+
+
+class TestPeriodicTask(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = new_event_loop()
+        set_event_loop(self.loop)
+        self.ticks = []
+
+    def tearDown(self):
+        pending = all_tasks(self.loop)
+        for task in pending:
+            task.cancel()
+        self.loop.run_until_complete(gather(*pending, return_exceptions=True))
+        self.loop.close()
+
+    def run_for(self, periodic_task, duration):
+        periodic_task.start()
+        self.loop.run_until_complete(sleep(duration))
+        periodic_task.cancel()
+
+    def test_no_drift(self):
+        """
+        Test whether a task that takes a while to run does not lower the rate
+        """
+        async def slow_tick():
+            self.ticks.append(self.loop.time())
+            await sleep(0.03)
+
+        periodic_task = PeriodicTask(slow_tick, 0.05)
+        self.run_for(periodic_task, 0.52)
+
+        # Each tick is due 0.05 seconds after the previous one, instead of 0.05 seconds after it finished. On a loaded
+        # machine some deadlines may be missed, but every deadline up to 0.5 seconds is accounted for.
+        deadlines = len(self.ticks) + periodic_task.missed_ticks
+        self.assertGreaterEqual(deadlines, 10)
+        self.assertLessEqual(deadlines, 11)
+        self.assertAlmostEqual((deadlines - 1) * 0.05, self.ticks[-1] - self.ticks[0], delta=0.04)
+
+    def test_coalesce(self):
+        """
+        Test whether deadlines that passed while a tick blocked the loop are coalesced and counted as missed
+        """
+        def blocking_tick():
+            self.ticks.append(self.loop.time())
+            if len(self.ticks) == 2:
+                time.sleep(0.23)
+
+        periodic_task = PeriodicTask(blocking_tick, 0.05)
+        self.run_for(periodic_task, 0.42)
+
+        # Every deadline up to 0.4 seconds either led to a tick or was skipped
+        self.assertGreaterEqual(periodic_task.missed_ticks, 3)
+        self.assertGreaterEqual(len(self.ticks) + periodic_task.missed_ticks, 7)
+        self.assertLessEqual(len(self.ticks) + periodic_task.missed_ticks, 9)
+
+    def test_catch_up(self):
+        """
+        Test whether ticks that could not start on time are run late without coalescing
+        """
+        def blocking_tick():
+            self.ticks.append(self.loop.time())
+            if len(self.ticks) == 2:
+                time.sleep(0.23)
+
+        periodic_task = PeriodicTask(blocking_tick, 0.05, coalesce=False)
+        self.run_for(periodic_task, 0.42)
+
+        self.assertGreaterEqual(len(self.ticks), 7)
+        self.assertLessEqual(len(self.ticks), 9)
+        self.assertEqual(0, periodic_task.missed_ticks)
+        self.assertGreater(periodic_task.late_ticks, 0)
+
+    def test_in_flight(self):
+        """
+        Test whether ticks overlap up to the in-flight limit
+        """
+        in_flight = []
+
+        async def long_tick(periodic_task):
+            in_flight.append(periodic_task.in_flight)
+            await sleep(0.12)
+
+        periodic_task = PeriodicTask(long_tick, 0.05, max_in_flight=2)
+        periodic_task.args = (periodic_task,)
+        self.run_for(periodic_task, 0.5)
+
+        self.assertEqual(2, max(in_flight))
+        self.assertLess(periodic_task.achieved_rate, periodic_task.target_rate)
+
+    def test_run_task_function(self):
+        """
+        Test whether run_task runs plain functions, with and without a delay
+        """
+        run_task(self.ticks.append, 1)
+        run_task(self.ticks.append, 2, delay=0.01)
+        self.loop.run_until_complete(sleep(0.05))
+
+        self.assertEqual([1, 2], self.ticks)
+
+    def test_run_task_interval(self):
+        """
+        Test whether run_task returns the periodic task, with its statistics, and whether cancelling it logs them
+        """
+        periodic_task = run_task(self.ticks.append, 1, interval=0.05)
+        self.assertIsInstance(periodic_task, PeriodicTask)
+        self.loop.run_until_complete(sleep(0.12))
+
+        self.assertGreaterEqual(periodic_task.get_stats()["ticks"], 2)
+        self.assertEqual(periodic_task.get_stats()["ticks"], len(self.ticks))
+        with self.assertLogs("PeriodicTask") as logs:
+            periodic_task.cancel()
+        self.assertIn("Stopped periodic task append", logs.output[0])
+        self.assertIsNone(periodic_task.runner)
@@ -1,5 +1,7 @@
+import logging
 import os
-from asyncio import coroutine, ensure_future, iscoroutinefunction, sleep
+from asyncio import Semaphore, ensure_future, get_event_loop, iscoroutinefunction, isfuture, sleep
+from inspect import isawaitable
 
 
 def generate_keypair_trustchain():
@@ -27,11 +29,115 @@ def save_pub_key_trustchain(keypair, pubkeyfilename):
         keyfile.write(keypair.key.pk)
 
 
-async def interval_runner(delay, interval, task, *args):
-    await sleep(delay)
-    while True:
-        await task(*args)
-        await sleep(interval)
+class PeriodicTask(object):
+    """
+    Calls a (coroutine)function periodically. The ticks are scheduled against absolute deadlines, the n-th tick is
+    due at start + n * interval, so the time a tick takes does not delay the ones after it.
+
+    At most max_in_flight ticks run at the same time. With the default of one, a tick that is still running when the
+    next one is due delays it. When deadlines have passed by the time a tick can start, these ticks are coalesced
+    into one and counted as missed. Without coalescing, these ticks are run as soon as possible instead, and counted
+    as late.
+    """
+
+    def __init__(self, task, interval, *args, delay=0, max_in_flight=1, coalesce=True):
+        self._logger = logging.getLogger(self.__class__.__name__)
+        self.task = task
+        self.args = args
+        self.interval = interval
+        self.delay = delay
+        self.max_in_flight = max_in_flight
+        self.coalesce = coalesce
+        self.start_time = None
+        self.ticks = 0
+        self.missed_ticks = 0
+        self.late_ticks = 0
+        self.in_flight = 0
+        self.runner = None
+        self._slots = None
+
+    @property
+    def target_rate(self):
+        return 1.0 / self.interval
+
+    @property
+    def achieved_rate(self):
+        """
+        The number of ticks per second since the first deadline.
+        """
+        if self.start_time is None:
+            return 0.0
+        elapsed = get_event_loop().time() - self.start_time
+        return self.ticks / elapsed if elapsed > 0 else 0.0
+
+    def get_stats(self):
+        return {
+            "ticks": self.ticks,
+            "missed_ticks": self.missed_ticks,
+            "late_ticks": self.late_ticks,
+            "in_flight": self.in_flight,
+            "target_rate": self.target_rate,
+            "achieved_rate": self.achieved_rate,
+        }
+
+    def start(self):
+        self.runner = ensure_future(self.run())
+        return self.runner
+
+    def cancel(self):
+        if self.runner:
+            self.runner.cancel()
+            self.runner = None
+            self._logger.info("Stopped periodic task %s after %d ticks (%d missed), achieved %.2f of %.2f ticks/s",
+                              getattr(self.task, '__name__', self.task), self.ticks, self.missed_ticks,
+                              self.achieved_rate, self.target_rate)
+
+    async def run(self):
+        loop = get_event_loop()
+        self._slots = Semaphore(self.max_in_flight)
+        if self.delay:
+            await sleep(self.delay)
+
+        self.start_time = loop.time()
+        tick_index = 0
+        while True:
+            wait_time = self.start_time + tick_index * self.interval - loop.time()
+            if wait_time > 0:
+                await sleep(wait_time)
+            await self._slots.acquire()
+
+            # The number of deadlines that have passed by now
+            passed_deadlines = int((loop.time() - self.start_time) // self.interval) + 1
+            if passed_deadlines - tick_index > 1:
+                if self.coalesce:
+                    self.missed_ticks += passed_deadlines - tick_index - 1
+                    tick_index = passed_deadlines - 1
+                else:
+                    self.late_ticks += 1
+
+            self._start_tick()
+            tick_index += 1
+
+    def _start_tick(self):
+        self.ticks += 1
+        self.in_flight += 1
+        try:
+            result = self.task(*self.args)
+        except Exception:
+            self._logger.exception("Error while running periodic task %s", self.task)
+            self._tick_done(None)
+            return
+
+        if isawaitable(result):
+            ensure_future(result).add_done_callback(self._tick_done)
+        else:
+            self._tick_done(None)
+
+    def _tick_done(self, future):
+        self.in_flight -= 1
+        self._slots.release()
+        if isfuture(future) and not future.cancelled() and future.exception():
+            self._logger.error("Error while running periodic task %s", self.task, exc_info=future.exception())
 
 
 async def delay_runner(delay, task, *args):
@@ -40,15 +146,28 @@ async def delay_runner(delay, task, *args):
 
 
 def run_task(task, *args, delay=0, interval=0):
+    """
+    Run a (coroutine)function, after an optional delay. With an interval, the function is called periodically and the
+    PeriodicTask is returned, which can be cancelled like a task and keeps the statistics of its ticks.
+    """
     if not iscoroutinefunction(task) and not callable(task):
         raise ValueError('run_task takes a (coroutine)function as a parameter')
 
-    task = task if iscoroutinefunction(task) else coroutine(task)
     if interval:
-        # The default delay for looping calls is the same as the interval
-        delay = interval if delay is None else delay
-        task = ensure_future(interval_runner(delay, interval, task, *args))
-    elif delay:
+        periodic_task = PeriodicTask(task, interval, *args, delay=delay)
+        periodic_task.start()
+        return periodic_task
+
+    if not iscoroutinefunction(task):
+        function = task
+
+        async def task(*args):
+            result = function(*args)
+            if isawaitable(result):
+                result = await result
+            return result
+
+    if delay:
         task = ensure_future(delay_runner(delay, task, *args))
     else:
         task = ensure_future(task(*args))
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for the LineReceiver that splits the data received by the sync server and the experiment clients.
+It feeds the receiver a large json doc and a burst of short messages, in chunks of different sizes.
+"""
+import argparse
+from time import perf_counter
+
+from gumby.line_receiver import LineReceiver
+
+
+class CountingLineReceiver(LineReceiver):
+    MAX_LENGTH = 2 ** 26
+
+    def __init__(self):
+        super().__init__()
+        self.lines = 0
+
+    def line_received(self, line):
+        self.lines += 1
+
+
+def feed(data, chunk_size):
+    receiver = CountingLineReceiver()
+    start_time = perf_counter()
+    for index in range(0, len(data), chunk_size):
+        receiver.data_received(data[index:index + chunk_size])
+    return perf_counter() - start_time, receiver.lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the LineReceiver with large and fragmented inputs')
+    parser.add_argument('--doc-size', type=int, default=2 ** 22, help='size of the large line in bytes')
+    parser.add_argument('--messages', type=int, default=100000, help='number of short lines in the burst')
+    args = parser.parse_args()
+
+    large_line = b"x" * args.doc_size + b"\r\n"
+    burst = b"".join(b"msg:%d:test:%s\r\n" % (index, b"y" * (index % 100)) for index in range(args.messages))
+
+    for name, data in (("large line", large_line), ("message burst", burst)):
+        for chunk_size in (1024, 65536, len(data)):
+            duration, lines = feed(data, chunk_size)
+            print("%-14s %9d bytes in %7d byte chunks: %8.4f s (%d lines, %.1f MB/s)" %
+                  (name, len(data), chunk_size, duration, lines, len(data) / duration / 2 ** 20))
+
+
+if __name__ == "__main__":
+    main()
@@ -23,6 +23,10 @@ rm -fR "$OUTPUT_DIR"
 mkdir -p "$OUTPUT_DIR"
 cd "$OUTPUT_DIR"
 
+# @CONF_OPTION SCENARIO_CACHE_DIR: Directory in which the first instance on a node caches the scenario it has read, so the other instances skip reading it. (default is a scenario cache directory next to the output directory of the node)
+export SCENARIO_CACHE_DIR=${SCENARIO_CACHE_DIR:-/local/$USER/Experiment_${EXPERIMENT_NAME}_scenario_cache}
+mkdir -p "$SCENARIO_CACHE_DIR"
+
 CMDFILE=$(mktemp --tmpdir=/local/$USER/ process_guard_XXXXXXXXXXXXX_$USER)
 
 # @CONF_OPTION DAS_NODE_COMMAND: The command that will be repeatedly launched in the worker nodes of the cluster. (required)
@@ -30,10 +34,22 @@ for INSTANCE in $(seq 1 1 $PROCESSES_IN_THIS_NODE); do
     echo "$DAS_NODE_COMMAND" >> $CMDFILE
 done
 
+# @CONF_OPTION SYNC_RELAY: Run a sync relay on every node, through which its instances talk to the experiment server. (default is False)
+if [ "${SYNC_RELAY,,}" == "true" ]; then
+    # @CONF_OPTION SYNC_RELAY_PORT: Port the sync relay on every node listens on. (default is SYNC_PORT + 1)
+    export SYNC_RELAY_PORT=${SYNC_RELAY_PORT:-$(($SYNC_PORT + 1))}
+    sync_relay.py > sync_relay.log 2>&1 &
+    SYNC_RELAY_PID=$!
+fi
+
 # @CONF_OPTION NODE_TIMEOUT: Time in seconds to wait for the sub-processes to run before killing them. (required)
 (process_guard.py -f $CMDFILE -t $NODE_TIMEOUT -o $OUTPUT_DIR -m $OUTPUT_DIR  -i 5 2>&1 | tee process_guard.log) ||:
 
 rm $CMDFILE
 
+if [ -n "$SYNC_RELAY_PID" ]; then
+    kill $SYNC_RELAY_PID 2>/dev/null ||:
+fi
+
 # Now, lets send the generated data back to the head node
 rsync -a --delete-before "$OUTPUT_DIR/" "$OUTPUT_DIR_URI/$(hostname)/" 2>&1
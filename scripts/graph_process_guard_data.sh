@@ -10,12 +10,13 @@ fi
 cd $OUTPUT_DIR
 
 TEMPFILE=$(mktemp)
-process_guard_stats_parser.py . .
+# The post processing script can run these parsers together with its own, and pass --parsed
+if [ "$1" != "--parsed" ]; then
+    run_statistics_parsers.py . resource_usage profiles
+fi
 #Get the XMIN XMAX vars from the extracted data
 source axis_stats.txt
 
-collect_profile_logs.py .
-
 modify_autoplot.py . $XSTART
 
 # Graph the stuff
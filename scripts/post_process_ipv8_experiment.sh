@@ -1,8 +1,8 @@
 #!/bin/bash
 
-# Parse IPv8 statistics
-gumby/experiments/ipv8/parse_ipv8_statistics.py .
+# Parse the IPv8 statistics, the event loop measurements, the resource usage and the profiles together
+run_statistics_parsers.py . ipv8 loop_monitor resource_usage profiles
 graph_ipv8_stats.sh
 
-# Run the regular process guard script
-graph_process_guard_data.sh
+# Graph the process guard data that we parsed above
+graph_process_guard_data.sh --parsed
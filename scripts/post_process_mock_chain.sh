@@ -0,0 +1,4 @@
+#!/usr/bin/env bash
+gumby/experiments/mock_chain/post_process_mock_chain.py .
+
+graph_process_guard_data.sh
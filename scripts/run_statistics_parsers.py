@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Run the aggregation steps of several statistics parsers together, in one pool of POST_PROCESS_WORKERS worker processes
+(all cores by default) and over one output catalog. The independent steps of all parsers run in parallel.
+
+    run_statistics_parsers.py <node directory> <parser> [<parser> ...]
+
+A parser is one of the names below, or the import path of a StatisticsParser class, like package.module:ClassName.
+"""
+import os
+import sys
+from importlib import import_module
+
+from gumby.statsparser import run_parsers
+
+PARSERS = {
+    "ipv8": "experiments.ipv8.parse_ipv8_statistics:IPv8StatisticsParser",
+    "loop_monitor": "gumby.statsparser:LoopMonitorStatisticsParser",
+    "profiles": "gumby.statsparser:ProfileCollector",
+    "resource_usage": "gumby.process_guard_stats_parser:ResourceUsageStatisticsParser",
+}
+
+
+def load_parser_class(name):
+    module_name, class_name = PARSERS.get(name, name).split(":")
+    return getattr(import_module(module_name), class_name)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 3:
+        print("Usage: %s <node directory> <parser> [<parser> ...]" % sys.argv[0], file=sys.stderr)
+        sys.exit(1)
+
+    # cd to the output directory
+    os.chdir(os.environ['OUTPUT_DIR'])
+
+    parsers = [load_parser_class(name)(sys.argv[1]) for name in sys.argv[2:]]
+    run_parsers(parsers, int(os.environ.get("POST_PROCESS_WORKERS", "0")) or None)
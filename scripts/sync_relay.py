@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+
+# %*% Experiment synchronization relay.
+#
+# Runs on a worker node, accepts the connections of the experiment instances on that node and speaks to the
+# experiment server on their behalf over a single connection. See gumby/sync.py for the protocol.
+import logging
+from asyncio import ensure_future, get_event_loop
+from os import environ
+
+from gumby.log import setupLogging
+from gumby.sync import SyncRelayFactory
+
+
+# @CONF_OPTION SYNC_HOST: Host of the experiment server the relay connects to. (required)
+# @CONF_OPTION SYNC_PORT: Port of the experiment server the relay connects to. (required)
+# @CONF_OPTION SYNC_RELAY_PORT: Port where the relay should listen on. (required)
+
+if __name__ == '__main__':
+    setupLogging()
+
+    expected_subscribers = int(environ['PROCESSES_IN_THIS_NODE'])
+    server_host = environ['SYNC_HOST']
+    server_port = int(environ['SYNC_PORT'])
+    relay_port = int(environ['SYNC_RELAY_PORT'])
+
+    loop = get_event_loop()
+    logger = logging.getLogger("sync_relay")
+    logger.info("Creating sync relay for %d instances on port %d", expected_subscribers, relay_port)
+    ensure_future(loop.create_server(SyncRelayFactory(server_host, server_port, expected_subscribers),
+                                     host="127.0.0.1", port=relay_port))
+    loop.exit_code = 0
+    loop.run_forever()
+    loop.close()
+    exit(loop.exit_code)